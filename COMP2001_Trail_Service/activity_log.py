@@ -0,0 +1,155 @@
+import atexit
+import queue
+import threading
+from datetime import datetime
+import pytz
+from flask import has_request_context, request
+from config import db
+from models import Trail, TrailLog, User
+import request_metrics
+
+# Audit log of trail and location point writes.
+# notes.py records an event after each successful commit, tagged with the
+# JWT user_id and role. Events wait in a bounded in-memory queue and a
+# background thread inserts them into Trail_Log in batches, so a mutation
+# never pays for an extra INSERT and commit. When the queue is full new
+# events are dropped and counted rather than blocking the request. The queue
+# is flushed on interpreter exit and from gunicorn's worker_exit hook.
+
+QUEUE_SIZE = 10000
+BATCH_SIZE = 200
+FLUSH_SECONDS = 1.0
+STOP_TIMEOUT = 10
+
+events_total = request_metrics.Counter(
+    "trail_service_activity_events_total", "Audit log events by outcome.", ("outcome",)
+)
+request_metrics.METRICS.append(events_total)
+
+def _now():
+    return datetime.now(pytz.timezone('Europe/London'))
+
+class ActivityLog:
+    def __init__(self, queue_size=QUEUE_SIZE, batch_size=BATCH_SIZE, flush_seconds=FLUSH_SECONDS):
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._app = None
+        self._worker = None
+        self._stopping = threading.Event()
+        self._wake = threading.Event()
+        self._flush_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+
+    def init_app(self, app):
+        self._app = app
+        self.batch_size = app.config.get("ACTIVITY_LOG_BATCH_SIZE", self.batch_size)
+        self.flush_seconds = app.config.get("ACTIVITY_LOG_FLUSH_SECONDS", self.flush_seconds)
+        queue_size = app.config.get("ACTIVITY_LOG_QUEUE_SIZE", self._queue.maxsize)
+        if queue_size != self._queue.maxsize and self._queue.empty():
+            self._queue = queue.Queue(maxsize=queue_size)
+
+    def record(self, action, trail_id, point_id=None):
+        """
+        Queue one event for the current request's user. Never blocks and never raises.
+        """
+        claims = {}
+        if has_request_context():
+            validated = request.environ.get("trail_service.auth")
+            if validated is not None:
+                claims = validated[1]
+        event = {
+            "Action": action,
+            "TrailID": trail_id,
+            "TrailRef": trail_id,
+            "LocationPointID": point_id,
+            "AddedBy": str(claims.get("user_id", "unknown"))[:50],
+            "Role": claims.get("role"),
+            "Timestamp": _now(),
+        }
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            events_total.inc(("dropped",))
+            return
+        events_total.inc(("queued",))
+        if self._queue.qsize() >= self.batch_size:
+            self._wake.set()
+        self._ensure_worker()
+
+    def _ensure_worker(self):
+        # Started on first use, so each gunicorn worker process runs its own thread
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._start_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._stopping.clear()
+                self._worker = threading.Thread(target=self._run, name="activity-log", daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        # Flush every flush_seconds, or as soon as a full batch is waiting
+        while not self._stopping.is_set():
+            self._wake.wait(self.flush_seconds)
+            self._wake.clear()
+            self.flush()
+
+    def _take(self, limit):
+        events = []
+        while len(events) < limit:
+            try:
+                events.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return events
+
+    def flush(self):
+        """
+        Insert everything queued into Trail_Log, batch_size rows per INSERT; returns the number written.
+        """
+        if self._app is None or self._queue.empty():
+            return 0
+        written = 0
+        with self._flush_lock, self._app.app_context():
+            while True:
+                events = self._take(self.batch_size)
+                if not events:
+                    break
+                try:
+                    self._insert(events)
+                    events_total.inc(("written",), len(events))
+                    written += len(events)
+                except Exception:
+                    # A failed batch is dropped so one bad event cannot wedge the queue
+                    db.session.rollback()
+                    events_total.inc(("failed",), len(events))
+                    self._app.logger.exception("Could not write %d activity log events", len(events))
+        return written
+
+    def _insert(self, events):
+        # Events can outlive their trail: keep TrailRef but drop the foreign key
+        trail_ids = {event["TrailID"] for event in events}
+        existing = set(db.session.scalars(db.select(Trail.TrailID).where(Trail.TrailID.in_(trail_ids))))
+        # Link events to a User row when the token's user_id is a registered email
+        emails = {event["AddedBy"] for event in events}
+        user_ids = dict(db.session.execute(db.select(User.Email, User.UserID).where(User.Email.in_(emails))).all())
+        for event in events:
+            if event["TrailID"] not in existing:
+                event["TrailID"] = None
+            event["UserID"] = user_ids.get(event["AddedBy"])
+        db.session.execute(db.insert(TrailLog), events)
+        db.session.commit()
+
+    def stop(self):
+        """
+        Stop the worker thread and write out everything still queued.
+        """
+        self._stopping.set()
+        self._wake.set()
+        worker = self._worker
+        if worker is not None and worker.is_alive():
+            worker.join(STOP_TIMEOUT)
+        self.flush()
+
+activity_log = ActivityLog()
+atexit.register(activity_log.stop)
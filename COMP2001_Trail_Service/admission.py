@@ -0,0 +1,201 @@
+import math
+import threading
+import time
+from flask import abort, request
+from werkzeug.exceptions import HTTPException
+import request_metrics
+from auth import validate_token
+
+# Admission control in front of the API routes.
+# Every API request takes a token from its client's bucket: the JWT user_id
+# when the request carries a valid token, otherwise the client IP. /login has
+# its own, smaller per-IP bucket because each attempt fans out to AUTH_URL.
+# A client over its rate gets 429 with Retry-After.
+# Routes that use the database also need one of ADMISSION_MAX_CONCURRENT
+# slots per worker. If none frees up within ADMISSION_WAIT_SECONDS the request
+# gets 503 with Retry-After, so a burst is shed and does not pile up behind
+# the connection pool.
+# Buckets live in this process by default. RATE_LIMIT_STORE_URL=redis://...
+# shares them between workers and hosts (needs the redis package). The
+# concurrency limit always stays per process, like the pool it protects.
+
+ENVIRON_KEY = "trail_service.admission"
+MAX_BUCKETS = 10000
+OVERLOAD_RETRY_AFTER = 1
+# Endpoints outside these checks: health probes must answer under load
+EXEMPT_ENDPOINTS = ("api.database_health",)
+# Endpoints that are limited but do not touch the database
+NO_DATABASE_ENDPOINTS = ("api.login",)
+LOGIN_ENDPOINT = "api.login"
+
+rejected_total = request_metrics.Counter(
+    "trail_service_admission_rejected_total", "Requests turned away by admission control.", ("reason",)
+)
+request_metrics.METRICS.append(rejected_total)
+
+class MemoryStore:
+    """
+    Token buckets kept in this process. Also the stand-in for a shared store in tests:
+    pass clock= to control time.
+    """
+
+    def __init__(self, maxsize=MAX_BUCKETS, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.clock = clock
+        # key -> (tokens, updated, rate, burst): /login buckets refill slower than the rest
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def take(self, key, rate, burst, cost=1):
+        """
+        Take cost tokens from key's bucket. Returns 0 if they were taken, else the seconds until they will be.
+        """
+        now = self.clock()
+        with self._lock:
+            tokens, updated, _, _ = self._buckets.get(key, (burst, now, rate, burst))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            wait = 0.0
+            if tokens >= cost:
+                tokens -= cost
+            else:
+                wait = (cost - tokens) / rate
+            self._buckets[key] = (tokens, now, rate, burst)
+            if len(self._buckets) > self.maxsize:
+                self._prune(now)
+        return wait
+
+    def _prune(self, now):
+        # A bucket that has refilled at its own rate is the same as no bucket
+        self._buckets = {
+            key: bucket for key, bucket in self._buckets.items()
+            if bucket[0] + (now - bucket[1]) * bucket[2] < bucket[3]
+        }
+        while len(self._buckets) > self.maxsize:
+            del self._buckets[next(iter(self._buckets))]
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+# Refill and take in one step on the Redis server, using its clock so every worker agrees
+_REDIS_TAKE = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or burst
+local updated = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+local wait = 0
+if tokens >= cost then
+    tokens = tokens - cost
+else
+    wait = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return tostring(wait)
+"""
+
+class RedisStore:
+    """
+    Token buckets in Redis, shared by every worker that uses the same server.
+    """
+
+    def __init__(self, client, prefix="trail_service:bucket:"):
+        self.prefix = prefix
+        self._take = client.register_script(_REDIS_TAKE)
+
+    @classmethod
+    def from_url(cls, url):
+        import redis  # Only needed when a shared store is configured
+
+        return cls(redis.Redis.from_url(url))
+
+    def take(self, key, rate, burst, cost=1):
+        return float(self._take(keys=[self.prefix + key], args=[rate, burst, cost]))
+
+def store_from_url(url):
+    if not url:
+        return MemoryStore()
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisStore.from_url(url)
+    raise ValueError(f"Unsupported RATE_LIMIT_STORE_URL: {url}")
+
+class AdmissionControl:
+    def __init__(self, store=None):
+        self.store = store or MemoryStore()
+        self.enabled = True
+        self.rate = 20.0
+        self.burst = 40
+        self.login_rate = 0.5
+        self.login_burst = 5
+        self.wait_seconds = 0.25
+        self.max_concurrent = None
+        self._slots = None
+
+    def init_app(self, app):
+        settings = app.config
+        self.enabled = settings.get("ADMISSION_CONTROL", self.enabled)
+        self.rate = settings.get("RATE_LIMIT_PER_SECOND", self.rate)
+        self.burst = settings.get("RATE_LIMIT_BURST", self.burst)
+        self.login_rate = settings.get("LOGIN_RATE_LIMIT_PER_SECOND", self.login_rate)
+        self.login_burst = settings.get("LOGIN_RATE_LIMIT_BURST", self.login_burst)
+        self.wait_seconds = settings.get("ADMISSION_WAIT_SECONDS", self.wait_seconds)
+        if settings.get("RATE_LIMIT_STORE_URL"):
+            self.store = store_from_url(settings["RATE_LIMIT_STORE_URL"])
+        # By default one request per pooled connection, so requests never queue inside the pool
+        self.max_concurrent = settings.get("ADMISSION_MAX_CONCURRENT") or (
+            settings.get("DB_POOL_SIZE", 10) + settings.get("DB_MAX_OVERFLOW", 20)
+        )
+        self._slots = threading.BoundedSemaphore(self.max_concurrent)
+
+        app.before_request(self.admit)
+        app.teardown_request(self.release)
+
+    def client_key(self):
+        """
+        The JWT user_id of the current request, or its client IP when it has no valid token.
+        """
+        token = request.headers.get("Authorization")
+        if token:
+            try:
+                claims = validate_token(token)
+            except HTTPException:
+                claims = None
+            if claims is not None and claims.get("user_id") is not None:
+                # require_auth reuses the validated claims
+                request.environ["trail_service.auth"] = (token, claims)
+                return f"user:{claims['user_id']}"
+        return f"ip:{request.remote_addr}"
+
+    def admit(self):
+        endpoint = request.endpoint
+        if not self.enabled or endpoint is None or not endpoint.startswith("api.") or endpoint in EXEMPT_ENDPOINTS:
+            return None
+        if endpoint == LOGIN_ENDPOINT:
+            wait = self.store.take(f"login:{request.remote_addr}", self.login_rate, self.login_burst)
+            reason = "login_rate_limited"
+        else:
+            wait = self.store.take(self.client_key(), self.rate, self.burst)
+            reason = "rate_limited"
+        if wait > 0:
+            rejected_total.inc((reason,))
+            abort(429, description="Too many requests", retry_after=math.ceil(wait))
+        if endpoint in NO_DATABASE_ENDPOINTS:
+            return None
+        if not self._slots.acquire(timeout=self.wait_seconds):
+            rejected_total.inc(("overloaded",))
+            abort(503, description="Service is busy", retry_after=OVERLOAD_RETRY_AFTER)
+        request.environ[ENVIRON_KEY] = self._slots
+        return None
+
+    def release(self, exc=None):
+        # Runs after the response, including streamed ones, has been sent
+        slots = request.environ.pop(ENVIRON_KEY, None)
+        if slots is not None:
+            slots.release()
+
+admission_control = AdmissionControl()
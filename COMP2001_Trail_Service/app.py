@@ -1,26 +1,48 @@
-import swagger_ui_bundle
-from flask import Flask, render_template, jsonify, request, abort
+from flask import Blueprint, Flask, Response, current_app, render_template, jsonify, request, abort, stream_with_context
 from flask_swagger_ui import get_swaggerui_blueprint
 import jwt
 import datetime
+import bisect
 import functools
 import config
+import db_metrics
+import db_routing
+from config import db
 from models import Trail
 import notes  
-import requests  # Import requests for API communication
+import bulk_import
+import polyline
+import queries
+import serializers
+import track_import
+from activity_log import activity_log
+from auth import SECRET_KEY, require_auth
+from auth_client import AuthUnavailable, InvalidCredentials, auth_client
+from lazy_imports import lazy_module
+from response_cache import cached
+from search_index import search_index
+from spatial_index import spatial_index
+from trail_snapshot import trail_snapshot
 
-SECRET_KEY = "secret-key"
-AUTH_URL = "https://web.socem.plymouth.ac.uk/COMP2001/auth/api/users"
+# Routes are registered on a blueprint and attached to each app by create_app()
+api = Blueprint("api", __name__)
 
-# Initialize Connexion app and Flask app
-app = config.connex_app
-flask_app = app.app
-
-# Swagger UI Configuration
+# Swagger UI Configuration; the blueprint is built by create_app()
 SWAGGER_URL = '/swagger'
 API_URL = '/static/swagger.yml'
-swaggerui_blueprint = get_swaggerui_blueprint(SWAGGER_URL, API_URL)
-flask_app.register_blueprint(swaggerui_blueprint, url_prefix=SWAGGER_URL)
+
+schemas = lazy_module("schemas")
+
+def create_app():
+    """
+    App factory: a fresh Connexion app with the API and Swagger UI registered.
+    """
+    connex_app = config.create_app()
+    connex_app.app.register_blueprint(get_swaggerui_blueprint(SWAGGER_URL, API_URL), url_prefix=SWAGGER_URL)
+    connex_app.app.register_blueprint(api)
+    activity_log.init_app(connex_app.app)
+    trail_snapshot.init_app(connex_app.app)
+    return connex_app
 
 # JWT Helper Functions
 def generate_jwt(user_data):
@@ -31,27 +53,7 @@ def generate_jwt(user_data):
     }
     return jwt.encode(payload, SECRET_KEY, algorithm="HS256")
 
-def validate_token(token):
-    try:
-        token = token.split(" ")[1]
-        decoded = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
-        return decoded
-    except jwt.ExpiredSignatureError:
-        abort(401, description="Token has expired")
-    except jwt.InvalidTokenError:
-        abort(401, description="Invalid token")
-
-def require_auth(func):
-    @functools.wraps(func)  # Preserve the original function's name
-    def wrapper(*args, **kwargs):
-        token = request.headers.get("Authorization")
-        if not token or not token.startswith("Bearer "):
-            abort(401, description="Unauthorized")
-        validate_token(token)
-        return func(*args, **kwargs)
-    return wrapper
-
-@flask_app.route("/login", methods=["POST"])
+@api.route("/login", methods=["POST"])
 def login():
     data = request.json
     email = data.get("email")
@@ -61,15 +63,12 @@ def login():
         return jsonify({"error": "Email and password are required"}), 400
 
     # Authenticate using external API
-    response = requests.post(AUTH_URL, json={"email": email, "password": password})
-
-    if response.status_code != 200:
-        print("Authentication Failed:", response.text)
-        abort(401, description="Invalid credentials")
-
     try:
-        user_data = response.json()
-        print("User Data Received:", user_data)
+        user_data = auth_client.verify(email, password)
+    except InvalidCredentials:
+        abort(401, description="Invalid credentials")
+    except AuthUnavailable as e:
+        abort(503, description=str(e))
     except ValueError:
         abort(500, description="Invalid response from authentication server")
 
@@ -102,68 +101,386 @@ def login():
 
 
 
-@flask_app.route("/trails", methods=["POST"])
-@require_auth
+@api.route("/trails", methods=["POST"])
+@require_auth()
 def create_trail():
     trail_data = request.json
     if not trail_data:
         abort(400, description="Request body is missing")
-    return jsonify(notes.create_trail(trail_data)), 201
+    result, status_code = notes.create_trail(trail_data)
+    return jsonify(result), status_code
+
+@api.route("/trails/import", methods=["POST"])
+@require_auth()
+def import_trails():
+    if request.mimetype in ("application/x-ndjson", "application/ndjson"):
+        # Stream the body line by line rather than reading it all into memory
+        records = bulk_import.read_ndjson(request.stream)
+    else:
+        records = request.get_json(silent=True)
+        if isinstance(records, dict):
+            records = records.get("trails")
+        if not isinstance(records, list):
+            abort(400, description="Request body must be a list of trails or NDJSON")
+    result, status_code = notes.import_trails(records)
+    return jsonify(result), status_code
+
+# Trail columns that can be given with a track upload, by form field or query parameter
+TRACK_FIELDS = {
+    "name": "TrailName",
+    "summary": "TrailSummary",
+    "description": "TrailDescription",
+    "difficulty": "Difficulty",
+    "location": "Location",
+    "route_type": "RouteType",
+}
+TRACK_MIMETYPES = {
+    "application/gpx+xml": "gpx",
+    "application/xml": "gpx",
+    "text/xml": "gpx",
+    "application/geo+json": "geojson",
+    "application/json": "geojson",
+}
+
+@api.route("/trails/upload", methods=["POST"])
+@require_auth()
+def upload_track():
+    # A multipart upload is spooled to disk by Werkzeug; a raw body is read straight off the socket
+    upload = request.files.get("file")
+    if upload is not None:
+        stream, mimetype, filename = upload.stream, upload.mimetype, upload.filename or ""
+    else:
+        stream, mimetype, filename = request.stream, request.mimetype, ""
+    track_format = request.args.get("format") or TRACK_MIMETYPES.get(mimetype)
+    if track_format is None and filename.lower().endswith((".gpx", ".geojson", ".json")):
+        track_format = "gpx" if filename.lower().endswith(".gpx") else "geojson"
+    if track_format not in track_import.FORMATS:
+        abort(400, description="format must be gpx or geojson")
+    fields = {}
+    for name, column in TRACK_FIELDS.items():
+        value = request.args.get(name) or request.form.get(name)
+        if value:
+            fields[column] = value
+    result, status_code = notes.upload_track(track_format, stream, fields)
+    return jsonify(result), status_code
 
-@flask_app.route("/trails", methods=["GET"])
-@require_auth
+@api.route("/trails", methods=["GET"])
+@require_auth(roles=["Admin", "User"])
+@cached()
 def read_all_trails():
-    trails = Trail.query.all()
-    return jsonify(notes.trails_schema.dump(trails)), 200
+    snapshot = trail_snapshot.current()
+    if snapshot is not None:
+        results, next_cursor = snapshot.list_trails(*queries.trail_page_args(request.args))
+    else:
+        trails, fields, next_cursor = queries.list_trails(request.args)
+        results = serializers.dump(queries.trails_schema_for(fields), trails)
+    response = jsonify(results)
+    if next_cursor is not None:
+        response.headers["X-Next-Cursor"] = str(next_cursor)
+    return response, 200
+
+@api.route("/trails/export", methods=["GET"])
+@require_auth()
+def export_trails():
+    export_format = request.args.get("format", "ndjson")
+    if export_format not in ("ndjson", "json"):
+        abort(400, description="format must be ndjson or json")
+    # The same compact encoding as every other response; one line per trail for NDJSON
+    encode = functools.partial(current_app.json.dumps, separators=(",", ":"))
+
+    def generate_ndjson():
+        for trail in queries.iter_trails():
+            yield encode(serializers.dump(schemas.trail_schema, trail)) + "\n"
+
+    def generate_json_array():
+        separator = "["
+        for trail in queries.iter_trails():
+            yield separator + encode(serializers.dump(schemas.trail_schema, trail))
+            separator = ","
+        yield "[]" if separator == "[" else "]"
+
+    if export_format == "ndjson":
+        return Response(stream_with_context(generate_ndjson()), mimetype="application/x-ndjson")
+    return Response(stream_with_context(generate_json_array()), mimetype="application/json")
+
+# Geospatial and text search. Results leave out location_points unless asked for with fields=
+SPATIAL_DEFAULT_FIELDS = ",".join(queries.TRAIL_COLUMNS)
+MAX_NEAREST = 100
+DEFAULT_SEARCH_RESULTS = 20
+MAX_SEARCH_RESULTS = 100
+MAX_SUGGESTIONS = 50
+
+def _trails_response(trail_ids, extra_field=None, extra_values=None):
+    """
+    The given trails, in order, each with extra_values[TrailID] added as extra_field.
+    """
+    fields = queries.parse_fields(request.args.get("fields", SPATIAL_DEFAULT_FIELDS))
+    trails = queries.trails_by_ids(trail_ids, fields)
+    results = serializers.dump(queries.trails_schema_for(fields), trails)
+    if extra_field is not None:
+        for trail, result in zip(trails, results):
+            result[extra_field] = extra_values[trail.TrailID]
+    return jsonify(results), 200
+
+def _spatial_response(trail_ids, distances=None):
+    if distances is None:
+        return _trails_response(trail_ids)
+    return _trails_response(trail_ids, "distance_km", {trail_id: round(distance, 3) for trail_id, distance in distances.items()})
+
+@api.route("/trails/within", methods=["GET"])
+@require_auth()
+def trails_within():
+    min_lat = queries.float_arg(request.args, "min_lat", required=True)
+    min_lon = queries.float_arg(request.args, "min_lon", required=True)
+    max_lat = queries.float_arg(request.args, "max_lat", required=True)
+    max_lon = queries.float_arg(request.args, "max_lon", required=True)
+    if min_lat > max_lat or min_lon > max_lon:
+        abort(400, description="min_lat/min_lon must not exceed max_lat/max_lon")
+    return _spatial_response(sorted(spatial_index.within_bbox(min_lat, min_lon, max_lat, max_lon)))
+
+@api.route("/trails/near", methods=["GET"])
+@require_auth()
+def trails_near():
+    lat = queries.float_arg(request.args, "lat", required=True)
+    lon = queries.float_arg(request.args, "lon", required=True)
+    radius_km = queries.float_arg(request.args, "radius_km", required=True)
+    if radius_km <= 0:
+        abort(400, description="radius_km must be positive")
+    distances = spatial_index.within_radius(lat, lon, radius_km)
+    return _spatial_response(sorted(distances, key=distances.get), distances)
+
+@api.route("/trails/nearest", methods=["GET"])
+@require_auth()
+def trails_nearest():
+    lat = queries.float_arg(request.args, "lat", required=True)
+    lon = queries.float_arg(request.args, "lon", required=True)
+    k = queries.int_arg(request.args, "k", 5)
+    if k < 1 or k > MAX_NEAREST:
+        abort(400, description=f"k must be between 1 and {MAX_NEAREST}")
+    nearest = spatial_index.nearest(lat, lon, k)
+    return _spatial_response([trail_id for trail_id, _ in nearest], dict(nearest))
 
-@flask_app.route("/trails/<int:trail_id>", methods=["GET"])
-@require_auth
+@api.route("/trails/search", methods=["GET"])
+@require_auth()
+def search_trails():
+    query = request.args.get("q", "").strip()
+    if not query:
+        abort(400, description="q is required")
+    limit = queries.int_arg(request.args, "limit", DEFAULT_SEARCH_RESULTS)
+    if limit < 1 or limit > MAX_SEARCH_RESULTS:
+        abort(400, description=f"limit must be between 1 and {MAX_SEARCH_RESULTS}")
+    prefix = request.args.get("prefix", "true").lower() not in ("0", "false", "no")
+    results = search_index.search(
+        query, limit, prefix,
+        difficulty=request.args.get("difficulty") or None,
+        route_type=request.args.get("route_type") or None,
+    )
+    return _trails_response([trail_id for trail_id, _ in results], "score", {trail_id: round(score, 4) for trail_id, score in results})
+
+@api.route("/trails/search/suggest", methods=["GET"])
+@require_auth()
+def suggest_search_terms():
+    query = request.args.get("q", "").strip()
+    if not query:
+        abort(400, description="q is required")
+    limit = queries.int_arg(request.args, "limit", 10)
+    if limit < 1 or limit > MAX_SUGGESTIONS:
+        abort(400, description=f"limit must be between 1 and {MAX_SUGGESTIONS}")
+    return jsonify(search_index.suggest(query, limit)), 200
+
+@api.route("/trails/by-features", methods=["GET"])
+@require_auth()
+def trails_by_features():
+    names = [name.strip() for name in request.args.get("features", "").split(",") if name.strip()]
+    try:
+        ids = [int(value) for value in request.args.get("feature_ids", "").split(",") if value.strip()]
+    except ValueError:
+        abort(400, description="feature_ids must be comma-separated integers")
+    if not names and not ids:
+        abort(400, description="features or feature_ids is required")
+    match = request.args.get("match", "all")
+    if match not in ("all", "any"):
+        abort(400, description="match must be all or any")
+    limit = queries.int_arg(request.args, "limit", queries.DEFAULT_PAGE_SIZE)
+    if limit < 1 or limit > queries.MAX_PAGE_SIZE:
+        abort(400, description=f"limit must be between 1 and {queries.MAX_PAGE_SIZE}")
+    after = queries.int_arg(request.args, "after")
+
+    trail_ids = notes.trails_with_features(names, ids, match == "all")
+    if after is not None:
+        trail_ids = trail_ids[bisect.bisect_right(trail_ids, after):]
+    response, status_code = _trails_response(trail_ids[:limit])
+    if len(trail_ids) > limit:
+        response.headers["X-Next-Cursor"] = str(trail_ids[limit - 1])
+    return response, status_code
+
+def trail_version(trail_id):
+    """
+    The (TrailID, timestamp) validators of a trail's responses, from the snapshot when it serves the trail.
+    """
+    snapshot = trail_snapshot.current()
+    if snapshot is not None:
+        version = snapshot.trail_version(trail_id)
+        if version is not None:
+            return version
+    return queries.trail_version(trail_id)
+
+@api.route("/trails/<int:trail_id>", methods=["GET"])
+@require_auth(roles=["Admin", "User"])
+@cached(trail_version)
 def read_one_trail(trail_id):
     return jsonify(notes.read_one_trail(trail_id)), 200
 
-@flask_app.route("/trails/<int:trail_id>", methods=["PUT"])
-@require_auth
+@api.route("/trails/<int:trail_id>", methods=["PUT"])
+@require_auth()
 def update_trail(trail_id):
     trail_data = request.json
     if not trail_data:
         abort(400, description="Request body is missing")
     return jsonify(notes.update_trail(trail_id, trail_data)), 200
 
-@flask_app.route("/trails/<int:trail_id>", methods=["DELETE"])
-@require_auth
+@api.route("/trails/<int:trail_id>", methods=["DELETE"])
+@require_auth()
 def delete_trail(trail_id):
     result, status_code = notes.delete_trail(trail_id)  
     return jsonify(result), status_code  
 
-@flask_app.route("/trails/<int:trail_id>/points", methods=["POST"])
-@require_auth
+@api.route("/trails/<int:trail_id>/features", methods=["GET"])
+@require_auth()
+def get_trail_features(trail_id):
+    result, status_code = notes.get_trail_features(trail_id)
+    return jsonify(result), status_code
+
+@api.route("/trails/<int:trail_id>/features", methods=["POST"])
+@require_auth()
+def attach_feature(trail_id):
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        abort(400, description="Request body must be an object")
+    result, status_code = notes.attach_feature(trail_id, data)
+    return jsonify(result), status_code
+
+@api.route("/trails/<int:trail_id>/features/<int:feature_id>", methods=["DELETE"])
+@require_auth()
+def detach_feature(trail_id, feature_id):
+    result, status_code = notes.detach_feature(trail_id, feature_id)
+    return jsonify(result), status_code
+
+@api.route("/features", methods=["GET"])
+@require_auth()
+def read_all_features():
+    result, status_code = notes.read_all_features()
+    return jsonify(result), status_code
+
+@api.route("/features", methods=["POST"])
+@require_auth()
+def create_feature():
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        abort(400, description="Request body must be an object")
+    result, status_code = notes.create_feature(data)
+    return jsonify(result), status_code
+
+@api.route("/trails/<int:trail_id>/points", methods=["POST"])
+@require_auth()
 def add_point(trail_id):
     data = request.json
     return jsonify(notes.add_location_point(trail_id, data)), 201
 
-@flask_app.route("/trails/<int:trail_id>/points", methods=["GET"])
-@require_auth
+@api.route("/trails/<int:trail_id>/points", methods=["GET"])
+@require_auth(roles=["Admin", "User"])
+@cached(trail_version)
 def get_points(trail_id):
-    return jsonify(notes.get_location_points(trail_id)), 200
+    point_format = request.args.get("format", "json")
+    if point_format not in ("json", "polyline", "binary"):
+        abort(400, description="format must be json, polyline or binary")
+    tolerance = queries.float_arg(request.args, "tolerance")
+    if tolerance is not None and tolerance < 0:
+        abort(400, description="tolerance must not be negative")
+    if point_format == "json" and not tolerance:
+        points, status = notes.get_location_points(trail_id)
+        return jsonify(points), status
 
-@flask_app.route("/trails/<int:trail_id>/points/<int:point_id>", methods=["PUT"])
-@require_auth
+    points = notes.get_simplified_points(trail_id, tolerance or None)
+    if point_format == "json":
+        return jsonify(points.to_dicts()), 200
+    if point_format == "polyline":
+        return jsonify({
+            "TrailID": trail_id,
+            "point_count": len(points.lat),
+            "polyline": polyline.encode_polyline(points.lat, points.lon),
+        }), 200
+    return Response(polyline.pack_float32(points.lat, points.lon), mimetype="application/octet-stream")
+
+@api.route("/trails/<int:trail_id>/points", methods=["PUT"])
+@require_auth()
+def replace_points(trail_id):
+    data = request.json
+    if not isinstance(data, list):
+        abort(400, description="Request body must be a list of location points")
+    result, status_code = notes.replace_location_points(trail_id, data)
+    return jsonify(result), status_code
+
+@api.route("/trails/<int:trail_id>/points", methods=["PATCH"])
+@require_auth()
+def edit_points(trail_id):
+    data = request.json
+    if not isinstance(data, dict):
+        abort(400, description="Request body must be an object")
+    result, status_code = notes.edit_location_points(trail_id, data)
+    return jsonify(result), status_code
+
+@api.route("/trails/<int:trail_id>/stats", methods=["GET"])
+@require_auth(roles=["Admin", "User"])
+@cached(trail_version)
+def get_trail_stats(trail_id):
+    result, status_code = notes.get_trail_stats(trail_id)
+    return jsonify(result), status_code
+
+@api.route("/trails/stats/recompute", methods=["POST"])
+@require_auth()
+def recompute_trail_stats():
+    result, status_code = notes.recompute_trail_stats()
+    return jsonify(result), status_code
+
+@api.route("/trails/<int:trail_id>/points/<int:point_id>", methods=["PUT"])
+@require_auth()
 def update_point(trail_id, point_id):
     data = request.json
     return jsonify(notes.update_location_point(trail_id, point_id, data)), 200
 
-@flask_app.route("/trails/<int:trail_id>/points/<int:point_id>", methods=["DELETE"])
-@require_auth
+@api.route("/trails/<int:trail_id>/points/<int:point_id>", methods=["DELETE"])
+@require_auth()
 def delete_point(trail_id, point_id):
     return jsonify(notes.delete_location_point(trail_id, point_id)), 200
 
-@flask_app.route("/")
+@api.route("/trails/logs", methods=["GET"])
+@require_auth()
+def read_trail_logs():
+    logs, next_cursor = notes.read_all_trail_logs(request.args)
+    response = jsonify(logs)
+    if next_cursor is not None:
+        response.headers["X-Next-Cursor"] = str(next_cursor)
+    return response, 200
+
+@api.route("/health/db", methods=["GET"])
+def database_health():
+    try:
+        db.session.execute(db.text("SELECT 1"))
+        status = "ok"
+    except Exception as e:
+        status = f"error: {e}"
+    replicas = {key: db_metrics.pool_stats(db.engines[key]) for key in db_routing.replica_keys(db.engines)}
+    return jsonify({"database": status, "pool": db_metrics.pool_stats(db.engine), "replicas": replicas}), 200 if status == "ok" else 503
+
+@api.route("/")
 def home():
     try:
-        trails = Trail.query.all()
+        trails = queries.all_trails()
         return render_template("home.html", trails=trails)
     except Exception as e:
         return f"An error occurred: {str(e)}", 500
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=8000, debug=True)
+    # Development server only; see wsgi.py and gunicorn.conf.py for production
+    create_app().run(host="0.0.0.0", port=8000, debug=True)
@@ -0,0 +1,106 @@
+import functools
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from flask import abort, request
+import jwt
+import request_metrics
+
+# Shared JWT validation used by app.py, notes.py and auth_utils.py
+
+SECRET_KEY = "secret-key"
+TOKEN_CACHE_SIZE = 1024
+
+class TokenCache:
+    """
+    Bounded LRU cache of verified token claims, keyed by the token's SHA-256 digest.
+    Entries expire at the token's own exp claim.
+    """
+
+    def __init__(self, maxsize=TOKEN_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, digest):
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is not None:
+                claims, expires_at = entry
+                if expires_at is None or expires_at > time.time():
+                    self._entries.move_to_end(digest)
+                    self.hits += 1
+                    return claims
+                del self._entries[digest]
+            self.misses += 1
+            return None
+
+    def put(self, digest, claims):
+        expires_at = claims.get("exp")
+        with self._lock:
+            self._entries[digest] = (claims, expires_at)
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        # The hit and miss counts are totals for /metrics and are kept
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._entries), "maxsize": self.maxsize}
+
+token_cache = TokenCache()
+request_metrics.METRICS.extend(request_metrics.cache_metrics("trail_service_token_cache", "Verified-token cache", token_cache))
+
+def validate_token(token):
+    """
+    Validate and decode the JWT token, skipping signature checks for tokens already verified.
+    """
+    # Remove "Bearer " prefix if present
+    token = token.split(" ")[1] if " " in token else token
+    digest = hashlib.sha256(token.encode()).digest()
+    claims = token_cache.get(digest)
+    if claims is not None:
+        return claims
+    try:
+        claims = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
+    except jwt.ExpiredSignatureError:
+        abort(401, description="Token has expired")
+    except jwt.InvalidTokenError:
+        abort(401, description="Invalid token")
+    token_cache.put(digest, claims)
+    return claims
+
+def current_claims():
+    """
+    Return the claims of the token validated for the current request.
+    """
+    token = request.headers.get("Authorization")
+    if not token:
+        abort(401, description="Authorization token is missing")
+    # Nested require_auth wrappers (app.py routes calling notes.py) reuse the first result
+    validated = request.environ.get("trail_service.auth")
+    if validated is None or validated[0] != token:
+        validated = (token, validate_token(token))
+        request.environ["trail_service.auth"] = validated
+    return validated[1]
+
+def require_auth(roles=None):
+    """
+    Decorator to enforce JWT authentication and role-based access control.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            claims = current_claims()
+            if roles and claims.get("role") not in roles:
+                abort(403, description="Forbidden: Insufficient permissions")
+            return func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,168 @@
+import hashlib
+import os
+import secrets
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import request_metrics
+
+# Client for the external authentication API used by /login.
+# Set AUTH_URL to point at a local stub (see auth_stub.py) when testing.
+
+AUTH_URL = os.environ.get("AUTH_URL", "https://web.socem.plymouth.ac.uk/COMP2001/auth/api/users")
+CONNECT_TIMEOUT = 3.05
+READ_TIMEOUT = 10
+MAX_RETRIES = 2
+BACKOFF_FACTOR = 0.3
+POOL_SIZE = 10
+FAILURE_THRESHOLD = 5
+RESET_TIMEOUT = 30
+CREDENTIAL_CACHE_TTL = 300
+CREDENTIAL_CACHE_SIZE = 1024
+
+class InvalidCredentials(Exception):
+    """
+    The authentication API rejected the credentials.
+    """
+
+class AuthUnavailable(Exception):
+    """
+    The authentication API could not be reached or the circuit breaker is open.
+    """
+
+class CircuitBreaker:
+    """
+    Stop calling the upstream after repeated failures, then let a single
+    trial request through once reset_timeout has passed.
+    """
+
+    def __init__(self, failure_threshold=FAILURE_THRESHOLD, reset_timeout=RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half-open" and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+class CredentialCache:
+    """
+    Short-lived cache of successful verifications.
+    Only a salted hash of the credentials is kept, never the password.
+    """
+
+    def __init__(self, ttl=CREDENTIAL_CACHE_TTL, maxsize=CREDENTIAL_CACHE_SIZE):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._salt = secrets.token_bytes(16)
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def _key(self, email, password):
+        return hashlib.pbkdf2_hmac("sha256", f"{email}\0{password}".encode(), self._salt, 1000)
+
+    def get(self, email, password):
+        key = self._key(email, password)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            user_data, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            return user_data
+
+    def put(self, email, password, user_data):
+        key = self._key(email, password)
+        with self._lock:
+            if len(self._entries) >= self.maxsize:
+                now = time.monotonic()
+                self._entries = {k: v for k, v in self._entries.items() if v[1] > now}
+                if len(self._entries) >= self.maxsize:
+                    self._entries.pop(next(iter(self._entries)))
+            self._entries[key] = (user_data, time.monotonic() + self.ttl)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+class AuthClient:
+    def __init__(self, url=AUTH_URL):
+        self.url = url
+        self.timeout = (CONNECT_TIMEOUT, READ_TIMEOUT)
+        self.breaker = CircuitBreaker()
+        self.cache = CredentialCache()
+        self.session = requests.Session()
+        retry = Retry(
+            total=MAX_RETRIES,
+            backoff_factor=BACKOFF_FACTOR,
+            status_forcelist=[502, 503, 504],
+            allowed_methods=["POST"],
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE, max_retries=retry)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def verify(self, email, password):
+        """
+        Verify credentials against the authentication API and return its parsed JSON body.
+        Raises InvalidCredentials, AuthUnavailable, or ValueError for a non-JSON body.
+        """
+        cached = self.cache.get(email, password)
+        if cached is not None:
+            return cached
+        if not self.breaker.allow():
+            raise AuthUnavailable("Authentication server is unavailable")
+        try:
+            with request_metrics.timed("auth"):
+                response = self.session.post(self.url, json={"email": email, "password": password}, timeout=self.timeout)
+        except requests.RequestException as e:
+            self.breaker.record_failure()
+            raise AuthUnavailable(f"Authentication server is unavailable: {e}") from e
+        if response.status_code >= 500:
+            self.breaker.record_failure()
+            raise AuthUnavailable(f"Authentication server error: {response.status_code}")
+        self.breaker.record_success()
+        if response.status_code != 200:
+            raise InvalidCredentials(response.text)
+        user_data = response.json()
+        # The API answers ["Verified", "False"] with a 200 for a wrong password
+        if not isinstance(user_data, list) or "True" in user_data:
+            self.cache.put(email, password, user_data)
+        return user_data
+
+auth_client = AuthClient()
@@ -0,0 +1,61 @@
+import argparse
+import json
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Local stand-in for the external authentication API.
+# Run it and start the service with AUTH_URL=http://127.0.0.1:8001/users
+
+USERS = {
+    "tim@plymouth.ac.uk": "COMP2001!",
+    "jackadmin@plymouth.ac.uk": "COMP2001!",
+}
+
+class StubAuthHandler(BaseHTTPRequestHandler):
+    users = USERS
+    # Statuses to answer with, one per request, before verifying normally; for testing retries
+    failures = []
+    requests = 0
+
+    def do_POST(self):
+        type(self).requests += 1
+        if self.failures:
+            self._respond(self.failures.pop(0), {"error": "Stub failure"})
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            credentials = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._respond(400, {"error": "Invalid JSON"})
+            return
+        verified = self.users.get(credentials.get("email")) == credentials.get("password")
+        # Mirrors the real API, which answers 200 with a list either way
+        self._respond(200, ["Verified", "True" if verified else "False"])
+
+    def _respond(self, status, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+def make_server(host="127.0.0.1", port=0, users=None, failures=()):
+    """
+    Create (but do not start) a stub server; port 0 picks a free port.
+    The first requests are answered with the statuses in failures;
+    server.RequestHandlerClass.requests counts the requests.
+    """
+    handler = type("Handler", (StubAuthHandler,), {"users": users or USERS, "failures": list(failures)})
+    return ThreadingHTTPServer((host, port), handler)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stub authentication API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    args = parser.parse_args()
+    server = make_server(args.host, args.port)
+    print(f"Stub auth API listening on http://{args.host}:{server.server_port}/users")
+    server.serve_forever()
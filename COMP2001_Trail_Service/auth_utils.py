@@ -1,26 +1,32 @@
 import jwt
-import requests
-from flask import Flask, render_template, jsonify, request, abort
+from flask import Blueprint, Flask, render_template, jsonify, request, abort
 from flask_swagger_ui import get_swaggerui_blueprint
 from datetime import datetime, timedelta
 import config
 from models import Trail, LocationPoint, db
 import notes  
+from auth import SECRET_KEY, require_auth
+from auth_client import AuthUnavailable, InvalidCredentials, auth_client
 
 # Constants
-SECRET_KEY = "secret-key"
-AUTH_URL = "https://web.socem.plymouth.ac.uk/COMP2001/auth/api/users"
 TOKEN_EXPIRATION_MINUTES = 60
 
-# Initialize Connexion app and Flask app
-app = config.connex_app
-flask_app = app.app
+# Routes are registered on a blueprint and attached to each app by create_app()
+api = Blueprint("api", __name__)
 
 # Swagger UI Configuration
 SWAGGER_URL = '/swagger'
 API_URL = '/static/swagger.yml'
 swaggerui_blueprint = get_swaggerui_blueprint(SWAGGER_URL, API_URL)
-flask_app.register_blueprint(swaggerui_blueprint, url_prefix=SWAGGER_URL)
+
+def create_app():
+    """
+    App factory: a fresh Connexion app with the API and Swagger UI registered.
+    """
+    connex_app = config.create_app()
+    connex_app.app.register_blueprint(swaggerui_blueprint, url_prefix=SWAGGER_URL)
+    connex_app.app.register_blueprint(api)
+    return connex_app
 
 # Helper Functions for JWT
 
@@ -35,40 +41,9 @@ def generate_jwt(user_data):
     }
     return jwt.encode(payload, SECRET_KEY, algorithm="HS256")
 
-def validate_token(token):
-    """
-    Validate and decode the JWT token.
-    """
-    try:
-        token = token.split(" ")[1] if " " in token else token
-        return jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
-    except jwt.ExpiredSignatureError:
-        abort(401, description="Token has expired")
-    except jwt.InvalidTokenError:
-        abort(401, description="Invalid token")
-
-def require_auth(roles=None):
-    """
-    Decorator to enforce JWT authentication and role-based access control.
-    """
-    def decorator(func):
-        def wrapper(*args, **kwargs):
-            token = request.headers.get("Authorization")
-            if not token:
-                abort(401, description="Authorization token is missing")
-            
-            decoded = validate_token(token)
-            user_role = decoded.get("role")
-            if roles and user_role not in roles:
-                abort(403, description="Forbidden: Insufficient permissions")
-            
-            return func(*args, **kwargs)
-        return wrapper
-    return decorator
-
 # Routes
 
-@flask_app.route("/login", methods=["POST"])
+@api.route("/login", methods=["POST"])
 def login():
     """
     Authenticate the user and generate a JWT token.
@@ -80,15 +55,16 @@ def login():
         return {"error": "Email and password are required"}, 400
 
     # Authenticate with the external API
-    response = requests.post(AUTH_URL, json={"email": email, "password": password})
-    if response.status_code != 200:
+    try:
+        user_data = auth_client.verify(email, password)
+    except InvalidCredentials:
         abort(401, description="Invalid credentials")
-
-    user_data = response.json()
+    except AuthUnavailable as e:
+        abort(503, description=str(e))
     token = generate_jwt(user_data)
     return jsonify({"token": token}), 200
 
-@flask_app.route("/trails", methods=["POST"])
+@api.route("/trails", methods=["POST"])
 @require_auth(roles=["Admin"])
 def create_trail():
     """
@@ -99,7 +75,7 @@ def create_trail():
         abort(400, description="Request body is missing")
     return jsonify(notes.create_trail(trail_data)), 201
 
-@flask_app.route("/trails", methods=["GET"])
+@api.route("/trails", methods=["GET"])
 @require_auth()
 def read_all_trails():
     """
@@ -108,7 +84,7 @@ def read_all_trails():
     trails = notes.read_all_trails()
     return jsonify(trails), 200
 
-@flask_app.route("/trails/<int:trail_id>", methods=["GET"])
+@api.route("/trails/<int:trail_id>", methods=["GET"])
 @require_auth()
 def read_one_trail(trail_id):
     """
@@ -117,7 +93,7 @@ def read_one_trail(trail_id):
     trail = notes.read_one_trail(trail_id)
     return jsonify(trail), 200
 
-@flask_app.route("/trails/<int:trail_id>", methods=["PUT"])
+@api.route("/trails/<int:trail_id>", methods=["PUT"])
 @require_auth(roles=["Admin"])
 def update_trail(trail_id):
     """
@@ -128,7 +104,7 @@ def update_trail(trail_id):
         abort(400, description="Request body is missing")
     return jsonify(notes.update_trail(trail_id, trail_data)), 200
 
-@flask_app.route("/trails/<int:trail_id>", methods=["DELETE"])
+@api.route("/trails/<int:trail_id>", methods=["DELETE"])
 @require_auth(roles=["Admin"])
 def delete_trail(trail_id):
     """
@@ -136,7 +112,7 @@ def delete_trail(trail_id):
     """
     return notes.delete_trail(trail_id), 200
 
-@flask_app.route("/trails/<int:trail_id>/points", methods=["POST"])
+@api.route("/trails/<int:trail_id>/points", methods=["POST"])
 @require_auth(roles=["Admin"])
 def add_location_point(trail_id):
     """
@@ -147,7 +123,7 @@ def add_location_point(trail_id):
         abort(400, description="Request body is missing")
     return jsonify(notes.add_location_point(trail_id, point_data)), 201
 
-@flask_app.route("/trails/<int:trail_id>/points", methods=["GET"])
+@api.route("/trails/<int:trail_id>/points", methods=["GET"])
 @require_auth()
 def get_location_points(trail_id):
     """
@@ -156,7 +132,7 @@ def get_location_points(trail_id):
     points = notes.get_location_points(trail_id)
     return jsonify(points), 200
 
-@flask_app.route("/trails/<int:trail_id>/points/<int:point_id>", methods=["PUT"])
+@api.route("/trails/<int:trail_id>/points/<int:point_id>", methods=["PUT"])
 @require_auth(roles=["Admin"])
 def update_location_point(trail_id, point_id):
     """
@@ -167,7 +143,7 @@ def update_location_point(trail_id, point_id):
         abort(400, description="Request body is missing")
     return jsonify(notes.update_location_point(trail_id, point_id, point_data)), 200
 
-@flask_app.route("/trails/<int:trail_id>/points/<int:point_id>", methods=["DELETE"])
+@api.route("/trails/<int:trail_id>/points/<int:point_id>", methods=["DELETE"])
 @require_auth(roles=["Admin"])
 def delete_location_point(trail_id, point_id):
     """
@@ -175,7 +151,7 @@ def delete_location_point(trail_id, point_id):
     """
     return notes.delete_location_point(trail_id, point_id), 200
 
-@flask_app.route("/")
+@api.route("/")
 def home():
     """
     Render the home page.
@@ -183,4 +159,4 @@ def home():
     return render_template("home.html")
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=8000, debug=True)
\ No newline at end of file
+    create_app().run(host="0.0.0.0", port=8000, debug=True)
\ No newline at end of file
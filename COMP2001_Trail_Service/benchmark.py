@@ -0,0 +1,275 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+# Reproducible benchmarks of the API hot paths.
+# Each dataset (TRAILS trails with POINTS location points each) is generated
+# once into a SQLite file under --data-dir and reused by later runs; every run
+# works on a copy, so the trails it creates never leak into the next one.
+# Requests go through the Flask test client, so the numbers measure the
+# service itself (routing, auth, SQL, serialization) without network or
+# server overhead, one request at a time. /login talks to auth_stub.py.
+# The serialize_* scenarios time a whole 10k-trail response body both ways.
+#
+#   python benchmark.py --sizes 10,10000 --output before.json
+#   python benchmark.py --sizes 10,10000 --output after.json --compare before.json
+
+DEFAULT_SIZES = "10,10000,100000"
+DEFAULT_POINTS = 20
+DEFAULT_REQUESTS = 500
+BATCH_SIZE = 50000
+SERIALIZE_TRAILS = 10000
+SEED = 2001
+
+def summarize(latencies, duration):
+    latencies = sorted(latencies)
+    return {
+        "requests": len(latencies),
+        "seconds": round(duration, 3),
+        "throughput_rps": round(len(latencies) / duration, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 3),
+        "p99_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000, 3),
+    }
+
+def measure(call, iterations, warmup=10):
+    for i in range(min(warmup, iterations)):
+        call(i)
+    latencies = []
+    start = time.perf_counter()
+    for i in range(iterations):
+        call_start = time.perf_counter()
+        call(i)
+        latencies.append(time.perf_counter() - call_start)
+    return summarize(latencies, time.perf_counter() - start)
+
+def generate_dataset(path, trails, points):
+    """
+    Write a SQLite database with the given number of trails and points per trail.
+    """
+    from sqlalchemy import create_engine, insert
+    from config import db
+    from models import LocationPoint, Trail
+    from point_sequence import ORDER_GAP
+
+    rng = random.Random(SEED)
+    engine = create_engine(f"sqlite:///{path}", execution_options={"schema_translate_map": {"CW2": None}})
+    db.metadata.create_all(engine)
+    now = datetime.datetime(2024, 1, 1)
+    with engine.begin() as conn:
+        for first in range(1, trails + 1, BATCH_SIZE):
+            trail_rows = []
+            point_rows = []
+            for trail_id in range(first, min(first + BATCH_SIZE, trails + 1)):
+                lat, lon = rng.uniform(50.2, 50.9), rng.uniform(-5.2, -3.5)
+                trail_rows.append({
+                    "TrailID": trail_id,
+                    "TrailName": f"Trail {trail_id}",
+                    "TrailSummary": f"Generated trail {trail_id}",
+                    "TrailDescription": "A generated trail used for benchmarking. " * 4,
+                    "Difficulty": rng.choice(["Easy", "Moderate", "Hard"]),
+                    "Location": rng.choice(["Plymouth", "Dartmoor", "Cornwall", "Exeter"]),
+                    "Length": round(rng.uniform(1, 30), 2),
+                    "ElevationGain": round(rng.uniform(0, 900), 1),
+                    "RouteType": rng.choice(["Loop", "Out and back", "Point to point"]),
+                    "timestamp": now,
+                })
+                for order in range(points):
+                    lat += rng.uniform(-0.001, 0.001)
+                    lon += rng.uniform(-0.001, 0.001)
+                    point_rows.append({"TrailID": trail_id, "Latitude": lat, "Longitude": lon, "Order": (order + 1) * ORDER_GAP})
+            conn.execute(insert(Trail), trail_rows)
+            for i in range(0, len(point_rows), BATCH_SIZE):
+                conn.execute(insert(LocationPoint), point_rows[i:i + BATCH_SIZE])
+    engine.dispose()
+
+def dataset_path(data_dir, trails, points):
+    path = os.path.join(data_dir, f"trails-{trails}x{points}.db")
+    if not os.path.exists(path):
+        print(f"Generating {trails} trails x {points} points ...", flush=True)
+        start = time.perf_counter()
+        generate_dataset(path + ".tmp", trails, points)
+        os.replace(path + ".tmp", path)
+        print(f"  done in {time.perf_counter() - start:.1f} s", flush=True)
+    return path
+
+def make_token(role="Admin", user_id="benchmark"):
+    import jwt
+    from auth import SECRET_KEY
+    payload = {"user_id": user_id, "role": role, "exp": datetime.datetime.utcnow() + datetime.timedelta(hours=1)}
+    return jwt.encode(payload, SECRET_KEY, algorithm="HS256")
+
+def run_dataset(database, trails, iterations):
+    """
+    Build an app on the database and time each scenario against it.
+    """
+    os.environ["DATABASE_URL"] = f"sqlite:///{database}"
+    import app as service
+    import auth
+    import response_cache
+    from auth_client import auth_client
+
+    connex_app = service.create_app()
+    flask_app = connex_app.app
+    client = flask_app.test_client()
+    token = make_token()
+    headers = {"Authorization": f"Bearer {token}"}
+    rng = random.Random(SEED)
+    trail_ids = [rng.randint(1, trails) for _ in range(iterations + 10)]
+    results = {}
+
+    def get(url):
+        # Bypass the response cache so every request does the full work
+        response_cache.response_cache.invalidate()
+        response = client.get(url, headers=headers)
+        assert response.status_code == 200, (url, response.status_code)
+
+    def create(i):
+        response = client.post("/trails", headers=headers, json={
+            "TrailName": f"Benchmark {i} {time.perf_counter_ns()}",
+            "TrailSummary": "Created by benchmark.py",
+            "TrailDescription": "Created by benchmark.py",
+            "Difficulty": "Easy",
+            "Location": "Plymouth",
+            "Length": 1.5,
+            "ElevationGain": 10.0,
+            "RouteType": "Loop",
+        })
+        assert response.status_code == 201, response.status_code
+
+    def login(i):
+        auth_client.cache.clear()
+        response = client.post("/login", json={"email": "tim@plymouth.ac.uk", "password": "COMP2001!"})
+        assert response.status_code == 200, response.status_code
+
+    def validate_uncached(i):
+        auth.token_cache.clear()
+        auth.validate_token(token)
+
+    with flask_app.app_context():
+        results["list_trails"] = measure(lambda i: get(f"/trails?after={trail_ids[i] - 1}"), iterations)
+        results["list_trails_columns"] = measure(
+            lambda i: get(f"/trails?after={trail_ids[i] - 1}&fields={service.SPATIAL_DEFAULT_FIELDS}"), iterations
+        )
+        results["get_trail"] = measure(lambda i: get(f"/trails/{trail_ids[i]}"), iterations)
+        results["list_points"] = measure(lambda i: get(f"/trails/{trail_ids[i]}/points"), iterations)
+        results["create_trail"] = measure(create, iterations)
+        results["login"] = measure(login, iterations)
+        results["jwt_validate_uncached"] = measure(validate_uncached, iterations * 10)
+        results["jwt_validate_cached"] = measure(lambda i: auth.validate_token(token), iterations * 10)
+        results.update(serialization_scenarios(flask_app, max(3, iterations // 50)))
+        # Write the queued activity log while the copied database still exists
+        service.activity_log.stop()
+        service.db.session.remove()
+        for engine in service.db.engines.values():
+            engine.dispose()
+    return results
+
+def serialization_scenarios(flask_app, iterations):
+    """
+    Dump and encode up to SERIALIZE_TRAILS trails with their points: marshmallow and
+    the json module (the original path) against the compiled encoders and orjson.
+    """
+    from flask.json.provider import DefaultJSONProvider
+    import queries
+    import schemas
+    import serializers
+
+    trails = queries.trails_query().limit(SERIALIZE_TRAILS).all()
+    default_json = DefaultJSONProvider(flask_app)
+    with flask_app.test_request_context():
+        original = default_json.response(schemas.trails_schema.dump(trails)).data
+        fast = flask_app.json.response(serializers.dump(schemas.trails_schema, trails)).data
+        assert fast == original, "fast serialization output differs from marshmallow + jsonify"
+        return {
+            f"serialize_{len(trails)}_marshmallow": measure(
+                lambda i: default_json.response(schemas.trails_schema.dump(trails)), iterations, warmup=1
+            ),
+            f"serialize_{len(trails)}_fast": measure(
+                lambda i: flask_app.json.response(serializers.dump(schemas.trails_schema, trails)), iterations, warmup=1
+            ),
+        }
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(previous, current):
+    """
+    Print the change in p50 and throughput against an earlier results file.
+    """
+    print(f"\nCompared with {previous.get('commit')} ({previous.get('timestamp')}):")
+    for dataset, scenarios in current["results"].items():
+        for scenario, stats in scenarios.items():
+            before = previous.get("results", {}).get(dataset, {}).get(scenario)
+            if not before:
+                continue
+            p50_change = (stats["p50_ms"] / before["p50_ms"] - 1) * 100 if before["p50_ms"] else 0.0
+            rps_change = (stats["throughput_rps"] / before["throughput_rps"] - 1) * 100 if before["throughput_rps"] else 0.0
+            print(f"  {dataset:>12} {scenario:<28} p50 {p50_change:+7.1f}%   throughput {rps_change:+7.1f}%")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the trail API hot paths")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="comma-separated trail counts")
+    parser.add_argument("--points", type=int, default=DEFAULT_POINTS, help="location points per trail")
+    parser.add_argument("--requests", type=int, default=DEFAULT_REQUESTS, help="requests per scenario")
+    parser.add_argument("--data-dir", default=os.path.join(tempfile.gettempdir(), "trail-service-benchmark"))
+    parser.add_argument("--output", default="benchmark-results.json")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    args = parser.parse_args()
+
+    # Quiet, deterministic settings for every run
+    os.environ["SLOW_REQUEST_SECONDS"] = "0"
+    # One token sends every request, which the rate limit would turn away
+    os.environ["ADMISSION_CONTROL"] = "0"
+    os.environ.pop("DB_REPLICA_URLS", None)
+    os.makedirs(args.data_dir, exist_ok=True)
+
+    import auth_stub
+    stub = auth_stub.make_server()
+    threading.Thread(target=stub.serve_forever, daemon=True).start()
+    import auth_client
+    auth_client.auth_client.url = f"http://127.0.0.1:{stub.server_port}/users"
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "points_per_trail": args.points,
+        "requests_per_scenario": args.requests,
+        "results": {},
+    }
+    for trails in [int(size) for size in args.sizes.split(",")]:
+        source = dataset_path(args.data_dir, trails, args.points)
+        with tempfile.TemporaryDirectory() as work_dir:
+            database = shutil.copy(source, os.path.join(work_dir, "benchmark.db"))
+            print(f"Benchmarking {trails} trails x {args.points} points", flush=True)
+            results = run_dataset(database, trails, args.requests)
+        report["results"][f"{trails}x{args.points}"] = results
+        for scenario, stats in results.items():
+            print(f"  {scenario:<28} {stats['throughput_rps']:>9} req/s   p50 {stats['p50_ms']:>8} ms   p99 {stats['p99_ms']:>8} ms")
+    stub.shutdown()
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {args.output}")
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,24 +1,53 @@
-from config import app, db
-from models import Trail, LocationPoint
+import pathlib
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import inspect
+from config import create_app, db
+from bulk_import import import_trails
 
 TRAILS = [
-    {"TrailName": "Trail 1"},
-    {"TrailName": "Trail 2"}
+    {
+        "TrailName": "Trail 1",
+        "TrailSummary": "A short coastal walk.",
+        "TrailDescription": "Follows the coast path west from the Hoe.",
+        "Difficulty": "Easy",
+        "Location": "Plymouth",
+        "Length": 0.2,
+        "ElevationGain": 5,
+        "RouteType": "Out and back",
+        "location_points": [
+            {"Latitude": 50.123, "Longitude": -4.123, "Order": 1},
+            {"Latitude": 50.124, "Longitude": -4.124, "Order": 2}
+        ]
+    },
+    {
+        "TrailName": "Trail 2",
+        "TrailSummary": "A moorland loop.",
+        "TrailDescription": "Circular route over open moorland.",
+        "Difficulty": "Moderate",
+        "Location": "Dartmoor",
+        "Length": 8.5,
+        "ElevationGain": 250,
+        "RouteType": "Loop"
+    }
 ]
 
-LOCATION_POINTS = [
-    {"Latitude": 50.123, "Longitude": -4.123, "Order": 1, "TrailID": 1},
-    {"Latitude": 50.124, "Longitude": -4.124, "Order": 2, "TrailID": 1}
-]
+app = create_app().app
+alembic_config = Config(pathlib.Path(__file__).with_name("alembic.ini"))
 
+# A database built before the migrations has the tables of 0001 but no
+# alembic_version table: mark it as being at 0001 so the upgrade starts after it
 with app.app_context():
-    db.drop_all()
-    db.create_all()
-
-    for trail in TRAILS:
-        db.session.add(Trail(**trail))
+    inspector = inspect(db.engine)
+    schema = None if db.engine.dialect.name == "sqlite" else "CW2"
+    if inspector.has_table("TRAIL", schema=schema) and not inspector.has_table("alembic_version"):
+        command.stamp(alembic_config, "0001")
+    db.engine.dispose()
 
-    for point in LOCATION_POINTS:
-        db.session.add(LocationPoint(**point))
+# Bring the schema up to date through the migrations, keeping any existing data
+command.upgrade(alembic_config, "head")
 
-    db.session.commit()
\ No newline at end of file
+with app.app_context():
+    result = import_trails(TRAILS)
+    if result["errors"]:
+        print("Seed errors:", result["errors"])
@@ -0,0 +1,118 @@
+import json
+from marshmallow import ValidationError
+from sqlalchemy import insert
+from config import db
+from models import Trail, LocationPoint
+from lazy_imports import lazy_module
+
+# Bulk import of trails with their location points.
+# Rows are validated a batch at a time and written with executemany inserts
+# inside a single transaction. Invalid rows are skipped and reported.
+
+BATCH_SIZE = 500
+POINT_BATCH_SIZE = 1000
+
+# Plain-dict schemas (trail_import_schema, point_import_schema): validation and
+# type coercion without building ORM objects
+schemas = lazy_module("schemas")
+
+def read_ndjson(stream):
+    """
+    Yield one record per non-blank line of an NDJSON byte stream.
+    Lines that are not valid JSON are yielded as None so they are reported by index.
+    """
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield None
+
+def _batches(records, size):
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def _validate_batch(batch, offset, seen_names, errors):
+    """
+    Return (index, trail_row, point_rows) for every valid record in the batch.
+    """
+    valid = []
+    for i, record in enumerate(batch, start=offset):
+        if not isinstance(record, dict):
+            errors.append({"index": i, "errors": {"_schema": ["Expected a JSON object"]}})
+            continue
+        points = record.get("location_points", [])
+        trail_data = {key: value for key, value in record.items() if key != "location_points"}
+        try:
+            trail_row = schemas.trail_import_schema.load(trail_data)
+            point_rows = schemas.point_import_schema.load(points)
+        except ValidationError as e:
+            errors.append({"index": i, "errors": e.messages})
+            continue
+        if trail_row["TrailName"] in seen_names:
+            errors.append({"index": i, "errors": {"TrailName": ["Duplicate trail name in import"]}})
+            continue
+        seen_names.add(trail_row["TrailName"])
+        valid.append((i, trail_row, point_rows))
+
+    # One query per batch for names that already exist in the database
+    names = [trail_row["TrailName"] for _, trail_row, _ in valid]
+    existing = set(db.session.scalars(db.select(Trail.TrailName).where(Trail.TrailName.in_(names)))) if names else set()
+    if not existing:
+        return valid
+    result = []
+    for i, trail_row, point_rows in valid:
+        if trail_row["TrailName"] in existing:
+            errors.append({"index": i, "errors": {"TrailName": [f"Trail with name {trail_row['TrailName']} already exists"]}})
+        else:
+            result.append((i, trail_row, point_rows))
+    return result
+
+def import_trails(records, batch_size=BATCH_SIZE):
+    """
+    Import an iterable of trail records, each optionally carrying a list of location_points.
+    Commits once at the end; any database error rolls back the whole import.
+    """
+    errors = []
+    trail_ids = []
+    inserted_points = 0
+    seen_names = set()
+    offset = 0
+    try:
+        for batch in _batches(records, batch_size):
+            valid = _validate_batch(batch, offset, seen_names, errors)
+            offset += len(batch)
+            if not valid:
+                continue
+            ids = db.session.scalars(
+                insert(Trail).returning(Trail.TrailID, sort_by_parameter_order=True),
+                [trail_row for _, trail_row, _ in valid],
+            ).all()
+            trail_ids.extend(ids)
+
+            point_rows = [
+                dict(point_row, TrailID=trail_id)
+                for trail_id, (_, _, points) in zip(ids, valid)
+                for point_row in points
+            ]
+            for point_batch in _batches(point_rows, POINT_BATCH_SIZE):
+                db.session.execute(insert(LocationPoint), point_batch)
+            inserted_points += len(point_rows)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return {
+        "inserted_trails": len(trail_ids),
+        "inserted_points": inserted_points,
+        "trail_ids": trail_ids,
+        "errors": sorted(errors, key=lambda error: error["index"]),
+    }
@@ -0,0 +1,160 @@
+import os
+import pathlib
+import re
+import sys
+import tempfile
+import threading
+
+# Query-plan check for the hot API paths.
+# Builds a SQLite database through the migrations, seeds it, and sends the hot
+# requests through the Flask test client while capturing every statement they
+# run. Each captured statement with a WHERE clause is then run through
+# EXPLAIN QUERY PLAN, and the check fails if any of them reads a whole table
+# (SQLite's "SCAN <table>") instead of searching an index. SQL Server plans
+# differ in detail, but a missing index shows up the same way in both.
+#
+#   python check_query_plans.py      # exits with status 1 on a table scan
+#
+# tests/test_query_plans.py runs the same check under pytest.
+
+TRAILS = 200
+POINTS = 10
+
+# (name, method, url, JSON body)
+HOT_REQUESTS = [
+    ("list trails by difficulty", "GET", "/trails?difficulty=Easy", None),
+    ("list trails by location", "GET", "/trails?location=Dartmoor", None),
+    ("list trails by route type", "GET", "/trails?route_type=Loop", None),
+    # With one bound only SQLite guesses a quarter of the table matches and walks
+    # the primary key instead, stopping after one page; it has no histograms
+    # (STAT4) to see a selective bound, so the ranges here are closed
+    ("list trails by length", "GET", "/trails?min_length=50&max_length=52", None),
+    ("list trails by elevation", "GET", "/trails?min_elevation=100&max_elevation=120", None),
+    ("next page by difficulty", "GET", "/trails?difficulty=Easy&after=100", None),
+    ("read trail", "GET", "/trails/1", None),
+    ("list points", "GET", "/trails/1/points", None),
+    ("trail stats", "GET", "/trails/1/stats", None),
+    ("update point", "PUT", "/trails/1/points/2", {"Latitude": 50.5}),
+    ("delete point", "DELETE", "/trails/1/points/3", None),
+    ("trail logs", "GET", "/trails/logs?trail_id=1", None),
+    ("delete trail", "DELETE", "/trails/2", None),
+]
+
+_WHERE = re.compile(r"\bWHERE\b", re.IGNORECASE)
+# "SCAN TRAIL" or "SCAN TRAIL USING INDEX ..." (a full index walk); "SEARCH" uses the index
+_TABLE_SCAN = re.compile(r"^SCAN (?!CONSTANT ROW)")
+
+def seed():
+    from datetime import datetime
+    from config import db
+    from bulk_import import import_trails
+    from models import TrailLog
+
+    difficulties = ["Easy", "Moderate", "Hard"]
+    import_trails(
+        {
+            "TrailName": f"Trail {n}",
+            "TrailSummary": "Seeded for the query-plan check",
+            "TrailDescription": "Seeded for the query-plan check",
+            "Difficulty": difficulties[n % 3],
+            "Location": ["Plymouth", "Dartmoor", "Exmoor", "Bodmin"][n % 4],
+            "Length": float(n % 60),
+            "ElevationGain": float(n * 7 % 500),
+            "RouteType": ["Loop", "Out and back"][n % 2],
+            "location_points": [
+                {"Latitude": 50.0 + n * 0.001, "Longitude": -4.0 - order * 0.001, "Order": order}
+                for order in range(1, POINTS + 1)
+            ],
+        }
+        for n in range(1, TRAILS + 1)
+    )
+    db.session.add_all(
+        TrailLog(TrailID=n % TRAILS + 1, TrailRef=n % TRAILS + 1, AddedBy="seed", Action="update_trail", Timestamp=datetime(2024, 1, 1))
+        for n in range(TRAILS * 5)
+    )
+    db.session.commit()
+    # Give the planner row counts, as a production database would have
+    db.session.execute(db.text("ANALYZE"))
+
+def capture_statements(engine):
+    """
+    Record (statement, parameters) for every single statement run on this thread.
+    """
+    from sqlalchemy import event
+
+    statements = []
+    thread = threading.current_thread()
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and threading.current_thread() is thread:
+            statements.append((statement, parameters))
+
+    return statements
+
+def table_scans(connection, statement, parameters):
+    """
+    Return the plan lines of statement that read a whole table.
+    """
+    plan = connection.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).all()
+    return [detail for _, _, _, detail in plan if _TABLE_SCAN.match(detail)]
+
+def check_requests(flask_app, headers):
+    """
+    Send each of HOT_REQUESTS and return (name, method, url, statement count, problems) for each.
+    problems lists an error status, or each table scan as "<plan detail>: <statement>".
+    Runs inside an app context, on a database seeded by seed().
+    """
+    from config import db
+
+    client = flask_app.test_client()
+    statements = capture_statements(db.engine)
+    results = []
+    with db.engine.connect() as connection:
+        for name, method, url, body in HOT_REQUESTS:
+            del statements[:]
+            response = client.open(url, method=method, json=body, headers=headers)
+            if response.status_code >= 400:
+                results.append((name, method, url, len(statements), [f"returned {response.status_code}"]))
+                continue
+            captured = statements[:]  # EXPLAIN QUERY PLAN below is captured too
+            problems = []
+            for statement, parameters in captured:
+                if _WHERE.search(statement):
+                    problems.extend(
+                        f"{detail}: {' '.join(statement.split())}" for detail in table_scans(connection, statement, parameters)
+                    )
+            results.append((name, method, url, len(captured), problems))
+    return results
+
+def main():
+    directory = tempfile.mkdtemp(prefix="trail-plans-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(directory, 'plans.db')}"
+
+    from alembic import command
+    from alembic.config import Config
+
+    command.upgrade(Config(pathlib.Path(__file__).with_name("alembic.ini")), "head")
+
+    import app as trail_app
+    from activity_log import activity_log
+
+    flask_app = trail_app.create_app().app
+    failures = 0
+    with flask_app.app_context():
+        seed()
+        headers = {"Authorization": "Bearer " + trail_app.generate_jwt({"user_id": "plan-check", "role": "Admin"})}
+        for name, method, url, count, problems in check_requests(flask_app, headers):
+            if problems:
+                failures += 1
+                print(f"FAIL {name}: {method} {url}")
+                for problem in problems:
+                    print(f"  {problem}")
+            else:
+                print(f"ok   {name} ({count} statements)")
+        activity_log.stop()
+    print(f"{failures} of {len(HOT_REQUESTS)} hot requests failed" if failures else "No table scans")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,128 @@
+import random
+import threading
+import time
+from flask import current_app, has_request_context, request
+from flask_sqlalchemy.session import Session
+from itsdangerous import BadSignature, Signer
+from sqlalchemy.sql.dml import UpdateBase
+from auth import SECRET_KEY
+
+# Read-replica routing.
+# Replica engines are registered as Flask-SQLAlchemy binds named replica_0,
+# replica_1, ... . GET and HEAD requests read from one replica, picked once per
+# request; everything else, and all INSERT/UPDATE/DELETE statements and flushes,
+# go to the primary. After a user's own successful write their reads stay on the
+# primary for READ_YOUR_WRITES seconds, so they never see replication lag on
+# data they just changed. The window is remembered per worker and in a signed
+# cookie, so it also holds when the next request lands on another worker.
+
+REPLICA_PREFIX = "replica_"
+READ_METHODS = ("GET", "HEAD")
+PRIMARY_COOKIE = "trail_service_primary_until"
+ROUTE_KEY = "trail_service.db_route"
+READ_YOUR_WRITES = 5
+
+class RecentWriters:
+    """
+    User IDs that wrote within the last READ_YOUR_WRITES seconds.
+    """
+
+    def __init__(self):
+        self._deadlines = {}
+        self._lock = threading.Lock()
+
+    def touch(self, user_id, window):
+        now = time.monotonic()
+        with self._lock:
+            self._deadlines[user_id] = now + window
+            if len(self._deadlines) > 1024:
+                self._deadlines = {user: deadline for user, deadline in self._deadlines.items() if deadline > now}
+
+    def active(self, user_id):
+        with self._lock:
+            deadline = self._deadlines.get(user_id)
+        return deadline is not None and deadline > time.monotonic()
+
+    def clear(self):
+        with self._lock:
+            self._deadlines.clear()
+
+recent_writers = RecentWriters()
+
+# Signed so a client cannot pin itself to the primary by writing its own deadline
+_cookie_signer = Signer(SECRET_KEY, salt=PRIMARY_COOKIE)
+
+def _cookie_deadline():
+    value = request.cookies.get(PRIMARY_COOKIE)
+    if not value:
+        return 0.0
+    try:
+        return float(_cookie_signer.unsign(value))
+    except (BadSignature, ValueError):
+        return 0.0
+
+def replica_urls(value):
+    return [url.strip() for url in (value or "").split(",") if url.strip()]
+
+def replica_binds(urls, options_for):
+    """
+    SQLALCHEMY_BINDS entries for the replica URLs, each with its own engine options.
+    """
+    return {f"{REPLICA_PREFIX}{i}": dict(options_for(url), url=url) for i, url in enumerate(urls)}
+
+def replica_keys(engines):
+    return sorted(key for key in engines if isinstance(key, str) and key.startswith(REPLICA_PREFIX))
+
+def _user_id():
+    validated = request.environ.get("trail_service.auth")
+    return validated[1].get("user_id") if validated else None
+
+def primary_pinned():
+    """
+    Whether the current request's user wrote recently and must read from the primary.
+    """
+    now = time.time()
+    window = current_app.config.get("DB_READ_YOUR_WRITES", READ_YOUR_WRITES)
+    # A deadline further off than one window was not set by remember_write
+    if now < _cookie_deadline() <= now + window + 1:
+        return True
+    user_id = _user_id()
+    return user_id is not None and recent_writers.active(user_id)
+
+def request_route(engines):
+    """
+    The bind key the current request reads from: a replica key, or None for the primary.
+    """
+    if not has_request_context():
+        return None
+    if ROUTE_KEY not in request.environ:
+        keys = replica_keys(engines)
+        use_replica = keys and request.method in READ_METHODS and not primary_pinned()
+        request.environ[ROUTE_KEY] = random.choice(keys) if use_replica else None
+    return request.environ[ROUTE_KEY]
+
+class RoutingSession(Session):
+    """
+    Session that sends reads made while serving a GET request to a replica.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and not isinstance(clause, UpdateBase):
+            key = request_route(self._db.engines)
+            if key is not None:
+                return self._db.engines[key]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+def init_app(app):
+    window = app.config.get("DB_READ_YOUR_WRITES", READ_YOUR_WRITES)
+
+    @app.after_request
+    def remember_write(response):
+        if request.method in READ_METHODS or request.method == "OPTIONS" or response.status_code >= 400:
+            return response
+        user_id = _user_id()
+        if user_id is not None and window > 0:
+            recent_writers.touch(user_id, window)
+            deadline = _cookie_signer.sign(str(int(time.time() + window) + 1)).decode()
+            response.set_cookie(PRIMARY_COOKIE, deadline, max_age=window + 1, httponly=True)
+        return response
@@ -0,0 +1,111 @@
+import threading
+import time
+from config import db
+from models import Feature, TrailFeature
+
+# In-process inverted index from TrailFeatureID to the IDs of the trails tagged
+# with it, so multi-feature queries are set intersections (AND) or unions (OR)
+# instead of a join per feature on every request. notes.py keeps it in sync
+# when features are attached or detached and trails deleted; it is rebuilt from
+# the database when first used and every REBUILD_INTERVAL seconds to pick up
+# writes made by other worker processes.
+
+REBUILD_INTERVAL = 300
+
+class FeatureIndex:
+    def __init__(self):
+        self._trails = {}  # TrailFeatureID -> set of TrailIDs
+        self._ids_by_name = {}  # lower-case feature name -> TrailFeatureID
+        self._built_at = None
+        self._lock = threading.RLock()
+
+    def build(self):
+        """
+        Rebuild the index from the FEATURE and TRAIL_FEATURE tables.
+        """
+        features = db.session.execute(
+            db.select(Feature.TrailFeatureID, Feature.TrailFeature).order_by(Feature.TrailFeatureID)
+        ).all()
+        tags = db.session.execute(db.select(TrailFeature.TrailFeatureID, TrailFeature.TrailID))
+        with self._lock:
+            self._trails = {feature_id: set() for feature_id, _ in features}
+            # New names that differ only in case are refused by notes.create_feature; of older ones the first wins
+            self._ids_by_name = {}
+            for feature_id, name in features:
+                self._ids_by_name.setdefault(name.lower(), feature_id)
+            for feature_id, trail_id in tags:
+                self._trails.setdefault(feature_id, set()).add(trail_id)
+            self._built_at = time.monotonic()
+
+    def ensure_built(self):
+        with self._lock:
+            if self._built_at is None or time.monotonic() - self._built_at > REBUILD_INTERVAL:
+                self.build()
+
+    def invalidate(self):
+        with self._lock:
+            self._built_at = None
+
+    def add_feature(self, feature):
+        with self._lock:
+            if self._built_at is not None:
+                self._trails.setdefault(feature.TrailFeatureID, set())
+                self._ids_by_name.setdefault(feature.TrailFeature.lower(), feature.TrailFeatureID)
+
+    def attach(self, trail_id, feature_id):
+        with self._lock:
+            if self._built_at is not None:
+                self._trails.setdefault(feature_id, set()).add(trail_id)
+
+    def detach(self, trail_id, feature_id):
+        with self._lock:
+            self._trails.get(feature_id, set()).discard(trail_id)
+
+    def remove_trail(self, trail_id):
+        with self._lock:
+            for trail_ids in self._trails.values():
+                trail_ids.discard(trail_id)
+
+    def resolve(self, names=(), ids=()):
+        """
+        Map feature names (case-insensitive) and TrailFeatureIDs to known TrailFeatureIDs.
+        A name is always a name, even one made of digits. Returns (feature_ids, unknown names and IDs).
+        """
+        self.ensure_built()
+        feature_ids, unknown = [], []
+        with self._lock:
+            for name in names:
+                feature_id = self._ids_by_name.get(name.lower())
+                if feature_id is None:
+                    unknown.append(name)
+                else:
+                    feature_ids.append(feature_id)
+            for feature_id in ids:
+                if feature_id in self._trails:
+                    feature_ids.append(feature_id)
+                else:
+                    unknown.append(str(feature_id))
+        return feature_ids, unknown
+
+    def trails_with(self, feature_ids, match_all=True):
+        """
+        Return the sorted IDs of trails tagged with every (match_all) or any of the features.
+        """
+        self.ensure_built()
+        with self._lock:
+            sets = [self._trails.get(feature_id, set()) for feature_id in feature_ids]
+            if not sets:
+                return []
+            if match_all:
+                # Intersect starting from the smallest set
+                sets.sort(key=len)
+                result = set(sets[0])
+                for trail_ids in sets[1:]:
+                    result.intersection_update(trail_ids)
+                    if not result:
+                        break
+            else:
+                result = set().union(*sets)
+        return sorted(result)
+
+feature_index = FeatureIndex()
@@ -0,0 +1,131 @@
+from flask import current_app
+from config import db
+from models import Trail, LocationPoint
+from lazy_imports import lazy_module
+
+# Trail geometry computed from the ordered LocationPoint sequence.
+# Points are packed into NumPy arrays and every metric is computed in one
+# vectorized pass, for a single trail or for the whole catalogue at once.
+# Turn on the TRAIL_STATS_WRITEBACK setting to keep Trail.Length in step with point writes.
+
+EARTH_RADIUS_KM = 6371.0088
+
+np = lazy_module("numpy")
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """
+    Element-wise great-circle distance between arrays of coordinates in degrees.
+    """
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+def load_points(trail_id=None):
+    """
+    Return (trail_ids, latitudes, longitudes) arrays ordered by (TrailID, Order).
+    """
+    statement = db.select(LocationPoint.TrailID, LocationPoint.Latitude, LocationPoint.Longitude).order_by(
+        LocationPoint.TrailID, LocationPoint.Order
+    )
+    if trail_id is not None:
+        statement = statement.where(LocationPoint.TrailID == trail_id)
+    rows = db.session.execute(statement).all()
+    if not rows:
+        return np.empty(0, dtype=np.int64), np.empty(0), np.empty(0)
+    packed = np.array(rows, dtype=np.float64)
+    return packed[:, 0].astype(np.int64), packed[:, 1], packed[:, 2]
+
+def compute_stats(trail_ids, lat, lon):
+    """
+    Compute per-trail metrics for points grouped by trail and ordered within each trail.
+    Returns {trail_id: stats}.
+    """
+    if len(trail_ids) == 0:
+        return {}
+    # Index of the first point of every trail
+    starts = np.flatnonzero(np.r_[True, trail_ids[1:] != trail_ids[:-1]])
+    counts = np.diff(np.r_[starts, len(trail_ids)])
+
+    # Segment i joins point i and i + 1; segments that cross into the next trail count as 0
+    segments = haversine_km(lat[:-1], lon[:-1], lat[1:], lon[1:])
+    segments[trail_ids[1:] != trail_ids[:-1]] = 0.0
+    cumulative = np.r_[0.0, np.cumsum(segments)]
+    lengths = cumulative[starts + counts - 1] - cumulative[starts]
+
+    min_lat = np.minimum.reduceat(lat, starts)
+    max_lat = np.maximum.reduceat(lat, starts)
+    min_lon = np.minimum.reduceat(lon, starts)
+    max_lon = np.maximum.reduceat(lon, starts)
+    centroid_lat = np.add.reduceat(lat, starts) / counts
+    centroid_lon = np.add.reduceat(lon, starts) / counts
+
+    return {
+        int(trail_ids[start]): {
+            "point_count": int(counts[n]),
+            "length_km": round(float(lengths[n]), 4),
+            "bbox": {
+                "min_lat": float(min_lat[n]),
+                "min_lon": float(min_lon[n]),
+                "max_lat": float(max_lat[n]),
+                "max_lon": float(max_lon[n]),
+            },
+            "centroid": {"lat": float(centroid_lat[n]), "lon": float(centroid_lon[n])},
+        }
+        for n, start in enumerate(starts)
+    }
+
+def segment_distances(lat, lon):
+    """
+    Distances between consecutive points of a single trail, and their running total.
+    """
+    segments = haversine_km(lat[:-1], lon[:-1], lat[1:], lon[1:])
+    return segments, np.cumsum(segments)
+
+def trail_stats(trail_id):
+    """
+    Stats for one trail, including per-segment and cumulative distances.
+    """
+    trail_ids, lat, lon = load_points(trail_id)
+    stats = compute_stats(trail_ids, lat, lon).get(trail_id)
+    if stats is None:
+        return {"point_count": 0, "length_km": 0.0, "bbox": None, "centroid": None, "segments_km": [], "cumulative_km": []}
+    segments, cumulative = segment_distances(lat, lon)
+    stats["segments_km"] = np.round(segments, 4).tolist()
+    stats["cumulative_km"] = np.round(cumulative, 4).tolist()
+    return stats
+
+def catalogue_stats():
+    """
+    Stats for every trail with points, from a single query and one vectorized pass.
+    """
+    return compute_stats(*load_points())
+
+def write_back(stats):
+    """
+    Store the computed length of each trail in Trail.Length with one executemany UPDATE.
+    The caller commits.
+    """
+    rows = [{"TrailID": trail_id, "Length": trail["length_km"]} for trail_id, trail in stats.items()]
+    if rows:
+        db.session.execute(db.update(Trail), rows)
+    return len(rows)
+
+def sync_trail_length(trail_id):
+    """
+    Recompute one trail's Length from its (flushed) points, when the TRAIL_STATS_WRITEBACK setting is on.
+    Called before the point write is committed so both land in one transaction.
+    """
+    if not current_app.config.get("TRAIL_STATS_WRITEBACK", False):
+        return
+    stats = compute_stats(*load_points(trail_id))
+    trail = db.session.get(Trail, trail_id)
+    if trail is not None:
+        trail.Length = stats[trail_id]["length_km"] if trail_id in stats else 0.0
+
+if __name__ == "__main__":
+    from config import create_app
+
+    with create_app().app.app_context():
+        updated = write_back(catalogue_stats())
+        db.session.commit()
+        print(f"Updated Length for {updated} trails")
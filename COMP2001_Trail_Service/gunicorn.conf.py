@@ -0,0 +1,61 @@
+import multiprocessing
+import os
+import sys
+
+# Production serving settings, e.g. gunicorn -c gunicorn.conf.py wsgi:app
+# Every value can be overridden from the environment.
+
+bind = os.environ.get("BIND", "0.0.0.0:8000")
+
+# Requests mostly wait on SQL Server, so each worker runs a few threads
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+worker_class = "gthread"
+
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 30))
+# On SIGTERM workers finish in-flight requests for up to this long
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", 30))
+keepalive = 5
+
+# Recycle workers now and then to bound memory growth
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", 10000))
+max_requests_jitter = max_requests // 10
+
+# Load the app in each worker by default so every worker builds its own engine and pool
+preload_app = os.environ.get("GUNICORN_PRELOAD", "0") == "1"
+
+accesslog = "-"
+errorlog = "-"
+
+def post_fork(server, worker):
+    # A preloaded app was built in the master: drop the connections every
+    # engine's pool inherited (replicas too) so the worker opens its own
+    # instead of sharing sockets with its siblings
+    if server.cfg.preload_app:
+        from config import db
+        from wsgi import app
+
+        with app.app_context():
+            for engine in db.engines.values():
+                engine.dispose(close=False)
+
+def post_worker_init(worker):
+    # schemas and numpy are left out of the app import to start workers
+    # quickly; load them in the background now that the worker is up
+    import lazy_imports
+
+    lazy_imports.preload()
+
+def worker_exit(server, worker):
+    # Write out queued activity log events, then close pooled database
+    # connections, primary and replicas, when a worker shuts down
+    if "wsgi" not in sys.modules:
+        return
+    from activity_log import activity_log
+    from config import db
+    from wsgi import app
+
+    activity_log.stop()
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose()
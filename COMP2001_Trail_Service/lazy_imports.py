@@ -0,0 +1,48 @@
+import importlib
+import threading
+
+# Deferred imports, to keep worker start-up short.
+# lazy_module("numpy") returns a stand-in straight away and runs the real import
+# on first attribute access, so a module that needs numpy or the marshmallow
+# schemas for some requests does not load them while the app is being built.
+# preload() then imports them on a background thread once the worker is
+# serving, so they are usually ready before the first request that needs them.
+
+# Modules deferred with lazy_module() across the service
+DEFERRED_MODULES = ("schemas", "numpy")
+
+class LazyModule:
+    """
+    Stand-in for a module that is imported the first time one of its attributes is used.
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attribute):
+        module = self._module
+        if module is None:
+            # import_module holds the module's import lock, so concurrent first uses import it once
+            module = self._module = importlib.import_module(self._name)
+        return getattr(module, attribute)
+
+    def __repr__(self):
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<lazy module {self._name!r} ({state})>"
+
+def lazy_module(name):
+    return LazyModule(name)
+
+def preload(names=DEFERRED_MODULES):
+    """
+    Import the named modules on a daemon thread. Requests that need one before it
+    has finished wait for the same import instead of starting another.
+    """
+    def run():
+        for name in names:
+            importlib.import_module(name)
+
+    thread = threading.Thread(target=run, name="preload", daemon=True)
+    thread.start()
+    return thread
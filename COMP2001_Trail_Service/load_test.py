@@ -0,0 +1,83 @@
+import argparse
+import datetime
+import statistics
+import threading
+import time
+import jwt
+import requests
+from auth import SECRET_KEY
+
+# Simple concurrent load generator for comparing serving modes, e.g.
+#   python app.py                              (development server)
+#   gunicorn -c gunicorn.conf.py wsgi:app      (production server)
+#   python load_test.py --url http://localhost:8000/trails --concurrency 32
+# Every request uses one token, so the server's per-user rate limit applies:
+# raise RATE_LIMIT_PER_SECOND or set ADMISSION_CONTROL=0 to measure raw
+# throughput. Requests turned away with 429/503 are counted as "shed".
+
+def make_token(role="Admin"):
+    payload = {
+        "user_id": "load-test",
+        "role": role,
+        "exp": datetime.datetime.utcnow() + datetime.timedelta(hours=1),
+    }
+    return jwt.encode(payload, SECRET_KEY, algorithm="HS256")
+
+def run(url, requests_total, concurrency, token):
+    latencies = []
+    errors = 0
+    shed = 0
+    lock = threading.Lock()
+    remaining = iter(range(requests_total))
+
+    def worker():
+        nonlocal errors, shed
+        session = requests.Session()
+        session.headers["Authorization"] = f"Bearer {token}"
+        while True:
+            with lock:
+                if next(remaining, None) is None:
+                    return
+            start = time.perf_counter()
+            status = None
+            try:
+                status = session.get(url, timeout=30).status_code
+            except requests.RequestException:
+                pass
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                if status in (429, 503):
+                    shed += 1
+                elif status is None or status >= 400:
+                    errors += 1
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duration = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "shed": shed,
+        "seconds": round(duration, 3),
+        "throughput_rps": round(len(latencies) / duration, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 2),
+        "p99_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000, 2),
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrent GET load test")
+    parser.add_argument("--url", default="http://localhost:8000/trails")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--token", help="Bearer token; one is generated when omitted")
+    args = parser.parse_args()
+    result = run(args.url, args.requests, args.concurrency, args.token or make_token())
+    for key, value in result.items():
+        print(f"{key}: {value}")
@@ -0,0 +1,55 @@
+import logging.config
+from alembic import context
+from config import create_app, db
+import models  # registers every table on db.metadata
+
+# Migrations run against the same database and engine options as the app:
+# DATABASE_URL, or the university SQL Server by default. Only the primary is
+# migrated; replicas receive the changes through replication.
+
+if context.config.config_file_name is not None:
+    logging.config.fileConfig(context.config.config_file_name, disable_existing_loggers=False)
+
+app = create_app().app
+
+# Migrations create and alter tables in this schema. SQLite has no CW2 schema,
+# and its engine maps CW2 to the default one (config.engine_options), but
+# Alembic's ALTER statements do not go through that map, so they get None.
+context.config.attributes["schema"] = (
+    None if app.config["SQLALCHEMY_DATABASE_URI"].startswith("sqlite") else "CW2"
+)
+
+def include_name(name, type_, parent_names):
+    # Autogenerate only looks at the CW2 schema; the rest of the database is not ours
+    if type_ == "schema":
+        return name == "CW2"
+    return True
+
+def run_migrations_offline():
+    context.configure(
+        url=app.config["SQLALCHEMY_DATABASE_URI"],
+        target_metadata=db.metadata,
+        literal_binds=True,
+        include_schemas=True,
+        include_name=include_name,
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+def run_migrations_online():
+    with app.app_context(), db.engine.connect() as connection:
+        context.configure(
+            connection=connection,
+            target_metadata=db.metadata,
+            include_schemas=True,
+            include_name=include_name,
+            # SQLite cannot ALTER most things in place: rebuild the table instead
+            render_as_batch=connection.dialect.name == "sqlite",
+        )
+        with context.begin_transaction():
+            context.run_migrations()
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
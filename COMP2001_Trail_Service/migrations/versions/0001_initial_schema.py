@@ -0,0 +1,79 @@
+"""Initial schema, as created by build_database.py before migrations
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+"""
+from alembic import context, op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+# An existing database already has these tables: build_database.py marks it
+# as being at 0001 before upgrading. By hand: alembic stamp 0001, then
+# alembic upgrade head.
+
+def upgrade():
+    schema = context.config.attributes["schema"]
+    prefix = f"{schema}." if schema else ""
+    op.create_table(
+        "User",
+        sa.Column("UserID", sa.Integer(), primary_key=True),
+        sa.Column("Username", sa.String(255), nullable=False, unique=True),
+        sa.Column("Email", sa.String(255), nullable=False, unique=True),
+        sa.Column("Password", sa.String(255), nullable=False),
+        sa.Column("Role", sa.String(50), nullable=False),
+        schema=schema,
+    )
+    op.create_table(
+        "FEATURE",
+        sa.Column("TrailFeatureID", sa.Integer(), primary_key=True),
+        sa.Column("TrailFeature", sa.String(255), nullable=False, unique=True),
+        schema=schema,
+    )
+    op.create_table(
+        "TRAIL",
+        sa.Column("TrailID", sa.Integer(), primary_key=True),
+        sa.Column("TrailName", sa.String(255), nullable=False, unique=True),
+        sa.Column("TrailSummary", sa.Text(), nullable=False),
+        sa.Column("TrailDescription", sa.Text(), nullable=False),
+        sa.Column("Difficulty", sa.String(50), nullable=False),
+        sa.Column("Location", sa.String(255), nullable=False),
+        sa.Column("Length", sa.Float(), nullable=False),
+        sa.Column("ElevationGain", sa.Float(), nullable=False),
+        sa.Column("RouteType", sa.String(50), nullable=False),
+        sa.Column("timestamp", sa.DateTime()),
+        schema=schema,
+    )
+    op.create_table(
+        "TRAIL_FEATURE",
+        sa.Column("TrailID", sa.Integer(), sa.ForeignKey(prefix + "TRAIL.TrailID"), primary_key=True),
+        sa.Column("TrailFeatureID", sa.Integer(), sa.ForeignKey(prefix + "FEATURE.TrailFeatureID"), primary_key=True),
+        schema=schema,
+    )
+    op.create_table(
+        "LocationPoint",
+        sa.Column("LocationPointID", sa.Integer(), primary_key=True),
+        sa.Column("TrailID", sa.Integer(), sa.ForeignKey(prefix + "TRAIL.TrailID"), nullable=False),
+        sa.Column("Latitude", sa.Float(), nullable=False),
+        sa.Column("Longitude", sa.Float(), nullable=False),
+        sa.Column("Order", sa.Integer(), nullable=False),
+        schema=schema,
+    )
+    op.create_table(
+        "Trail_Log",
+        sa.Column("LogID", sa.Integer(), primary_key=True),
+        sa.Column("TrailID", sa.Integer(), sa.ForeignKey(prefix + "TRAIL.TrailID")),
+        sa.Column("UserID", sa.Integer(), sa.ForeignKey(prefix + "User.UserID")),
+        sa.Column("AddedBy", sa.String(50), nullable=False),
+        sa.Column("Timestamp", sa.DateTime()),
+        schema=schema,
+    )
+
+def downgrade():
+    schema = context.config.attributes["schema"]
+    for table in ("Trail_Log", "LocationPoint", "TRAIL_FEATURE", "TRAIL", "FEATURE", "User"):
+        op.drop_table(table, schema=schema)
@@ -0,0 +1,29 @@
+"""Trail_Log columns written by the activity log
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+"""
+from alembic import context, op
+import sqlalchemy as sa
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    schema = context.config.attributes["schema"]
+    op.add_column("Trail_Log", sa.Column("Action", sa.String(50)), schema=schema)
+    op.add_column("Trail_Log", sa.Column("Role", sa.String(50)), schema=schema)
+    op.add_column("Trail_Log", sa.Column("TrailRef", sa.Integer()), schema=schema)
+    op.add_column("Trail_Log", sa.Column("LocationPointID", sa.Integer()), schema=schema)
+    # Entries written before this revision are all about a live trail
+    log = sa.table("Trail_Log", sa.column("TrailID"), sa.column("TrailRef"), schema=schema)
+    op.execute(log.update().values(TrailRef=log.c.TrailID))
+
+def downgrade():
+    schema = context.config.attributes["schema"]
+    with op.batch_alter_table("Trail_Log", schema=schema) as batch:
+        for column in ("LocationPointID", "TrailRef", "Role", "Action"):
+            batch.drop_column(column)
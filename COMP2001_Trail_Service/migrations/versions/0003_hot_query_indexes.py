@@ -0,0 +1,38 @@
+"""Indexes for the hot queries
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+"""
+from alembic import context, op
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+# (index, table, columns); each is also declared in models.py
+INDEXES = [
+    # A trail's points in order: point listing, geometry and the selectinload of trail reads
+    ("ix_LocationPoint_TrailID_Order", "LocationPoint", ["TrailID", "Order"]),
+    # A trail's log entries by time, and clearing TrailID when the trail is deleted
+    ("ix_Trail_Log_TrailID_Timestamp", "Trail_Log", ["TrailID", "Timestamp"]),
+    # GET /trails/logs?trail_id=, which also covers deleted trails and pages by LogID
+    ("ix_Trail_Log_TrailRef_LogID", "Trail_Log", ["TrailRef", "LogID"]),
+    # GET /trails filters; each index also orders its matches by TrailID for keyset paging
+    ("ix_TRAIL_Difficulty", "TRAIL", ["Difficulty"]),
+    ("ix_TRAIL_Location", "TRAIL", ["Location"]),
+    ("ix_TRAIL_RouteType", "TRAIL", ["RouteType"]),
+    ("ix_TRAIL_Length", "TRAIL", ["Length"]),
+    ("ix_TRAIL_ElevationGain", "TRAIL", ["ElevationGain"]),
+]
+
+def upgrade():
+    schema = context.config.attributes["schema"]
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns, schema=schema)
+
+def downgrade():
+    schema = context.config.attributes["schema"]
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table, schema=schema)
@@ -1,7 +1,11 @@
 import pytz
 from datetime import datetime
-from marshmallow_sqlalchemy import fields
-from config import db, ma
+from config import db
+
+# Marshmallow schemas for these models are in schemas.py
+
+def london_now():
+    return datetime.now(pytz.timezone('Europe/London'))
 
 # User table
 class User(db.Model):
@@ -13,12 +17,6 @@ class User(db.Model):
     Password = db.Column(db.String(255), nullable=False)
     Role = db.Column(db.String(50), nullable=False)  # e.g., Admin or User
 
-class UserSchema(ma.SQLAlchemyAutoSchema):
-    class Meta:
-        model = User
-        load_instance = True
-        sqla_session = db.session
-
 # Feature table
 class Feature(db.Model):
     __tablename__ = "FEATURE"
@@ -26,16 +24,25 @@ class Feature(db.Model):
     TrailFeatureID = db.Column(db.Integer, primary_key=True)
     TrailFeature = db.Column(db.String(255), nullable=False, unique=True)
 
-class FeatureSchema(ma.SQLAlchemyAutoSchema):
-    class Meta:
-        model = Feature
-        load_instance = True
-        sqla_session = db.session
+# Many-to-Many relationship table
+class TrailFeature(db.Model):
+    __tablename__ = "TRAIL_FEATURE"
+    __table_args__ = {'schema': 'CW2'}
+    TrailID = db.Column(db.Integer, db.ForeignKey("CW2.TRAIL.TrailID"), primary_key=True)
+    TrailFeatureID = db.Column(db.Integer, db.ForeignKey("CW2.FEATURE.TrailFeatureID"), primary_key=True)
 
 # Trail table
 class Trail(db.Model):
     __tablename__ = "TRAIL"
-    __table_args__ = {'schema': 'CW2'}
+    # Indexes are created by migrations/ (alembic upgrade head)
+    __table_args__ = (
+        db.Index("ix_TRAIL_Difficulty", "Difficulty"),
+        db.Index("ix_TRAIL_Location", "Location"),
+        db.Index("ix_TRAIL_RouteType", "RouteType"),
+        db.Index("ix_TRAIL_Length", "Length"),
+        db.Index("ix_TRAIL_ElevationGain", "ElevationGain"),
+        {'schema': 'CW2'},
+    )
     TrailID = db.Column(db.Integer, primary_key=True)
     TrailName = db.Column(db.String(255), nullable=False, unique=True)
     TrailSummary = db.Column(db.Text, nullable=False)
@@ -47,21 +54,32 @@ class Trail(db.Model):
     RouteType = db.Column(db.String(50), nullable=False)
     timestamp = db.Column(
         db.DateTime,
-        default=lambda: datetime.now(pytz.timezone('Europe/London')),
-        onupdate=lambda: datetime.now(pytz.timezone('Europe/London'))
+        default=london_now,
+        onupdate=london_now
     )
     
     
     location_points = db.relationship(
         "LocationPoint",
         back_populates="trail",
-        cascade="all, delete-orphan"
+        cascade="all, delete-orphan",
+        order_by="LocationPoint.Order"
+    )
+    # Tagging goes through TrailFeature rows; this relationship reads the tags and
+    # removes them with the trail
+    features = db.relationship(
+        "Feature",
+        secondary="CW2.TRAIL_FEATURE",
+        order_by="Feature.TrailFeatureID"
     )
     
     # LocationPoint table
 class LocationPoint(db.Model):
     __tablename__ = "LocationPoint"
-    __table_args__ = {'schema': 'CW2'}
+    __table_args__ = (
+        db.Index("ix_LocationPoint_TrailID_Order", "TrailID", "Order"),
+        {'schema': 'CW2'},
+    )
     LocationPointID = db.Column(db.Integer, primary_key=True)
     TrailID = db.Column(db.Integer, db.ForeignKey("CW2.TRAIL.TrailID"), nullable=False)
     Latitude = db.Column(db.Float, nullable=False)
@@ -70,33 +88,14 @@ class LocationPoint(db.Model):
 
     trail = db.relationship("Trail", back_populates="location_points")
 
-class TrailSchema(ma.SQLAlchemyAutoSchema):
-    class Meta:
-        model = Trail
-        load_instance = True
-        sqla_session = db.session
-
-    location_points = ma.Nested("LocationPointSchema", many=True)
-
-
-# Many-to-Many relationship table
-class TrailFeature(db.Model):
-    __tablename__ = "TRAIL_FEATURE"
-    __table_args__ = {'schema': 'CW2'}
-    TrailID = db.Column(db.Integer, db.ForeignKey("CW2.TRAIL.TrailID"), primary_key=True)
-    TrailFeatureID = db.Column(db.Integer, db.ForeignKey("CW2.FEATURE.TrailFeatureID"), primary_key=True)
-
-class TrailFeatureSchema(ma.SQLAlchemyAutoSchema):
-    class Meta:
-        model = TrailFeature
-        load_instance = True
-        sqla_session = db.session
-        include_fk = True
-
 # Log table
 class TrailLog(db.Model):
     __tablename__ = "Trail_Log"
-    __table_args__ = {'schema': 'CW2'}
+    __table_args__ = (
+        db.Index("ix_Trail_Log_TrailID_Timestamp", "TrailID", "Timestamp"),
+        db.Index("ix_Trail_Log_TrailRef_LogID", "TrailRef", "LogID"),
+        {'schema': 'CW2'},
+    )
     LogID = db.Column(db.Integer, primary_key=True)
     TrailID = db.Column(db.Integer, db.ForeignKey("CW2.TRAIL.TrailID"))
     UserID = db.Column(db.Integer, db.ForeignKey("CW2.User.UserID"))  # Link to User table
@@ -104,41 +103,9 @@ class TrailLog(db.Model):
     Timestamp = db.Column(
         db.DateTime, default=lambda: datetime.now(pytz.timezone('Europe/London'))
     )
-
-class TrailLogSchema(ma.SQLAlchemyAutoSchema):
-    class Meta:
-        model = TrailLog
-        load_instance = True
-        sqla_session = db.session
-        include_fk = True
-        
-        
-        
-class LocationPointSchema(ma.SQLAlchemyAutoSchema):
-    class Meta:
-        model = LocationPoint
-        load_instance = True
-        sqla_session = db.session
-        include_fk = True
-
-    TrailID = ma.auto_field(required=False)  # Make TrailID optional for the schema
-
-
-# Marshmallow schemas
-user_schema = UserSchema()
-users_schema = UserSchema(many=True)
-
-feature_schema = FeatureSchema()
-features_schema = FeatureSchema(many=True)
-
-trail_schema = TrailSchema()
-trails_schema = TrailSchema(many=True)
-
-trail_feature_schema = TrailFeatureSchema()
-trail_features_schema = TrailFeatureSchema(many=True)
-
-trail_log_schema = TrailLogSchema()
-trail_logs_schema = TrailLogSchema(many=True)
-
-location_point_schema = LocationPointSchema()
-location_points_schema = LocationPointSchema(many=True)
\ No newline at end of file
+    # Written by activity_log.py: what was done, by which role, to which point.
+    # TrailRef keeps the trail's ID after TrailID is cleared by its deletion.
+    Action = db.Column(db.String(50))
+    Role = db.Column(db.String(50))
+    TrailRef = db.Column(db.Integer)
+    LocationPointID = db.Column(db.Integer)
@@ -1,43 +1,31 @@
 from flask import abort, make_response, request
 from config import db
-from models import Trail, Feature, LocationPoint, TrailLog, trail_schema, trails_schema, feature_schema, features_schema, trail_logs_schema, location_point_schema, location_points_schema
-import jwt
+from models import Trail, Feature, LocationPoint, TrailFeature, TrailLog, london_now
+from marshmallow import ValidationError
+import bulk_import
+import geometry
+import point_sequence
+import polyline
+import queries
+import response_cache
+import serializers
+import track_import
+from feature_index import feature_index
+from search_index import search_index
+from spatial_index import spatial_index
+from trail_snapshot import trail_snapshot
+from activity_log import activity_log
+from auth import require_auth
+from lazy_imports import lazy_module
 
-# Secret key for JWT validation
-SECRET_KEY = "secret-key"
-
-# Token validation function
-def validate_token(token):
-    try:
-        # Remove "Bearer " prefix if present
-        token = token.split(" ")[1] if " " in token else token
-        decoded_token = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
-        return decoded_token  # Return decoded token if needed
-    except jwt.ExpiredSignatureError:
-        abort(401, description="Token has expired")
-    except jwt.InvalidTokenError:
-        abort(401, description="Invalid token")
-
-# Authentication decorator with role-based access
-def require_auth(roles=None):
-    def decorator(func):
-        def wrapper(*args, **kwargs):
-            token = request.headers.get("Authorization")
-            if not token:
-                abort(401, description="Authorization token is missing")
-            decoded = validate_token(token)
-            if roles and decoded.get("role") not in roles:
-                abort(403, description="Forbidden: Insufficient permissions")
-            return func(*args, **kwargs)
-        return wrapper
-    return decorator
+schemas = lazy_module("schemas")
 
 # Trail Functions
 @require_auth(roles=["Admin", "User"])  # Both Admin and User can read trails
 def read_all_trails():
-    trails = Trail.query.all()
+    trails = queries.all_trails()
     if trails:
-        return trails_schema.dump(trails), 200
+        return serializers.dump(schemas.trails_schema, trails), 200
     abort(404, description="No trails found")
 
 @require_auth(roles=["Admin"])  # Only Admin can create trails
@@ -46,17 +34,66 @@ def create_trail(trail):
     existing_trail = Trail.query.filter(Trail.TrailName == trail_name).one_or_none()
 
     if not existing_trail:
-        new_trail = trail_schema.load(trail, session=db.session)
+        new_trail = schemas.trail_schema.load(trail, session=db.session)
         db.session.add(new_trail)
         db.session.commit()
-        return trail_schema.dump(new_trail), 201
+        response_cache.invalidate()
+        trail_snapshot.invalidate()
+        for point in new_trail.location_points:
+            spatial_index.add_point(point)
+        search_index.add_trail(new_trail)
+        activity_log.record("create_trail", new_trail.TrailID)
+        return serializers.dump(schemas.trail_schema, new_trail), 201
     abort(406, description=f"Trail with name {trail_name} already exists")
 
+@require_auth(roles=["Admin"])  # Only Admin can bulk import trails
+def import_trails(records):
+    try:
+        result = bulk_import.import_trails(records)
+    except Exception as e:
+        abort(400, description=str(e))
+    if result["inserted_trails"]:
+        response_cache.invalidate()
+        trail_snapshot.invalidate()
+        spatial_index.invalidate()
+        search_index.invalidate()
+    for trail_id in result["trail_ids"]:
+        activity_log.record("import_trail", trail_id)
+    if result["errors"] and not result["inserted_trails"]:
+        return result, 400
+    return result, 201
+
+@require_auth(roles=["Admin"])  # Only Admin can upload GPS tracks
+def upload_track(track_format, stream, fields):
+    for field, name in (("Difficulty", "difficulty"), ("Location", "location")):
+        if not fields.get(field):
+            abort(400, description=f"{name} is required")
+    try:
+        trail_id, stats = track_import.import_track(track_import.reader_for(track_format, stream), fields)
+    except track_import.TrailExists as e:
+        abort(406, description=str(e))
+    except track_import.TrackError as e:
+        abort(400, description=str(e))
+    response_cache.invalidate()
+    trail_snapshot.invalidate()
+    spatial_index.invalidate()
+    trail = db.session.get(Trail, trail_id)
+    search_index.add_trail(trail)
+    activity_log.record("upload_track", trail_id)
+    result = serializers.dump(schemas.trail_summary_schema, trail)
+    result["point_count"] = stats.point_count
+    return result, 201
+
 @require_auth(roles=["Admin", "User"])  # Both Admin and User can read a single trail
 def read_one_trail(trail_id):
-    trail = Trail.query.get(trail_id)
+    snapshot = trail_snapshot.current()
+    if snapshot is not None:
+        result = snapshot.trail(trail_id)
+        if result is not None:
+            return result
+    trail = queries.get_trail(trail_id)
     if trail:
-        return trail_schema.dump(trail)
+        return serializers.dump(schemas.trail_schema, trail)
     abort(404, description=f"Trail with ID {trail_id} not found")
 
 @require_auth(roles=["Admin"])  # Only Admin can update trails
@@ -66,15 +103,28 @@ def update_trail(trail_id, trail):
         for key, value in trail.items():
             setattr(existing_trail, key, value)
         db.session.commit()
-        return trail_schema.dump(existing_trail), 200
+        response_cache.invalidate()
+        trail_snapshot.invalidate()
+        search_index.add_trail(existing_trail)
+        activity_log.record("update_trail", trail_id)
+        return serializers.dump(schemas.trail_schema, existing_trail), 200
     abort(404, description=f"Trail with ID {trail_id} not found")
 
 @require_auth(roles=["Admin"])  # Only Admin can delete trails
 def delete_trail(trail_id):
     existing_trail = Trail.query.get(trail_id)
     if existing_trail:
+        # Earlier log entries outlive the trail through TrailRef
+        TrailLog.query.filter(TrailLog.TrailID == trail_id).update({TrailLog.TrailID: None})
         db.session.delete(existing_trail)
         db.session.commit()
+        response_cache.invalidate()
+        trail_snapshot.invalidate()
+        spatial_index.remove_trail(trail_id)
+        search_index.remove_trail(trail_id)
+        feature_index.remove_trail(trail_id)
+        polyline.simplification_cache.invalidate_trail(trail_id)
+        activity_log.record("delete_trail", trail_id)
         return {"message": f"Trail ID {trail_id} successfully deleted"}, 200
     abort(404, description=f"Trail with ID {trail_id} not found")
 
@@ -85,20 +135,51 @@ def add_location_point(trail_id, location_data):
     if not trail:
         abort(404, description=f"Trail with ID {trail_id} not found")
     try:
-        location_point = location_point_schema.load(location_data, session=db.session)
+        location_point = schemas.location_point_schema.load(location_data, session=db.session)
         location_point.TrailID = trail_id
         db.session.add(location_point)
+        _points_written(trail_id)
         db.session.commit()
-        return location_point_schema.dump(location_point), 201
+        response_cache.invalidate()
+        trail_snapshot.invalidate()
+        spatial_index.add_point(location_point)
+        polyline.simplification_cache.invalidate_trail(trail_id)
+        activity_log.record("add_point", trail_id, location_point.LocationPointID)
+        return serializers.dump(schemas.location_point_schema, location_point), 201
     except Exception as e:
         abort(400, description=str(e))
 
 @require_auth(roles=["Admin", "User"])  # Both Admin and User can get location points
 def get_location_points(trail_id):
+    snapshot = trail_snapshot.current()
+    if snapshot is not None:
+        points = snapshot.location_points(trail_id)
+        if points is not None:
+            return points, 200
     trail = Trail.query.get(trail_id)
     if not trail:
         abort(404, description=f"Trail with ID {trail_id} not found")
-    return location_points_schema.dump(trail.location_points), 200
+    return serializers.dump(schemas.location_points_schema, trail.location_points), 200
+
+@require_auth(roles=["Admin", "User"])  # Both Admin and User can get location points
+def get_simplified_points(trail_id, tolerance_m=None):
+    if not db.session.get(Trail, trail_id):
+        abort(404, description=f"Trail with ID {trail_id} not found")
+    return polyline.simplification_cache.get(trail_id, tolerance_m)
+
+@require_auth(roles=["Admin", "User"])  # Both Admin and User can get trail stats
+def get_trail_stats(trail_id):
+    if not db.session.get(Trail, trail_id):
+        abort(404, description=f"Trail with ID {trail_id} not found")
+    return geometry.trail_stats(trail_id), 200
+
+@require_auth(roles=["Admin"])  # Only Admin can recompute stored trail lengths
+def recompute_trail_stats():
+    updated = geometry.write_back(geometry.catalogue_stats())
+    db.session.commit()
+    response_cache.invalidate()
+    trail_snapshot.invalidate()
+    return {"message": f"Updated Length for {updated} trails"}, 200
 
 @require_auth(roles=["Admin"])  # Only Admin can update location points
 def update_location_point(trail_id, point_id, location_data):
@@ -108,24 +189,155 @@ def update_location_point(trail_id, point_id, location_data):
     try:
         for key, value in location_data.items():
             setattr(location_point, key, value)
+        _points_written(trail_id)
         db.session.commit()
-        return location_point_schema.dump(location_point), 200
+        response_cache.invalidate()
+        trail_snapshot.invalidate()
+        spatial_index.add_point(location_point)
+        polyline.simplification_cache.invalidate_trail(trail_id)
+        activity_log.record("update_point", trail_id, point_id)
+        return serializers.dump(schemas.location_point_schema, location_point), 200
     except Exception as e:
         abort(400, description=str(e))
 
+def _points_written(trail_id):
+    # Moves the trail's timestamp with its points, so its ETag and Last-Modified change too.
+    # Runs before the point write is committed, so both land in one transaction.
+    db.session.execute(db.update(Trail).where(Trail.TrailID == trail_id).values(timestamp=london_now()))
+    geometry.sync_trail_length(trail_id)
+
+def _point_sequence_changed(trail_id):
+    _points_written(trail_id)
+    db.session.commit()
+    response_cache.invalidate()
+    trail_snapshot.invalidate()
+    spatial_index.invalidate()
+    polyline.simplification_cache.invalidate_trail(trail_id)
+
+@require_auth(roles=["Admin"])  # Only Admin can replace a trail's location points
+def replace_location_points(trail_id, points):
+    if not db.session.get(Trail, trail_id):
+        abort(404, description=f"Trail with ID {trail_id} not found")
+    try:
+        count = point_sequence.replace_points(trail_id, points)
+    except point_sequence.SequenceError as e:
+        db.session.rollback()
+        abort(400, description=str(e))
+    _point_sequence_changed(trail_id)
+    activity_log.record("replace_points", trail_id)
+    return {"message": f"Replaced location points of trail ID {trail_id} with {count} points"}, 200
+
+@require_auth(roles=["Admin"])  # Only Admin can reorder or splice a trail's location points
+def edit_location_points(trail_id, edit):
+    if not db.session.get(Trail, trail_id):
+        abort(404, description=f"Trail with ID {trail_id} not found")
+    try:
+        if "order" in edit:
+            count = point_sequence.reorder_points(trail_id, edit["order"])
+            message = f"Reordered {count} location points of trail ID {trail_id}"
+        else:
+            delete_ids = edit.get("delete", [])
+            count = point_sequence.splice_points(trail_id, edit.get("after"), edit.get("insert", []), delete_ids)
+            message = f"Inserted {count} and deleted {len(delete_ids)} location points on trail ID {trail_id}"
+    except (point_sequence.SequenceError, TypeError) as e:
+        db.session.rollback()
+        abort(400, description=str(e))
+    _point_sequence_changed(trail_id)
+    activity_log.record("edit_points", trail_id)
+    return {"message": message}, 200
+
 @require_auth(roles=["Admin"])  # Only Admin can delete location points
 def delete_location_point(trail_id, point_id):
     location_point = LocationPoint.query.filter_by(LocationPointID=point_id, TrailID=trail_id).first()
     if not location_point:
         abort(404, description=f"Location point with ID {point_id} not found on trail ID {trail_id}")
     db.session.delete(location_point)
+    _points_written(trail_id)
     db.session.commit()
+    response_cache.invalidate()
+    trail_snapshot.invalidate()
+    spatial_index.remove_point(point_id)
+    polyline.simplification_cache.invalidate_trail(trail_id)
+    activity_log.record("delete_point", trail_id, point_id)
     return {"message": f"Location point ID {point_id} successfully deleted from trail ID {trail_id}"}, 200
 
+# Feature Functions
+@require_auth(roles=["Admin", "User"])  # Both Admin and User can read features
+def read_all_features():
+    features = Feature.query.order_by(Feature.TrailFeatureID).all()
+    return serializers.dump(schemas.features_schema, features), 200
+
+def _feature_named(name):
+    # Names are compared ignoring case, as the feature index and SQL Server's collation do
+    return Feature.query.filter(db.func.lower(Feature.TrailFeature) == name.lower()).first()
+
+@require_auth(roles=["Admin"])  # Only Admin can create features
+def create_feature(feature):
+    name = feature.get("TrailFeature")
+    if isinstance(name, str) and _feature_named(name):
+        abort(406, description=f"Feature {name} already exists")
+    try:
+        new_feature = schemas.feature_schema.load(feature, session=db.session)
+    except ValidationError as e:
+        abort(400, description=str(e.messages))
+    db.session.add(new_feature)
+    db.session.commit()
+    feature_index.add_feature(new_feature)
+    return serializers.dump(schemas.feature_schema, new_feature), 201
+
+@require_auth(roles=["Admin", "User"])  # Both Admin and User can read a trail's features
+def get_trail_features(trail_id):
+    trail = db.session.get(Trail, trail_id)
+    if not trail:
+        abort(404, description=f"Trail with ID {trail_id} not found")
+    return serializers.dump(schemas.features_schema, trail.features), 200
+
+@require_auth(roles=["Admin"])  # Only Admin can tag trails
+def attach_feature(trail_id, data):
+    if not db.session.get(Trail, trail_id):
+        abort(404, description=f"Trail with ID {trail_id} not found")
+    if data.get("TrailFeatureID") is not None:
+        feature = db.session.get(Feature, data["TrailFeatureID"])
+    elif data.get("TrailFeature"):
+        feature = _feature_named(data["TrailFeature"])
+    else:
+        abort(400, description="TrailFeatureID or TrailFeature is required")
+    if not feature:
+        abort(404, description="Feature not found")
+    if db.session.get(TrailFeature, (trail_id, feature.TrailFeatureID)):
+        return serializers.dump(schemas.feature_schema, feature), 200
+    db.session.add(TrailFeature(TrailID=trail_id, TrailFeatureID=feature.TrailFeatureID))
+    db.session.commit()
+    feature_index.attach(trail_id, feature.TrailFeatureID)
+    activity_log.record("attach_feature", trail_id)
+    return serializers.dump(schemas.feature_schema, feature), 201
+
+@require_auth(roles=["Admin"])  # Only Admin can untag trails
+def detach_feature(trail_id, feature_id):
+    link = db.session.get(TrailFeature, (trail_id, feature_id))
+    if not link:
+        abort(404, description=f"Feature ID {feature_id} is not attached to trail ID {trail_id}")
+    db.session.delete(link)
+    db.session.commit()
+    feature_index.detach(trail_id, feature_id)
+    activity_log.record("detach_feature", trail_id)
+    return {"message": f"Feature ID {feature_id} removed from trail ID {trail_id}"}, 200
+
+@require_auth(roles=["Admin", "User"])  # Both Admin and User can search by feature
+def trails_with_features(names=(), ids=(), match_all=True):
+    """
+    Sorted IDs of trails tagged with all (or any) of the features, given by name or TrailFeatureID.
+    """
+    feature_ids, unknown = feature_index.resolve(names, ids)
+    if unknown:
+        abort(404, description=f"Unknown features: {', '.join(unknown)}")
+    return feature_index.trails_with(feature_ids, match_all)
+
 # Trail Log Functions
 @require_auth(roles=["Admin", "User"])  # Both Admin and User can read trail logs
-def read_all_trail_logs():
-    logs = TrailLog.query.all()
-    if logs:
-        return trail_logs_schema.dump(logs), 200
-    abort(404, description="No trail logs found")
\ No newline at end of file
+def read_all_trail_logs(args):
+    """
+    One page of trail logs, filtered by the query-string arguments, and the cursor for the next page.
+    """
+    logs, next_cursor = queries.list_trail_logs(args)
+    return serializers.dump(schemas.trail_logs_schema, logs), next_cursor
\ No newline at end of file
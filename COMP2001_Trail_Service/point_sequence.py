@@ -0,0 +1,119 @@
+from marshmallow import ValidationError
+from sqlalchemy import delete, insert, update
+from config import db
+from models import LocationPoint
+from lazy_imports import lazy_module
+
+# Batch edits of a trail's point sequence.
+# Orders written here are spaced ORDER_GAP apart, so a later splice can slot
+# new points into the gap without touching the points that follow. Only when a
+# gap is used up is the trail renumbered, with a single executemany UPDATE.
+# Nothing here commits; the caller commits once for the whole edit.
+
+ORDER_GAP = 1024
+
+schemas = lazy_module("schemas")
+
+class SequenceError(ValueError):
+    """
+    The requested edit does not match the trail's current points.
+    """
+
+# Set here rather than taken from the request: Order from the position in the
+# sequence, TrailID from the URL and LocationPointID by the insert. Ignoring them
+# lets a client send back what GET /trails/<id>/points returned.
+IGNORED_KEYS = ("LocationPointID", "TrailID", "Order")
+
+def _validated(points):
+    if not isinstance(points, list) or not all(isinstance(point, dict) for point in points):
+        raise SequenceError("points must be a list of location point objects")
+    try:
+        return schemas.point_import_schema.load([
+            {key: value for key, value in point.items() if key not in IGNORED_KEYS} for point in points
+        ], partial=("Order",))
+    except ValidationError as e:
+        raise SequenceError(e.messages) from e
+
+def _current(trail_id):
+    """
+    Return [(LocationPointID, Order)] for the trail, ordered by Order.
+    """
+    return db.session.execute(
+        db.select(LocationPoint.LocationPointID, LocationPoint.Order)
+        .where(LocationPoint.TrailID == trail_id)
+        .order_by(LocationPoint.Order, LocationPoint.LocationPointID)
+    ).all()
+
+def _renumber(point_ids, gap_at=None, gap_size=0):
+    """
+    Give the points Orders ORDER_GAP, 2 * ORDER_GAP, ... in the given sequence,
+    with an extra gap_size before position gap_at.
+    """
+    rows = [
+        {"LocationPointID": point_id, "Order": (i + 1) * ORDER_GAP + (gap_size if gap_at is not None and i >= gap_at else 0)}
+        for i, point_id in enumerate(point_ids)
+    ]
+    if rows:
+        db.session.execute(update(LocationPoint), rows)
+    return [(row["LocationPointID"], row["Order"]) for row in rows]
+
+def _insert(trail_id, points, orders):
+    rows = [dict(point, TrailID=trail_id, Order=order) for point, order in zip(points, orders)]
+    if rows:
+        db.session.execute(insert(LocationPoint), rows)
+
+def replace_points(trail_id, points):
+    """
+    Replace every point of the trail with the given sequence.
+    """
+    points = _validated(list(points))
+    db.session.execute(delete(LocationPoint).where(LocationPoint.TrailID == trail_id))
+    _insert(trail_id, points, [(i + 1) * ORDER_GAP for i in range(len(points))])
+    return len(points)
+
+def reorder_points(trail_id, point_ids):
+    """
+    Put the trail's existing points in the order given by point_ids, which must list each exactly once.
+    """
+    current = {point_id for point_id, _ in _current(trail_id)}
+    if len(point_ids) != len(set(point_ids)) or set(point_ids) != current:
+        raise SequenceError("order must list every location point of the trail exactly once")
+    _renumber(point_ids)
+    return len(point_ids)
+
+def splice_points(trail_id, after=None, points=(), delete_ids=()):
+    """
+    Delete delete_ids, then insert points after the point with ID after (or at the start when None).
+    """
+    points = _validated(list(points))
+    current = _current(trail_id)
+    known = {point_id for point_id, _ in current}
+    missing = [point_id for point_id in delete_ids if point_id not in known]
+    if missing:
+        raise SequenceError(f"Location points {missing} not found on trail ID {trail_id}")
+    if delete_ids:
+        db.session.execute(
+            delete(LocationPoint).where(LocationPoint.TrailID == trail_id, LocationPoint.LocationPointID.in_(delete_ids))
+        )
+        deleted = set(delete_ids)
+        current = [(point_id, order) for point_id, order in current if point_id not in deleted]
+    if not points:
+        return 0
+    if after is not None and after not in {point_id for point_id, _ in current}:
+        raise SequenceError(f"Location point with ID {after} not found on trail ID {trail_id}")
+
+    position = 0 if after is None else [point_id for point_id, _ in current].index(after) + 1
+
+    def bounds(sequence):
+        lower = 0 if position == 0 else sequence[position - 1][1]
+        upper = sequence[position][1] if position < len(sequence) else lower + (len(points) + 1) * ORDER_GAP
+        return lower, upper
+
+    lower, upper = bounds(current)
+    if upper - lower <= len(points):
+        # Gap used up: respace the whole trail, leaving room for the new points
+        current = _renumber([point_id for point_id, _ in current], position, len(points) * ORDER_GAP)
+        lower, upper = bounds(current)
+    step = (upper - lower) / (len(points) + 1)
+    _insert(trail_id, points, [lower + int(step * (i + 1)) for i in range(len(points))])
+    return len(points)
@@ -0,0 +1,151 @@
+import threading
+import time
+from collections import OrderedDict
+from config import db
+from models import LocationPoint
+from lazy_imports import lazy_module
+
+# Compact location point output for map clients.
+# Ramer-Douglas-Peucker simplification drops points that lie within a tolerance
+# (in metres) of the simplified line, and the result can be sent as a Google
+# encoded polyline or as packed little-endian float32 lat/lon pairs.
+# Simplified results are cached per (trail, tolerance) until the trail's points
+# change, or for CACHE_TTL seconds to pick up writes from other workers.
+
+EARTH_RADIUS_M = 6371008.8
+CACHE_SIZE = 256
+CACHE_TTL = 60
+
+np = lazy_module("numpy")
+
+class TrailPoints:
+    """
+    A trail's points as parallel arrays, ordered by Order.
+    """
+
+    def __init__(self, point_ids, trail_id, lat, lon, order):
+        self.point_ids = point_ids
+        self.trail_id = trail_id
+        self.lat = lat
+        self.lon = lon
+        self.order = order
+
+    def select(self, mask):
+        return TrailPoints(self.point_ids[mask], self.trail_id, self.lat[mask], self.lon[mask], self.order[mask])
+
+    def to_dicts(self):
+        # Same keys as LocationPointSchema
+        return [
+            {"LocationPointID": point_id, "TrailID": self.trail_id, "Latitude": lat, "Longitude": lon, "Order": order}
+            for point_id, lat, lon, order in zip(
+                self.point_ids.tolist(), self.lat.tolist(), self.lon.tolist(), self.order.tolist()
+            )
+        ]
+
+def load_trail_points(trail_id):
+    rows = db.session.execute(
+        db.select(LocationPoint.LocationPointID, LocationPoint.Latitude, LocationPoint.Longitude, LocationPoint.Order)
+        .where(LocationPoint.TrailID == trail_id)
+        .order_by(LocationPoint.Order)
+    ).all()
+    if not rows:
+        empty = np.empty(0)
+        return TrailPoints(empty.astype(np.int64), trail_id, empty, empty, empty.astype(np.int64))
+    packed = np.array(rows, dtype=np.float64)
+    return TrailPoints(
+        packed[:, 0].astype(np.int64), trail_id, packed[:, 1], packed[:, 2], packed[:, 3].astype(np.int64)
+    )
+
+def rdp_mask(lat, lon, tolerance_m):
+    """
+    Return a boolean mask of the points kept by Ramer-Douglas-Peucker simplification.
+    """
+    n = len(lat)
+    keep = np.zeros(n, dtype=bool)
+    if n == 0:
+        return keep
+    keep[0] = keep[-1] = True
+    # Local equirectangular projection in metres, accurate enough at trail scale
+    y = np.radians(lat) * EARTH_RADIUS_M
+    x = np.radians(lon) * EARTH_RADIUS_M * np.cos(np.radians(lat.mean()))
+    stack = [(0, n - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end <= start + 1:
+            continue
+        dx, dy = x[end] - x[start], y[end] - y[start]
+        px, py = x[start + 1:end] - x[start], y[start + 1:end] - y[start]
+        length = np.hypot(dx, dy)
+        if length == 0:
+            distances = np.hypot(px, py)
+        else:
+            distances = np.abs(dx * py - dy * px) / length
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance_m:
+            index = start + 1 + farthest
+            keep[index] = True
+            stack.append((start, index))
+            stack.append((index, end))
+    return keep
+
+def encode_polyline(lat, lon, precision=5):
+    """
+    Encode coordinates with the Google encoded polyline algorithm.
+    """
+    factor = 10 ** precision
+    coords = np.round(np.column_stack((lat, lon)) * factor).astype(np.int64)
+    deltas = np.diff(coords, axis=0, prepend=np.zeros((1, 2), dtype=np.int64)).ravel()
+    chunks = []
+    for value in deltas.tolist():
+        value = ~(value << 1) if value < 0 else value << 1
+        while value >= 0x20:
+            chunks.append(chr((0x20 | (value & 0x1F)) + 63))
+            value >>= 5
+        chunks.append(chr(value + 63))
+    return "".join(chunks)
+
+def pack_float32(lat, lon):
+    """
+    Interleaved little-endian float32 latitude/longitude pairs.
+    """
+    return np.column_stack((lat, lon)).astype("<f4").tobytes()
+
+class SimplificationCache:
+    def __init__(self, maxsize=CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        # trail_id -> number of invalidations, to spot a write during a load
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def get(self, trail_id, tolerance_m):
+        key = (trail_id, tolerance_m)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > time.monotonic():
+                self._entries.move_to_end(key)
+                return entry[0]
+            generation = self._generations.get(trail_id, 0)
+        points = load_trail_points(trail_id)
+        if tolerance_m:
+            points = points.select(rdp_mask(points.lat, points.lon, tolerance_m))
+        with self._lock:
+            # Skip the store if the trail's points changed while they were being loaded
+            if self._generations.get(trail_id, 0) == generation:
+                self._entries[key] = (points, time.monotonic() + CACHE_TTL)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+        return points
+
+    def invalidate_trail(self, trail_id):
+        with self._lock:
+            self._generations[trail_id] = self._generations.get(trail_id, 0) + 1
+            for key in [key for key in self._entries if key[0] == trail_id]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+simplification_cache = SimplificationCache()
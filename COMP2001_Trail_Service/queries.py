@@ -0,0 +1,216 @@
+import functools
+import operator
+from datetime import datetime
+import pytz
+from flask import abort
+from sqlalchemy.orm import load_only, selectinload
+from config import db
+from models import Trail, TrailLog
+from lazy_imports import lazy_module
+
+# Query layer for trail reads.
+# Location points are loaded with one extra SELECT ... WHERE TrailID IN (...)
+# for the whole batch instead of one lazy load per trail.
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+EXPORT_CHUNK_SIZE = 500
+
+schemas = lazy_module("schemas")
+
+TRAIL_COLUMNS = [
+    "TrailID", "TrailName", "TrailSummary", "TrailDescription", "Difficulty",
+    "Location", "Length", "ElevationGain", "RouteType", "timestamp",
+]
+TRAIL_FIELDS = TRAIL_COLUMNS + ["location_points"]
+
+# Query-string filters: exact matches and inclusive numeric ranges
+EQUALITY_FILTERS = {
+    "difficulty": Trail.Difficulty,
+    "location": Trail.Location,
+    "route_type": Trail.RouteType,
+}
+RANGE_FILTERS = {
+    "min_length": (Trail.Length, operator.ge),
+    "max_length": (Trail.Length, operator.le),
+    "min_elevation": (Trail.ElevationGain, operator.ge),
+    "max_elevation": (Trail.ElevationGain, operator.le),
+}
+
+def trails_query():
+    return Trail.query.options(selectinload(Trail.location_points)).order_by(Trail.TrailID)
+
+def all_trails():
+    return trails_query().all()
+
+def get_trail(trail_id):
+    return trails_query().filter(Trail.TrailID == trail_id).one_or_none()
+
+def trail_version(trail_id):
+    """
+    (TrailID, timestamp) of one trail, or None if it does not exist.
+    Point writes move the timestamp too, so this changes with the trail's points.
+    """
+    row = db.session.execute(db.select(Trail.TrailID, Trail.timestamp).where(Trail.TrailID == trail_id)).first()
+    return None if row is None else tuple(row)
+
+def iter_trails(chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yield every trail with its ordered location points, fetching chunk_size trails at a time.
+    Only one chunk is held in memory, whatever the size of the table.
+    """
+    statement = (
+        db.select(Trail)
+        .options(selectinload(Trail.location_points))
+        .order_by(Trail.TrailID)
+        .execution_options(yield_per=chunk_size)
+    )
+    yield from db.session.scalars(statement)
+
+def parse_fields(value):
+    if not value:
+        return None
+    fields = [field.strip() for field in value.split(",") if field.strip()]
+    unknown = [field for field in fields if field not in TRAIL_FIELDS]
+    if unknown:
+        abort(400, description=f"Unknown fields: {', '.join(unknown)}")
+    return tuple(dict.fromkeys(fields))
+
+def int_arg(args, name, default=None):
+    value = args.get(name)
+    if value is None:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        abort(400, description=f"{name} must be an integer")
+
+def float_arg(args, name, required=False):
+    value = args.get(name)
+    if value is None:
+        if required:
+            abort(400, description=f"{name} is required")
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        abort(400, description=f"{name} must be a number")
+
+def project(query, fields):
+    """
+    Restrict a Trail query to the columns in fields, loading points only when asked for.
+    """
+    if fields is None:
+        return query.options(selectinload(Trail.location_points))
+    columns = [getattr(Trail, field) for field in fields if field in TRAIL_COLUMNS]
+    query = query.options(load_only(*columns)) if columns else query.options(load_only(Trail.TrailID))
+    if "location_points" in fields:
+        query = query.options(selectinload(Trail.location_points))
+    return query
+
+def trails_by_ids(trail_ids, fields):
+    """
+    Load the given trails, returned in the order of trail_ids.
+    """
+    if not trail_ids:
+        return []
+    trails = {trail.TrailID: trail for trail in project(Trail.query.filter(Trail.TrailID.in_(trail_ids)), fields)}
+    return [trails[trail_id] for trail_id in trail_ids if trail_id in trails]
+
+@functools.lru_cache(maxsize=64)
+def trails_schema_for(fields):
+    """
+    Return a (cached) many=True TrailSchema restricted to the given fields.
+    """
+    if fields is None:
+        return schemas.TrailSchema(many=True)
+    return schemas.TrailSchema(many=True, only=fields)
+
+def trail_page_args(args):
+    """
+    Parse the /trails query string into (fields, limit, after, equal, ranges).
+    equal holds (column, value) pairs and ranges (column, op, value) triples on Trail columns.
+    """
+    fields = parse_fields(args.get("fields"))
+    limit = int_arg(args, "limit", DEFAULT_PAGE_SIZE)
+    if limit < 1 or limit > MAX_PAGE_SIZE:
+        abort(400, description=f"limit must be between 1 and {MAX_PAGE_SIZE}")
+    after = int_arg(args, "after")
+    equal = [(column, args[name]) for name, column in EQUALITY_FILTERS.items() if args.get(name)]
+    ranges = []
+    for name, (column, op) in RANGE_FILTERS.items():
+        value = float_arg(args, name)
+        if value is not None:
+            ranges.append((column, op, value))
+    return fields, limit, after, equal, ranges
+
+def list_trails(args):
+    """
+    Return one keyset page of trails and the cursor for the next page.
+    Pages are ordered by TrailID; pass the returned cursor back as ?after=.
+    """
+    fields, limit, after, equal, ranges = trail_page_args(args)
+
+    query = project(Trail.query.order_by(Trail.TrailID), fields)
+
+    for column, value in equal:
+        query = query.filter(column == value)
+    for column, op, value in ranges:
+        query = query.filter(op(column, value))
+    if after is not None:
+        query = query.filter(Trail.TrailID > after)
+
+    # Fetch one extra row to know whether another page exists
+    trails = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(trails) > limit:
+        trails = trails[:limit]
+        next_cursor = trails[-1].TrailID
+    return trails, fields, next_cursor
+
+def datetime_arg(args, name):
+    value = args.get(name)
+    if value is None:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        abort(400, description=f"{name} must be an ISO 8601 date or time")
+    # Timestamps are stored as naive Europe/London times
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(pytz.timezone('Europe/London')).replace(tzinfo=None)
+    return parsed
+
+def list_trail_logs(args):
+    """
+    Return one keyset page of trail logs, oldest first, and the cursor for the next page.
+    Filters: trail_id (also matches deleted trails), user, action, and an inclusive since/until range.
+    """
+    limit = int_arg(args, "limit", DEFAULT_PAGE_SIZE)
+    if limit < 1 or limit > MAX_PAGE_SIZE:
+        abort(400, description=f"limit must be between 1 and {MAX_PAGE_SIZE}")
+    after = int_arg(args, "after")
+    trail_id = int_arg(args, "trail_id")
+    since = datetime_arg(args, "since")
+    until = datetime_arg(args, "until")
+
+    query = TrailLog.query.order_by(TrailLog.LogID)
+    if trail_id is not None:
+        query = query.filter(TrailLog.TrailRef == trail_id)
+    if args.get("user"):
+        query = query.filter(TrailLog.AddedBy == args["user"])
+    if args.get("action"):
+        query = query.filter(TrailLog.Action == args["action"])
+    if since is not None:
+        query = query.filter(TrailLog.Timestamp >= since)
+    if until is not None:
+        query = query.filter(TrailLog.Timestamp <= until)
+    if after is not None:
+        query = query.filter(TrailLog.LogID > after)
+
+    logs = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(logs) > limit:
+        logs = logs[:limit]
+        next_cursor = logs[-1].LogID
+    return logs, next_cursor
@@ -0,0 +1,254 @@
+import threading
+import time
+from flask import Response, current_app, has_request_context, request
+from sqlalchemy import event
+
+# Request-level instrumentation.
+# Each request records its total latency plus the time spent in SQL (with the
+# statement list), marshmallow dumps and the upstream auth API. Totals are kept
+# as Prometheus histograms per route and served in the text format on /metrics.
+# Metrics are per process: with several gunicorn workers each one reports its
+# own, so scrape them per worker or read them as samples.
+# SERVER_TIMING adds a Server-Timing header with the same breakdown, and
+# requests slower than SLOW_REQUEST_SECONDS are logged with their statements.
+
+ENVIRON_KEY = "trail_service.timings"
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 1000)
+MAX_RECORDED_STATEMENTS = 100
+
+def _format_labels(names, values, extra=""):
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    def __init__(self, name, documentation, labels):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labels, label_values)} {_format_value(value)}")
+        return lines
+
+class Histogram:
+    def __init__(self, name, documentation, labels, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = buckets
+        # label values -> ([count per bucket], sum, count)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_values, value):
+        with self._lock:
+            counts, total, count = self._values.get(label_values) or ([0] * len(self.buckets), 0.0, 0)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[label_values] = (counts, total + value, count + 1)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for label_values, (counts, total, count) in sorted(self._values.items()):
+                for bound, bucket_count in zip(self.buckets, counts):
+                    labels = _format_labels(self.labels, label_values, f'le="{_format_value(bound)}"')
+                    lines.append(f"{self.name}_bucket{labels} {bucket_count}")
+                labels = _format_labels(self.labels, label_values, 'le="+Inf"')
+                lines.append(f"{self.name}_bucket{labels} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labels, label_values)} {_format_value(total)}")
+                lines.append(f"{self.name}_count{_format_labels(self.labels, label_values)} {count}")
+        return lines
+
+class CallbackMetric:
+    """
+    A metric whose values are read when /metrics is scraped: callback() returns {label values: value}.
+    For counts that another object keeps, such as a cache's hits and misses.
+    """
+
+    def __init__(self, name, documentation, labels, callback, kind="gauge"):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.callback = callback
+        self.kind = kind
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for label_values, value in sorted(self.callback().items()):
+            lines.append(f"{self.name}{_format_labels(self.labels, label_values)} {_format_value(value)}")
+        return lines
+
+def cache_metrics(name, description, cache):
+    """
+    Lookup and size metrics for a cache whose stats() returns hits, misses and size.
+    """
+    def lookups():
+        stats = cache.stats()
+        return {("hit",): stats["hits"], ("miss",): stats["misses"]}
+
+    return [
+        CallbackMetric(f"{name}_lookups_total", f"{description} lookups by result.", ("result",), lookups, "counter"),
+        CallbackMetric(f"{name}_entries", f"{description} entries held.", (), lambda: {(): cache.stats()["size"]}),
+    ]
+
+requests_total = Counter("trail_service_requests_total", "Requests handled.", ("method", "route", "status"))
+request_seconds = Histogram("trail_service_request_duration_seconds", "Request latency.", ("method", "route"))
+sql_statements = Histogram(
+    "trail_service_request_sql_statements", "SQL statements executed per request.", ("method", "route"), STATEMENT_BUCKETS
+)
+sql_seconds = Histogram("trail_service_request_sql_seconds", "Time spent in SQL per request.", ("method", "route"))
+serialize_seconds = Histogram(
+    "trail_service_request_serialize_seconds", "Time spent in marshmallow dumps per request.", ("method", "route")
+)
+auth_seconds = Histogram(
+    "trail_service_request_auth_wait_seconds", "Time spent waiting on the authentication API.", ("method", "route")
+)
+# Other modules append their own metrics
+METRICS = [requests_total, request_seconds, sql_statements, sql_seconds, serialize_seconds, auth_seconds]
+
+class RequestTimings:
+    """
+    Time spent in each phase of one request.
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.phases = {}
+        self.statement_count = 0
+        self.statements = []
+        self._active = set()
+
+    def add(self, phase, seconds):
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def add_statement(self, statement, seconds):
+        self.add("sql", seconds)
+        self.statement_count += 1
+        if len(self.statements) < MAX_RECORDED_STATEMENTS:
+            self.statements.append((statement, seconds))
+
+def current_timings():
+    if not has_request_context():
+        return None
+    return request.environ.get(ENVIRON_KEY)
+
+class timed:
+    """
+    Context manager adding the time of its block to a phase of the current request.
+    Nested blocks of the same phase (a nested schema dump) are only counted once.
+    """
+
+    def __init__(self, phase):
+        self.phase = phase
+
+    def __enter__(self):
+        self.timings = current_timings()
+        self.outermost = self.timings is not None and self.phase not in self.timings._active
+        if self.outermost:
+            self.timings._active.add(self.phase)
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.outermost:
+            self.timings.add(self.phase, time.perf_counter() - self.start)
+            self.timings._active.discard(self.phase)
+        return False
+
+def instrument_engine(engine):
+    """
+    Record every statement run on the engine against the current request.
+    """
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._trail_service_start = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        start = getattr(context, "_trail_service_start", None)
+        timings = current_timings()
+        if start is not None and timings is not None:
+            timings.add_statement(statement, time.perf_counter() - start)
+
+def _server_timing(timings, total):
+    entries = [f"total;dur={total * 1000:.1f}"]
+    if timings.statement_count:
+        entries.append(f'sql;dur={timings.phases["sql"] * 1000:.1f};desc="{timings.statement_count} statements"')
+    for phase in ("serialize", "auth"):
+        if phase in timings.phases:
+            entries.append(f"{phase};dur={timings.phases[phase] * 1000:.1f}")
+    return ", ".join(entries)
+
+def _log_slow_request(logger, method, path, timings, total):
+    statements = "".join(f"\n  {seconds * 1000:8.1f} ms  {statement}" for statement, seconds in timings.statements)
+    if timings.statement_count > len(timings.statements):
+        statements += f"\n  ... {timings.statement_count - len(timings.statements)} more"
+    logger.warning(
+        "Slow request %s %s took %.3f s (%d SQL statements, %.3f s SQL, %.3f s serialize, %.3f s auth)%s",
+        method, path, total, timings.statement_count, timings.phases.get("sql", 0.0),
+        timings.phases.get("serialize", 0.0), timings.phases.get("auth", 0.0), statements,
+    )
+
+def metrics_view():
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return Response("\n".join(lines) + "\n", mimetype="text/plain; version=0.0.4")
+
+def init_app(app):
+    server_timing = app.config.get("SERVER_TIMING", False)
+    slow_seconds = app.config.get("SLOW_REQUEST_SECONDS", 0)
+
+    @app.before_request
+    def start_timing():
+        request.environ[ENVIRON_KEY] = RequestTimings()
+
+    @app.after_request
+    def record_timing(response):
+        timings = current_timings()
+        if timings is None:
+            return response
+        if server_timing:
+            # Headers go out before a streamed body, so this covers the work done until now
+            response.headers["Server-Timing"] = _server_timing(timings, time.perf_counter() - timings.start)
+        # Label by the route template so /trails/1 and /trails/2 share a series
+        labels = (request.method, request.url_rule.rule if request.url_rule else "unmatched")
+        status = response.status_code
+        path = request.full_path
+        logger = current_app.logger
+
+        def finish():
+            total = time.perf_counter() - timings.start
+            requests_total.inc(labels + (status,))
+            request_seconds.observe(labels, total)
+            sql_statements.observe(labels, timings.statement_count)
+            sql_seconds.observe(labels, timings.phases.get("sql", 0.0))
+            serialize_seconds.observe(labels, timings.phases.get("serialize", 0.0))
+            if "auth" in timings.phases:
+                auth_seconds.observe(labels, timings.phases["auth"])
+            if slow_seconds and total >= slow_seconds:
+                _log_slow_request(logger, labels[0], path, timings, total)
+
+        # Recorded once the body has been sent, so a streamed response's SQL and time are included
+        response.call_on_close(finish)
+        return response
+
+    app.add_url_rule("/metrics", "metrics", metrics_view)
@@ -0,0 +1,145 @@
+import functools
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+import pytz
+from flask import current_app, request
+from werkzeug.http import is_resource_modified
+import db_routing
+import request_metrics
+
+# Server-side cache of serialized GET responses with conditional GET support.
+# Every write in notes.py calls invalidate(); entries also expire after CACHE_TTL
+# seconds so writes made by other worker processes are picked up.
+# Routes about one trail pass a version function: their ETag is built from the
+# trail's TrailID and timestamp and their Last-Modified is the timestamp, both
+# read from the data, so every worker agrees on them. A conditional request that
+# misses the cache is answered from the version alone, without running the view.
+# Other routes get a content-hash ETag and no Last-Modified: a deleted trail
+# leaves no timestamp behind to move the collection's date forward.
+
+CACHE_TTL = 60
+MAX_ENTRIES = 256
+
+LONDON = pytz.timezone('Europe/London')
+
+def validators(version):
+    """
+    (etag, last_modified) for the current request from a (TrailID, timestamp) version.
+    """
+    trail_id, timestamp = version
+    # The query string picks the representation (fields, format, tolerance), so it is part of the tag
+    etag = hashlib.sha1(f"{trail_id}|{timestamp}|{request.full_path}".encode()).hexdigest()
+    if timestamp is None:
+        return etag, None
+    # Timestamps are stored as naive Europe/London times
+    if timestamp.tzinfo is None:
+        timestamp = LONDON.localize(timestamp)
+    return etag, timestamp.astimezone(pytz.utc)
+
+def _set_validators(response, etag, last_modified):
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+class CachedResponse:
+    def __init__(self, body, mimetype, headers, etag=None, last_modified=None):
+        self.body = body
+        self.mimetype = mimetype
+        self.headers = headers
+        # Without a version, a content hash, so every worker hands out the same ETag for the same data
+        self.etag = etag or hashlib.sha1(body).hexdigest()
+        self.last_modified = last_modified
+        self.expires_at = time.monotonic() + CACHE_TTL
+
+    def to_response(self):
+        response = current_app.response_class(self.body, status=200, headers=self.headers, mimetype=self.mimetype)
+        _set_validators(response, self.etag, self.last_modified)
+        # Turns the response into a 304 when If-None-Match / If-Modified-Since match
+        return response.make_conditional(request)
+
+class ResponseCache:
+    def __init__(self, maxsize=MAX_ENTRIES):
+        self.maxsize = maxsize
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self._entries.pop(key, None)
+            self.misses += 1
+            return None
+
+    def put(self, key, response, generation, etag=None, last_modified=None):
+        entry = CachedResponse(
+            response.get_data(),
+            response.mimetype,
+            [(name, value) for name, value in response.headers if name not in ("Content-Type", "Content-Length")],
+            etag,
+            last_modified,
+        )
+        with self._lock:
+            # Skip the store if a write happened while the response was being built
+            if generation == self.generation:
+                self._entries[key] = entry
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+        return entry
+
+    def invalidate(self):
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._entries), "generation": self.generation}
+
+response_cache = ResponseCache()
+request_metrics.METRICS.extend(request_metrics.cache_metrics("trail_service_response_cache", "Serialized response cache", response_cache))
+
+def invalidate():
+    response_cache.invalidate()
+
+def cached(version=None):
+    """
+    Serve a GET view from the response cache, answering 304 for matching conditional requests.
+    version(*view_args) returns the (TrailID, timestamp) the response is built from, or None
+    when there is no such trail (the view then answers 404).
+    A hit does not run the view, so the route's role check has to sit outside this decorator.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = request.full_path
+            # Users inside their read-your-writes window skip the cached copy, which may have come from a lagging replica
+            entry = None if db_routing.primary_pinned() else response_cache.get(key)
+            if entry is None:
+                generation = response_cache.generation
+                etag = last_modified = None
+                # Read before the view, so a write in between leaves an older ETag on the response, never a newer one
+                current = version(*args, **kwargs) if version is not None else None
+                if current is not None:
+                    etag, last_modified = validators(current)
+                    if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+                        return _set_validators(current_app.response_class(status=304), etag, last_modified)
+                response = current_app.make_response(func(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+                entry = response_cache.put(key, response, generation, etag, last_modified)
+            return entry.to_response()
+        return wrapper
+    return decorator
@@ -0,0 +1,89 @@
+from marshmallow import fields
+from marshmallow_sqlalchemy import SQLAlchemyAutoSchema, auto_field
+from config import db
+from models import User, Feature, Trail, TrailFeature, TrailLog, LocationPoint
+import request_metrics
+
+# Marshmallow schemas for the models in models.py.
+# Building them inspects every mapper, so other modules reach this one through
+# lazy_imports.lazy_module("schemas") and it is only imported by the first
+# request that loads or dumps a model, not while a worker starts.
+
+class TimedSchema(SQLAlchemyAutoSchema):
+    """
+    Base schema that adds its dump time to the current request's metrics.
+    """
+
+    def dump(self, obj, *, many=None):
+        with request_metrics.timed("serialize"):
+            return super().dump(obj, many=many)
+
+class UserSchema(TimedSchema):
+    class Meta:
+        model = User
+        load_instance = True
+        sqla_session = db.session
+
+class FeatureSchema(TimedSchema):
+    class Meta:
+        model = Feature
+        load_instance = True
+        sqla_session = db.session
+
+class TrailSchema(TimedSchema):
+    class Meta:
+        model = Trail
+        load_instance = True
+        sqla_session = db.session
+
+    location_points = fields.Nested("LocationPointSchema", many=True)
+
+class TrailFeatureSchema(TimedSchema):
+    class Meta:
+        model = TrailFeature
+        load_instance = True
+        sqla_session = db.session
+        include_fk = True
+
+class TrailLogSchema(TimedSchema):
+    class Meta:
+        model = TrailLog
+        load_instance = True
+        sqla_session = db.session
+        include_fk = True
+
+class LocationPointSchema(TimedSchema):
+    class Meta:
+        model = LocationPoint
+        load_instance = True
+        sqla_session = db.session
+        include_fk = True
+
+    TrailID = auto_field(required=False)  # Make TrailID optional for the schema
+
+
+# Marshmallow schemas
+user_schema = UserSchema()
+users_schema = UserSchema(many=True)
+
+feature_schema = FeatureSchema()
+features_schema = FeatureSchema(many=True)
+
+trail_schema = TrailSchema()
+trails_schema = TrailSchema(many=True)
+# Trail columns without the points, for responses about trails with very long tracks
+trail_summary_schema = TrailSchema(exclude=("location_points",))
+
+trail_feature_schema = TrailFeatureSchema()
+trail_features_schema = TrailFeatureSchema(many=True)
+
+trail_log_schema = TrailLogSchema()
+trail_logs_schema = TrailLogSchema(many=True)
+
+location_point_schema = LocationPointSchema()
+location_points_schema = LocationPointSchema(many=True)
+
+# Plain-dict schemas for bulk_import.py and point_sequence.py: validation and
+# type coercion without building ORM objects
+trail_import_schema = TrailSchema(load_instance=False, exclude=("TrailID", "timestamp", "location_points"))
+point_import_schema = LocationPointSchema(load_instance=False, many=True, exclude=("LocationPointID", "TrailID"))
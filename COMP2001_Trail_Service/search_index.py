@@ -0,0 +1,193 @@
+import bisect
+import heapq
+import math
+import re
+import threading
+import time
+import unicodedata
+from config import db
+from models import Trail
+
+# In-process inverted index for trail search.
+# Names, locations, summaries and descriptions are split into lower-case,
+# accent-folded terms; each term maps to the trails containing it with a
+# field-weighted term frequency, and results are ranked with BM25. A sorted
+# term list gives prefix matching for autocomplete. notes.py keeps the index
+# in sync on trail writes; like the spatial index it is rebuilt from the
+# database when first used, after bulk writes, and every REBUILD_INTERVAL
+# seconds to pick up writes made by other worker processes.
+
+REBUILD_INTERVAL = 300
+FIELD_WEIGHTS = {
+    "TrailName": 3.0,
+    "Location": 2.0,
+    "TrailSummary": 1.5,
+    "TrailDescription": 1.0,
+}
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+# A short prefix such as "a" expands to at most this many (most common) terms
+MAX_PREFIX_TERMS = 50
+
+_TOKEN = re.compile(r"\w+")
+
+def tokenize(text):
+    if not text:
+        return []
+    folded = unicodedata.normalize("NFKD", text.lower())
+    folded = "".join(char for char in folded if not unicodedata.combining(char))
+    return _TOKEN.findall(folded)
+
+class TextIndex:
+    def __init__(self):
+        self._postings = {}  # term -> {trail_id: weighted term frequency}
+        self._terms = []  # sorted vocabulary, for prefix lookups
+        self._trails = {}  # trail_id -> (terms, length, difficulty, route type)
+        self._total_length = 0.0
+        self._built_at = None
+        self._lock = threading.RLock()
+
+    def _add(self, trail_id, texts, difficulty, route_type):
+        frequencies = {}
+        for field, weight in FIELD_WEIGHTS.items():
+            for term in tokenize(texts.get(field)):
+                frequencies[term] = frequencies.get(term, 0.0) + weight
+        for term, frequency in frequencies.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = {}
+                bisect.insort(self._terms, term)
+            postings[trail_id] = frequency
+        length = sum(frequencies.values())
+        self._trails[trail_id] = (tuple(frequencies), length, difficulty, route_type)
+        self._total_length += length
+
+    def _remove(self, trail_id):
+        entry = self._trails.pop(trail_id, None)
+        if entry is None:
+            return
+        terms, length, _, _ = entry
+        for term in terms:
+            postings = self._postings[term]
+            del postings[trail_id]
+            if not postings:
+                del self._postings[term]
+                del self._terms[bisect.bisect_left(self._terms, term)]
+        self._total_length -= length
+
+    def build(self):
+        """
+        Rebuild the index from every Trail row.
+        """
+        rows = db.session.execute(
+            db.select(Trail.TrailID, Trail.Difficulty, Trail.RouteType, *(getattr(Trail, field) for field in FIELD_WEIGHTS))
+        )
+        with self._lock:
+            self._postings = {}
+            self._terms = []
+            self._trails = {}
+            self._total_length = 0.0
+            for trail_id, difficulty, route_type, *texts in rows:
+                self._add(trail_id, dict(zip(FIELD_WEIGHTS, texts)), difficulty, route_type)
+            self._built_at = time.monotonic()
+
+    def ensure_built(self):
+        with self._lock:
+            if self._built_at is None or time.monotonic() - self._built_at > REBUILD_INTERVAL:
+                self.build()
+
+    def invalidate(self):
+        with self._lock:
+            self._built_at = None
+
+    def add_trail(self, trail):
+        """
+        Index a new trail, or re-index an updated one.
+        """
+        with self._lock:
+            if self._built_at is not None:
+                self._remove(trail.TrailID)
+                texts = {field: getattr(trail, field) for field in FIELD_WEIGHTS}
+                self._add(trail.TrailID, texts, trail.Difficulty, trail.RouteType)
+
+    def remove_trail(self, trail_id):
+        with self._lock:
+            self._remove(trail_id)
+
+    def _prefix_terms(self, prefix):
+        start = bisect.bisect_left(self._terms, prefix)
+        end = bisect.bisect_left(self._terms, prefix + "\U0010ffff")
+        terms = self._terms[start:end]
+        if len(terms) > MAX_PREFIX_TERMS:
+            # Keep the exact term itself, then the most common completions
+            terms = heapq.nlargest(
+                MAX_PREFIX_TERMS, terms, key=lambda term: (term == prefix, len(self._postings[term]))
+            )
+        return terms
+
+    def _term_scores(self, terms, candidates=None):
+        """
+        {trail_id: BM25 score} for trails containing any of the terms, each trail scored by its best term.
+        When candidates is given only those trails are scored.
+        """
+        count = len(self._trails)
+        average_length = self._total_length / count if count else 1.0
+        scores = {}
+        for term in terms:
+            postings = self._postings.get(term, {})
+            idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            if candidates is not None and len(candidates) < len(postings):
+                matches = ((trail_id, postings[trail_id]) for trail_id in candidates if trail_id in postings)
+            else:
+                matches = postings.items()
+            for trail_id, frequency in matches:
+                length = self._trails[trail_id][1]
+                score = idf * frequency * (K1 + 1) / (frequency + K1 * (1 - B + B * length / average_length))
+                if score > scores.get(trail_id, 0.0):
+                    scores[trail_id] = score
+        return scores
+
+    def search(self, query, limit, prefix=True, difficulty=None, route_type=None):
+        """
+        Return up to limit (trail_id, score) pairs, best first, for trails matching every query term.
+        With prefix, the last term also matches longer terms that start with it.
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+        self.ensure_built()
+        with self._lock:
+            term_groups = [[term] for term in terms]
+            if prefix:
+                term_groups[-1] = self._prefix_terms(terms[-1])
+            # Score the rarest term group first so the candidate set starts small
+            term_groups.sort(key=lambda group: sum(len(self._postings.get(term, ())) for term in group))
+            scores = None
+            for group in term_groups:
+                group_scores = self._term_scores(group, scores)
+                if scores is None:
+                    scores = {
+                        trail_id: score for trail_id, score in group_scores.items()
+                        if (difficulty is None or self._trails[trail_id][2] == difficulty)
+                        and (route_type is None or self._trails[trail_id][3] == route_type)
+                    }
+                else:
+                    scores = {trail_id: score + group_scores[trail_id] for trail_id, score in scores.items() if trail_id in group_scores}
+                if not scores:
+                    return []
+            return heapq.nlargest(limit, scores.items(), key=lambda item: (item[1], -item[0]))
+
+    def suggest(self, prefix, limit):
+        """
+        Return up to limit indexed terms starting with the last word of prefix, most common first.
+        """
+        terms = tokenize(prefix)
+        if not terms:
+            return []
+        self.ensure_built()
+        with self._lock:
+            completions = self._prefix_terms(terms[-1])
+            return sorted(completions, key=lambda term: (-len(self._postings[term]), term))[:limit]
+
+search_index = TextIndex()
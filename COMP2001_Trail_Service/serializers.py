@@ -0,0 +1,103 @@
+import functools
+import re
+import orjson
+from flask.json.provider import DefaultJSONProvider
+from marshmallow import fields
+import request_metrics
+
+# Fast response serialization.
+# Marshmallow schemas stay the source of truth for the output shape and are
+# still used to validate input, but dumping goes through an encoder compiled
+# once per schema: a flat list of (key, attribute, conversion) steps with no
+# per-field dispatch. Field types without a compiled conversion fall back to
+# the marshmallow field itself, so the output always matches schema.dump().
+# JSON is written with orjson, falling back to the json module whenever
+# orjson's bytes would differ from what Flask's jsonify produces.
+
+# Marshmallow field type -> (type the value already has when no conversion is needed, conversion)
+CONVERSIONS = {
+    fields.Integer: (int, int),
+    fields.Float: (float, float),
+    fields.String: (str, str),
+    fields.DateTime: (type(None), lambda value: value.isoformat()),
+}
+
+# orjson differs from json.dumps on DEL (escaped by json) and on floats json
+# writes as 1e+16 or 5e-05 (orjson: 1e16, 0.00005); seeing any of them, even
+# inside a string, means the bytes are redone with json. The substring tests
+# run at memchr speed, and the exponent regex only when a cheap hint matches.
+# (json's NaN and Infinity are not valid JSON and never come out of the database.)
+_EXPONENT_HINT = re.compile(rb"e[-0-9]")
+_EXPONENT = re.compile(rb"[0-9]e[-0-9]")
+
+def _differs_from_json(data):
+    return (
+        b"\x7f" in data
+        or b"0.0000" in data
+        or (_EXPONENT_HINT.search(data) is not None and _EXPONENT.search(data) is not None)
+    )
+
+_ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS | orjson.OPT_PASSTHROUGH_SUBCLASS
+
+def _step(name, field):
+    """
+    (key, name, attribute, type needing no conversion, conversion, field to fall back on) for one dump field.
+    """
+    key = field.data_key or name
+    attribute = field.attribute or name
+    if isinstance(field, fields.Nested):
+        return key, name, attribute, type(None), encoder_for(field.schema), None
+    conversion = CONVERSIONS.get(type(field))
+    if conversion is None or (isinstance(field, fields.DateTime) and field.format not in (None, "iso")):
+        return key, name, attribute, None, None, field
+    return (key, name, attribute) + conversion + (None,)
+
+@functools.lru_cache(maxsize=128)
+def encoder_for(schema):
+    """
+    Compile a function that dumps like schema.dump(), for one object or a list when schema.many.
+    """
+    steps = [_step(name, field) for name, field in schema.dump_fields.items()]
+
+    def encode_one(obj):
+        data = {}
+        for key, name, attribute, exact_type, convert, field in steps:
+            if field is not None:
+                value = field.serialize(name, obj, accessor=schema.get_attribute)
+            else:
+                # Loaded column values sit in the instance __dict__; anything else goes through the ORM
+                loaded = obj.__dict__
+                value = loaded[attribute] if attribute in loaded else getattr(obj, attribute)
+                if value is not None and type(value) is not exact_type:
+                    value = convert(value)
+            data[key] = value
+        return data
+
+    if schema.many:
+        return lambda objs: [encode_one(obj) for obj in objs]
+    return lambda obj: None if obj is None else encode_one(obj)
+
+def dump(schema, obj):
+    """
+    Drop-in replacement for schema.dump(obj).
+    """
+    with request_metrics.timed("serialize"):
+        return encoder_for(schema)(obj)
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    Flask JSON provider that writes compact responses with orjson, byte for byte as the default provider would.
+    """
+
+    def dumps(self, obj, **kwargs):
+        config = self._app.config
+        legacy_config = config["JSON_SORT_KEYS"] is not None or config["JSON_AS_ASCII"] is not None
+        if kwargs == {"separators": (",", ":")} and not legacy_config:
+            option = _ORJSON_OPTIONS | (orjson.OPT_SORT_KEYS if self.sort_keys else 0)
+            try:
+                data = orjson.dumps(obj, default=self.default, option=option)
+            except TypeError:
+                data = None
+            if data is not None and (data.isascii() or not self.ensure_ascii) and not _differs_from_json(data):
+                return data.decode()
+        return super().dumps(obj, **kwargs)
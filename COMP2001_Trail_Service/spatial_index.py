@@ -0,0 +1,193 @@
+import heapq
+import math
+import threading
+import time
+from config import db
+from models import LocationPoint
+
+# In-process grid index over LocationPoint coordinates.
+# Points are bucketed into CELL_SIZE degree cells so bounding-box, radius and
+# nearest-trail queries only visit the cells around the query instead of every
+# point. notes.py keeps it in sync on point writes; it is rebuilt from the
+# database when first used, after bulk writes, and every REBUILD_INTERVAL
+# seconds to pick up writes made by other worker processes.
+
+CELL_SIZE = 0.01  # degrees, roughly 1 km
+REBUILD_INTERVAL = 300
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+def _cell(lat, lon):
+    return (math.floor(lat / CELL_SIZE), math.floor(lon / CELL_SIZE))
+
+def _ring_cells(center_i, center_j, ring):
+    if ring == 0:
+        yield (center_i, center_j)
+        return
+    for j in range(center_j - ring, center_j + ring + 1):
+        yield (center_i - ring, j)
+        yield (center_i + ring, j)
+    for i in range(center_i - ring + 1, center_i + ring):
+        yield (i, center_j - ring)
+        yield (i, center_j + ring)
+
+class GridIndex:
+    def __init__(self):
+        self._cells = {}
+        self._points = {}
+        self._trail_points = {}
+        self._max_abs_lat = 0.0
+        self._built_at = None
+        self._lock = threading.RLock()
+
+    def _add(self, point_id, trail_id, lat, lon):
+        cell = _cell(lat, lon)
+        self._cells.setdefault(cell, {})[point_id] = (trail_id, lat, lon)
+        self._points[point_id] = (cell, trail_id)
+        self._trail_points.setdefault(trail_id, set()).add(point_id)
+        self._max_abs_lat = max(self._max_abs_lat, abs(lat))
+
+    def _remove(self, point_id):
+        entry = self._points.pop(point_id, None)
+        if entry is None:
+            return
+        cell, trail_id = entry
+        bucket = self._cells[cell]
+        del bucket[point_id]
+        if not bucket:
+            del self._cells[cell]
+        trail_points = self._trail_points[trail_id]
+        trail_points.discard(point_id)
+        if not trail_points:
+            del self._trail_points[trail_id]
+
+    def build(self):
+        """
+        Rebuild the index from every LocationPoint row.
+        """
+        rows = db.session.execute(
+            db.select(LocationPoint.LocationPointID, LocationPoint.TrailID, LocationPoint.Latitude, LocationPoint.Longitude)
+        )
+        with self._lock:
+            self._cells = {}
+            self._points = {}
+            self._trail_points = {}
+            self._max_abs_lat = 0.0
+            for point_id, trail_id, lat, lon in rows:
+                self._add(point_id, trail_id, lat, lon)
+            self._built_at = time.monotonic()
+
+    def ensure_built(self):
+        with self._lock:
+            if self._built_at is None or time.monotonic() - self._built_at > REBUILD_INTERVAL:
+                self.build()
+
+    def invalidate(self):
+        with self._lock:
+            self._built_at = None
+
+    def add_point(self, point):
+        with self._lock:
+            if self._built_at is not None:
+                self._remove(point.LocationPointID)
+                self._add(point.LocationPointID, point.TrailID, point.Latitude, point.Longitude)
+
+    def remove_point(self, point_id):
+        with self._lock:
+            self._remove(point_id)
+
+    def remove_trail(self, trail_id):
+        with self._lock:
+            for point_id in list(self._trail_points.get(trail_id, ())):
+                self._remove(point_id)
+
+    def _scan(self, min_lat, min_lon, max_lat, max_lon):
+        (min_i, min_j), (max_i, max_j) = _cell(min_lat, min_lon), _cell(max_lat, max_lon)
+        # Iterate whichever is smaller: the cells in the box or the occupied cells
+        if (max_i - min_i + 1) * (max_j - min_j + 1) <= len(self._cells):
+            cells = (
+                self._cells.get((i, j))
+                for i in range(min_i, max_i + 1)
+                for j in range(min_j, max_j + 1)
+            )
+        else:
+            cells = (
+                bucket for (i, j), bucket in self._cells.items()
+                if min_i <= i <= max_i and min_j <= j <= max_j
+            )
+        for bucket in cells:
+            if bucket:
+                yield from bucket.values()
+
+    def within_bbox(self, min_lat, min_lon, max_lat, max_lon):
+        """
+        Return the IDs of trails with at least one point inside the box.
+        """
+        self.ensure_built()
+        with self._lock:
+            return {
+                trail_id
+                for trail_id, lat, lon in self._scan(min_lat, min_lon, max_lat, max_lon)
+                if min_lat <= lat <= max_lat and min_lon <= lon <= max_lon
+            }
+
+    def within_radius(self, lat, lon, radius_km):
+        """
+        Return {trail_id: distance_km} of the closest point of every trail within radius_km.
+        """
+        self.ensure_built()
+        dlat = radius_km / KM_PER_DEGREE
+        dlon = radius_km / (KM_PER_DEGREE * max(math.cos(math.radians(min(89.9, abs(lat) + dlat))), 1e-6))
+        distances = {}
+        with self._lock:
+            for trail_id, point_lat, point_lon in self._scan(lat - dlat, lon - dlon, lat + dlat, lon + dlon):
+                distance = haversine_km(lat, lon, point_lat, point_lon)
+                if distance <= radius_km and distance < distances.get(trail_id, math.inf):
+                    distances[trail_id] = distance
+        return distances
+
+    def nearest(self, lat, lon, k):
+        """
+        Return up to k (trail_id, distance_km) pairs ordered by distance to the trail's closest point.
+        Searches rings of cells outwards until no unvisited cell can hold a closer trail.
+        """
+        self.ensure_built()
+        with self._lock:
+            if not self._cells:
+                return []
+            center_i, center_j = _cell(lat, lon)
+            # Narrowest east-west cell width over the indexed latitudes bounds the ring distance
+            max_abs_lat = min(89.9, max(abs(lat), self._max_abs_lat) + CELL_SIZE)
+            ring_km = CELL_SIZE * KM_PER_DEGREE * max(math.cos(math.radians(max_abs_lat)), 1e-6)
+
+            best = {}
+            def visit(bucket):
+                for trail_id, point_lat, point_lon in bucket.values():
+                    distance = haversine_km(lat, lon, point_lat, point_lon)
+                    if distance < best.get(trail_id, math.inf):
+                        best[trail_id] = distance
+
+            ring = 0
+            while True:
+                if (2 * ring + 1) ** 2 >= len(self._cells):
+                    # The ring outgrew the occupied cells: visit what is left directly
+                    for (i, j), bucket in self._cells.items():
+                        if max(abs(i - center_i), abs(j - center_j)) >= ring:
+                            visit(bucket)
+                    break
+                for cell in _ring_cells(center_i, center_j, ring):
+                    bucket = self._cells.get(cell)
+                    if bucket:
+                        visit(bucket)
+                # Anything beyond this ring is at least ring * ring_km away
+                if len(best) >= k and heapq.nsmallest(k, best.values())[-1] <= ring * ring_km:
+                    break
+                ring += 1
+            return heapq.nsmallest(k, best.items(), key=lambda item: item[1])
+
+spatial_index = GridIndex()
@@ -0,0 +1,107 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# Cold start benchmark: how long a fresh worker takes to serve its first request.
+# Each run is a new interpreter that imports app.py, builds the app with
+# create_app() and sends GET /trails through the test client, timing each step.
+# The check fails (exit status 1) when the median of import + create_app + first
+# request goes over --budget seconds. It also fails, on any machine, when
+# create_app() opens a database connection or when a module that should load on
+# first use (DEFERRED_MODULES) is already imported once the app is built.
+#
+#   python startup_benchmark.py                  # 5 runs, 1.2 s budget
+#   python startup_benchmark.py --runs 10 --budget 0.8
+
+DEFAULT_RUNS = 5
+DEFAULT_BUDGET = 1.2
+TRAILS = 100
+POINTS = 20
+DEFERRED_MODULES = ("numpy", "schemas", "marshmallow_sqlalchemy")
+
+def child():
+    """
+    One cold start, in this (fresh) interpreter; prints the timings as JSON.
+    """
+    start = time.perf_counter()
+    import app as trail_app
+    imported = time.perf_counter()
+    flask_app = trail_app.create_app().app
+    created = time.perf_counter()
+
+    import db_metrics
+    from config import db
+
+    loaded = [name for name in DEFERRED_MODULES if name in sys.modules]
+    with flask_app.app_context():
+        connects = db_metrics.pool_stats(db.engine).get("connects", 0)
+    client = flask_app.test_client()
+    headers = {"Authorization": "Bearer " + trail_app.generate_jwt({"user_id": "startup", "role": "Admin"})}
+    response = client.get("/trails", headers=headers)
+    first = time.perf_counter()
+    client.get("/trails?difficulty=Easy", headers=headers)
+    second = time.perf_counter()
+    print(json.dumps({
+        "import": imported - start,
+        "create_app": created - imported,
+        "first_request": first - created,
+        "second_request": second - first,
+        "total": first - start,
+        "status": response.status_code,
+        "connects": connects,
+        "loaded": loaded,
+    }))
+
+def run_child(env):
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child"],
+        env=env, capture_output=True, text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description="Time a cold start of the trail service")
+    parser.add_argument("--runs", type=int, default=DEFAULT_RUNS)
+    parser.add_argument("--budget", type=float, default=DEFAULT_BUDGET, help="seconds for import + create_app + first request")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return child()
+
+    from benchmark import generate_dataset
+
+    directory = tempfile.mkdtemp(prefix="trail-startup-")
+    database = os.path.join(directory, "startup.db")
+    generate_dataset(database, TRAILS, POINTS)
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{database}", SLOW_REQUEST_SECONDS="0")
+    env.pop("DB_REPLICA_URLS", None)
+
+    run_child(env)  # Leaves the bytecode caches warm, as in a built image
+    runs = [run_child(env) for _ in range(args.runs)]
+    failures = []
+    for phase in ("import", "create_app", "first_request", "second_request", "total"):
+        times = sorted(run[phase] for run in runs)
+        print(f"{phase:<15} median {statistics.median(times) * 1000:8.1f} ms   max {times[-1] * 1000:8.1f} ms")
+    if any(run["status"] != 200 for run in runs):
+        failures.append(f"GET /trails returned {runs[0]['status']}")
+    if any(run["connects"] for run in runs):
+        failures.append("create_app() opened a database connection")
+    loaded = sorted({name for run in runs for name in run["loaded"]})
+    if loaded:
+        failures.append(f"imported while starting up: {', '.join(loaded)}")
+    total = statistics.median(run["total"] for run in runs)
+    if total > args.budget:
+        failures.append(f"median cold start {total:.3f} s is over the {args.budget:.3f} s budget")
+    for failure in failures:
+        print(f"FAIL {failure}")
+    if not failures:
+        print(f"ok   median cold start {total:.3f} s (budget {args.budget:.3f} s)")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,139 @@
+import pathlib
+import pytest
+
+# Shared fixtures: a fresh app on its own SQLite file for every test, with the
+# process-wide caches and indexes emptied so no state leaks between tests.
+# Admission control is off unless a test turns it on.
+
+SERVICE_DIR = pathlib.Path(__file__).resolve().parent.parent
+DIFFICULTIES = ["Easy", "Moderate", "Hard"]
+LOCATIONS = ["Plymouth", "Dartmoor", "Exmoor", "Bodmin"]
+
+def reset_caches():
+    import polyline
+    import response_cache
+    from admission import admission_control
+    from db_routing import recent_writers
+    from feature_index import feature_index
+    from search_index import search_index
+    from spatial_index import spatial_index
+
+    response_cache.invalidate()
+    spatial_index.invalidate()
+    search_index.invalidate()
+    feature_index.invalidate()
+    polyline.simplification_cache.clear()
+    recent_writers.clear()
+    admission_control.store.clear()
+
+@pytest.fixture
+def settings(tmp_path, monkeypatch):
+    """
+    Environment the app is built from; tests can add settings before using app.
+    """
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'trails.db'}")
+    monkeypatch.setenv("ADMISSION_CONTROL", "0")
+    monkeypatch.setenv("SLOW_REQUEST_SECONDS", "0")
+    for name in ("TRAIL_SERVICE_SETTINGS", "DB_REPLICA_URLS", "TRAIL_SNAPSHOT_PATH", "RATE_LIMIT_STORE_URL", "PROXY_FIX_HOPS"):
+        monkeypatch.delenv(name, raising=False)
+    return monkeypatch
+
+@pytest.fixture
+def replica_path(settings, tmp_path):
+    """
+    Register a second SQLite file as a read replica; request it before app.
+    """
+    path = tmp_path / "replica.db"
+    settings.setenv("DB_REPLICA_URLS", f"sqlite:///{path}")
+    return path
+
+@pytest.fixture
+def migrated(settings):
+    """
+    Build the schema through the Alembic migrations; request it before app.
+    """
+    from alembic import command
+    from alembic.config import Config
+
+    command.upgrade(Config(str(SERVICE_DIR / "alembic.ini")), "head")
+
+@pytest.fixture
+def app(settings):
+    import app as trail_app
+    from activity_log import activity_log
+    from config import db
+
+    flask_app = trail_app.create_app().app
+    with flask_app.app_context():
+        # Primary only: replicas get their tables by copying the primary's file
+        db.create_all(bind_key=None)
+        reset_caches()
+        yield flask_app
+        activity_log.stop()
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+    reset_caches()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture
+def auth_headers():
+    import app as trail_app
+
+    def headers(role="Admin", user_id="tester"):
+        return {"Authorization": "Bearer " + trail_app.generate_jwt({"user_id": user_id, "role": role})}
+
+    return headers
+
+@pytest.fixture
+def seed(app):
+    """
+    seed(count, points) adds count trails with points location points each; returns their IDs.
+    """
+    import bulk_import
+    from config import db
+    from models import Trail
+
+    def add(count, points=3):
+        start = db.session.scalar(db.select(db.func.count()).select_from(Trail))
+        result = bulk_import.import_trails(
+            {
+                "TrailName": f"Trail {n}",
+                "TrailSummary": "Seeded for tests",
+                "TrailDescription": "Seeded for tests",
+                "Difficulty": DIFFICULTIES[n % 3],
+                "Location": LOCATIONS[n % 4],
+                "Length": float(n % 60),
+                "ElevationGain": float(n * 7 % 500),
+                "RouteType": ["Loop", "Out and back"][n % 2],
+                "location_points": [
+                    {"Latitude": 50.0 + n * 0.001, "Longitude": -4.0 - order * 0.001, "Order": order}
+                    for order in range(1, points + 1)
+                ],
+            }
+            for n in range(start + 1, start + count + 1)
+        )
+        assert not result["errors"], result["errors"]
+        return result["trail_ids"]
+
+    return add
+
+@pytest.fixture
+def statements(app):
+    """
+    A list that collects every SQL statement run on the primary engine while the test runs.
+    """
+    from sqlalchemy import event
+    from config import db
+
+    captured = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        captured.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", record)
+    yield captured
+    event.remove(db.engine, "before_cursor_execute", record)
@@ -0,0 +1,73 @@
+import pytest
+from admission import MemoryStore
+
+@pytest.fixture
+def limited(settings):
+    settings.setenv("ADMISSION_CONTROL", "1")
+    settings.setenv("RATE_LIMIT_PER_SECOND", "0.1")
+    settings.setenv("RATE_LIMIT_BURST", "2")
+
+def test_client_over_its_burst_gets_429_with_retry_after(limited, client, auth_headers, seed):
+    seed(1)
+    headers = auth_headers(user_id="busy")
+    assert [client.get("/trails", headers=headers).status_code for _ in range(2)] == [200, 200]
+    rejected = client.get("/trails", headers=headers)
+    assert rejected.status_code == 429
+    assert int(rejected.headers["Retry-After"]) == 10
+    # Other clients have their own buckets
+    assert client.get("/trails", headers=auth_headers(user_id="idle")).status_code == 200
+
+def test_health_probe_is_not_limited(limited, client):
+    assert all(client.get("/health/db").status_code == 200 for _ in range(5))
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def test_pruning_keeps_each_bucket_at_its_own_rate():
+    clock = Clock()
+    store = MemoryStore(maxsize=2, clock=clock)
+    # Five /login attempts empty a bucket that refills at one token every two seconds
+    assert [store.take("login:10.0.0.1", 0.5, 5) for _ in range(5)] == [0] * 5
+    store.take("user:a", 20, 40)
+    clock.now = 2.0
+    # A third client at 20/s prunes the store: user:a has refilled, the /login bucket
+    # has one token back, not the 40 it would have at the general rate
+    store.take("user:b", 20, 40)
+    assert sorted(store._buckets) == ["login:10.0.0.1", "user:b"]
+    assert store.take("login:10.0.0.1", 0.5, 5) == 0
+    assert store.take("login:10.0.0.1", 0.5, 5) == pytest.approx(2.0)
+
+def test_pruning_drops_refilled_buckets():
+    clock = Clock()
+    store = MemoryStore(maxsize=1, clock=clock)
+    store.take("user:a", 20, 40)
+    clock.now = 1.0
+    store.take("user:b", 20, 40)
+    assert list(store._buckets) == ["user:b"]
+
+@pytest.fixture
+def login_limited(settings):
+    settings.setenv("ADMISSION_CONTROL", "1")
+    settings.setenv("LOGIN_RATE_LIMIT_PER_SECOND", "0.01")
+    settings.setenv("LOGIN_RATE_LIMIT_BURST", "1")
+
+def login_statuses(client, *addresses):
+    # An empty body is refused with 400 after it has taken a token
+    return [
+        client.post("/login", json={}, headers={"X-Forwarded-For": address}).status_code
+        for address in addresses
+    ]
+
+@pytest.fixture
+def behind_proxy(settings):
+    settings.setenv("PROXY_FIX_HOPS", "1")
+
+def test_login_buckets_follow_forwarded_address_behind_proxy(login_limited, behind_proxy, client):
+    assert login_statuses(client, "203.0.113.1", "203.0.113.1", "203.0.113.2") == [400, 429, 400]
+
+def test_forwarded_address_ignored_without_proxy(login_limited, client):
+    assert login_statuses(client, "203.0.113.1", "203.0.113.2") == [400, 429]
@@ -0,0 +1,75 @@
+import hashlib
+import time
+import jwt
+import pytest
+from werkzeug.exceptions import Unauthorized
+import auth
+from auth import SECRET_KEY, TokenCache, validate_token
+
+def token(**claims):
+    return jwt.encode(dict({"user_id": "tester", "role": "Admin"}, **claims), SECRET_KEY, algorithm="HS256")
+
+def digest(value):
+    return hashlib.sha256(value.encode()).digest()
+
+def test_hits_and_misses_are_counted():
+    cache = TokenCache()
+    assert cache.get(b"a") is None
+    cache.put(b"a", {"user_id": "tester"})
+    assert cache.get(b"a") == {"user_id": "tester"}
+    assert cache.get(b"a") == {"user_id": "tester"}
+    assert cache.stats() == {"hits": 2, "misses": 1, "size": 1, "maxsize": cache.maxsize}
+
+def test_least_recently_used_entry_is_dropped():
+    cache = TokenCache(maxsize=2)
+    cache.put(b"a", {})
+    cache.put(b"b", {})
+    cache.get(b"a")
+    cache.put(b"c", {})
+    assert cache.get(b"b") is None
+    assert cache.get(b"a") == {} and cache.get(b"c") == {}
+
+def test_entry_expires_at_the_token_exp(monkeypatch):
+    cache = TokenCache()
+    now = time.time()
+    cache.put(b"a", {"exp": now + 10})
+    monkeypatch.setattr(auth.time, "time", lambda: now + 9)
+    assert cache.get(b"a") is not None
+    monkeypatch.setattr(auth.time, "time", lambda: now + 10)
+    assert cache.get(b"a") is None
+    assert cache.stats()["size"] == 0
+
+def test_validate_token_verifies_once(monkeypatch):
+    value = token(exp=int(time.time()) + 60)
+    decoded = []
+    monkeypatch.setattr(auth.jwt, "decode", lambda *args, **kwargs: decoded.append(args) or jwt.api_jwt.decode(*args, **kwargs))
+    before = auth.token_cache.stats()
+    assert validate_token("Bearer " + value)["user_id"] == "tester"
+    assert validate_token("Bearer " + value)["user_id"] == "tester"
+    after = auth.token_cache.stats()
+    assert len(decoded) == 1
+    assert (after["hits"] - before["hits"], after["misses"] - before["misses"]) == (1, 1)
+
+def test_expired_cached_token_is_rejected():
+    # Cached while it was valid; once exp has passed it is verified again, and refused
+    value = token(exp=int(time.time()) - 1)
+    auth.token_cache.put(digest(value), {"user_id": "tester", "exp": int(time.time()) - 1})
+    with pytest.raises(Unauthorized):
+        validate_token(value)
+
+def test_invalid_token_is_not_cached():
+    with pytest.raises(Unauthorized):
+        validate_token("Bearer not-a-token")
+    assert auth.token_cache.get(digest("not-a-token")) is None
+
+def test_cache_counters_are_on_metrics(client, auth_headers, seed):
+    import response_cache
+
+    seed(1)
+    headers = auth_headers()
+    client.get("/trails/1", headers=headers)
+    client.get("/trails/1", headers=headers)
+    body = client.get("/metrics").get_data(as_text=True)
+    assert f'trail_service_token_cache_lookups_total{{result="hit"}} {auth.token_cache.stats()["hits"]}' in body
+    assert "trail_service_token_cache_entries " in body
+    assert f'trail_service_response_cache_lookups_total{{result="hit"}} {response_cache.response_cache.stats()["hits"]}' in body
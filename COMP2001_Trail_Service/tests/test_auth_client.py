@@ -0,0 +1,120 @@
+import threading
+import time
+import pytest
+import auth_client
+import auth_stub
+from auth_client import AuthClient, AuthUnavailable, CircuitBreaker, CredentialCache
+
+EMAIL = "tim@plymouth.ac.uk"
+PASSWORD = "COMP2001!"
+
+@pytest.fixture
+def stub(monkeypatch):
+    """
+    stub(*failures) starts a stub auth API that answers the first requests with those statuses.
+    """
+    # Retry at once rather than after the backoff
+    monkeypatch.setattr(auth_client, "BACKOFF_FACTOR", 0)
+    servers = []
+
+    def start(*failures):
+        server = auth_stub.make_server(failures=failures)
+        threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.01}, daemon=True).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+def client_for(server):
+    return AuthClient(f"http://127.0.0.1:{server.server_port}/users")
+
+def requests_made(server):
+    return server.RequestHandlerClass.requests
+
+def test_breaker_opens_after_the_threshold_and_half_opens_after_the_cooldown():
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=0.1)
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.state == "closed" and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open" and not breaker.allow()
+    time.sleep(0.15)
+    assert breaker.state == "half-open"
+    # One trial request at a time
+    assert breaker.allow()
+    assert not breaker.allow()
+    # A failed trial opens it again for another cooldown
+    breaker.record_failure()
+    assert breaker.state == "open"
+    time.sleep(0.15)
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.failures == 0
+
+def test_open_breaker_stops_calling_the_upstream(stub):
+    # Each verify retries twice, so three failing calls use nine 503s
+    server = stub(*[503] * 9)
+    client = client_for(server)
+    client.breaker = CircuitBreaker(failure_threshold=3, reset_timeout=0.2)
+    for _ in range(3):
+        with pytest.raises(AuthUnavailable):
+            client.verify(EMAIL, PASSWORD)
+    assert client.breaker.state == "open"
+    calls = requests_made(server)
+    with pytest.raises(AuthUnavailable):
+        client.verify(EMAIL, PASSWORD)
+    assert requests_made(server) == calls
+    time.sleep(0.25)
+    assert client.verify(EMAIL, PASSWORD) == ["Verified", "True"]
+    assert client.breaker.state == "closed"
+
+@pytest.mark.parametrize("status", [502, 503, 504])
+def test_gateway_errors_are_retried(stub, status):
+    server = stub(status, status)
+    client = client_for(server)
+    assert client.verify(EMAIL, PASSWORD) == ["Verified", "True"]
+    assert requests_made(server) == 3
+    assert client.breaker.failures == 0
+
+def test_error_after_the_retries_counts_as_one_failure(stub):
+    server = stub(503, 503, 503)
+    client = client_for(server)
+    with pytest.raises(AuthUnavailable):
+        client.verify(EMAIL, PASSWORD)
+    assert requests_made(server) == 3
+    assert client.breaker.failures == 1
+
+def test_other_errors_are_not_retried(stub):
+    server = stub(500)
+    client = client_for(server)
+    with pytest.raises(AuthUnavailable):
+        client.verify(EMAIL, PASSWORD)
+    assert requests_made(server) == 1
+
+def test_verified_credentials_are_served_from_the_cache(stub):
+    server = stub()
+    client = client_for(server)
+    assert client.verify(EMAIL, PASSWORD) == ["Verified", "True"]
+    assert client.verify(EMAIL, PASSWORD) == ["Verified", "True"]
+    assert requests_made(server) == 1
+
+def test_wrong_password_is_not_served_from_the_cache(stub):
+    server = stub()
+    client = client_for(server)
+    assert client.verify(EMAIL, PASSWORD) == ["Verified", "True"]
+    assert client.verify(EMAIL, "wrong") == ["Verified", "False"]
+    assert client.verify(EMAIL, "wrong") == ["Verified", "False"]
+    # Rejections are never cached, so each one goes upstream
+    assert requests_made(server) == 3
+
+def test_credential_cache_expires_and_keeps_no_password():
+    cache = CredentialCache(ttl=0.05)
+    cache.put(EMAIL, PASSWORD, ["Verified", "True"])
+    assert cache.get(EMAIL, PASSWORD) == ["Verified", "True"]
+    assert cache.get(EMAIL, "other") is None
+    assert all(PASSWORD.encode() not in key for key in cache._entries)
+    time.sleep(0.06)
+    assert cache.get(EMAIL, PASSWORD) is None
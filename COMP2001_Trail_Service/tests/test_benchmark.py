@@ -0,0 +1,43 @@
+import json
+import pathlib
+import sqlite3
+import subprocess
+import sys
+import benchmark
+
+SCRIPT = pathlib.Path(benchmark.__file__).resolve()
+
+def rows(path):
+    with sqlite3.connect(path) as connection:
+        trails = connection.execute('SELECT * FROM "TRAIL" ORDER BY "TrailID"').fetchall()
+        points = connection.execute('SELECT * FROM "LocationPoint" ORDER BY "LocationPointID"').fetchall()
+    return trails, points
+
+def test_generated_dataset_is_reproducible(tmp_path):
+    benchmark.generate_dataset(str(tmp_path / "a.db"), 20, 4)
+    benchmark.generate_dataset(str(tmp_path / "b.db"), 20, 4)
+    trails, points = rows(tmp_path / "a.db")
+    assert len(trails) == 20 and len(points) == 80
+    # The timestamp column is the only one allowed to differ between runs
+    timestamp = 9
+    assert [row[:timestamp] for row in trails] == [row[:timestamp] for row in rows(tmp_path / "b.db")[0]]
+    assert points == rows(tmp_path / "b.db")[1]
+
+def run(tmp_path, *args):
+    return subprocess.run(
+        [sys.executable, str(SCRIPT), "--sizes", "5", "--points", "3", "--requests", "3",
+         "--data-dir", str(tmp_path / "data"), *args],
+        cwd=SCRIPT.parent, capture_output=True, text=True, timeout=300,
+    )
+
+def test_benchmark_writes_and_compares_results(tmp_path):
+    first = run(tmp_path, "--output", str(tmp_path / "before.json"))
+    assert first.returncode == 0, first.stderr
+    report = json.loads((tmp_path / "before.json").read_text())
+    results = report["results"]["5x3"]
+    for scenario in ("list_trails", "get_trail", "list_points", "create_trail", "login"):
+        assert results[scenario]["throughput_rps"] > 0
+
+    second = run(tmp_path, "--output", str(tmp_path / "after.json"), "--compare", str(tmp_path / "before.json"))
+    assert second.returncode == 0, second.stderr
+    assert "list_trails" in second.stdout
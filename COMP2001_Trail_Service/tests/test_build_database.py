@@ -0,0 +1,44 @@
+import pathlib
+import sqlite3
+import subprocess
+import sys
+from alembic import command
+from alembic.config import Config
+from alembic.script import ScriptDirectory
+
+SERVICE_DIR = pathlib.Path(__file__).resolve().parent.parent
+ALEMBIC_CONFIG = Config(str(SERVICE_DIR / "alembic.ini"))
+HEAD = ScriptDirectory.from_config(ALEMBIC_CONFIG).get_current_head()
+
+def build(database):
+    return subprocess.run(
+        [sys.executable, str(SERVICE_DIR / "build_database.py")],
+        cwd=SERVICE_DIR, capture_output=True, text=True, timeout=300,
+        env={"PATH": "", "DATABASE_URL": f"sqlite:///{database}", "ADMISSION_CONTROL": "0"},
+    )
+
+def state(database):
+    with sqlite3.connect(database) as connection:
+        version = connection.execute("SELECT version_num FROM alembic_version").fetchall()
+        names = [name for (name,) in connection.execute('SELECT "TrailName" FROM "TRAIL" ORDER BY "TrailID"')]
+    return version, names
+
+def test_builds_a_new_database(tmp_path):
+    result = build(tmp_path / "new.db")
+    assert result.returncode == 0, result.stderr
+    assert state(tmp_path / "new.db") == ([(HEAD,)], ["Trail 1", "Trail 2"])
+
+def test_upgrades_a_database_built_before_the_migrations(settings, tmp_path):
+    database = tmp_path / "old.db"
+    settings.setenv("DATABASE_URL", f"sqlite:///{database}")
+    # The tables of 0001, as the old build_database.py left them, with no version table
+    command.upgrade(ALEMBIC_CONFIG, "0001")
+    with sqlite3.connect(database) as connection:
+        connection.execute("DROP TABLE alembic_version")
+        connection.execute(
+            """INSERT INTO "TRAIL" ("TrailName", "TrailSummary", "TrailDescription", "Difficulty", "Location",
+               "Length", "ElevationGain", "RouteType") VALUES ('Old trail', 's', 'd', 'Easy', 'Plymouth', 1, 2, 'Loop')"""
+        )
+    result = build(database)
+    assert result.returncode == 0, result.stderr
+    assert state(database) == ([(HEAD,)], ["Old trail", "Trail 1", "Trail 2"])
@@ -0,0 +1,65 @@
+import shutil
+import time
+import pytest
+import db_routing
+import response_cache
+from config import db
+from models import Trail
+
+# Two SQLite files stand in for the primary and a replica. The replica is a
+# copy taken after seeding, so a trail added to the primary afterwards shows
+# which database a read went to.
+
+NEW_TRAIL = {
+    "TrailName": "Written after the copy",
+    "TrailSummary": "s",
+    "TrailDescription": "d",
+    "Difficulty": "Easy",
+    "Location": "Plymouth",
+    "Length": 1.0,
+    "ElevationGain": 2.0,
+    "RouteType": "Loop",
+}
+
+@pytest.fixture
+def replicated(replica_path, app, seed, tmp_path):
+    seed(3)
+    db.session.remove()
+    db.engine.dispose()
+    shutil.copyfile(tmp_path / "trails.db", replica_path)
+    return replica_path
+
+def trail_count(client, headers):
+    response_cache.invalidate()
+    response = client.get("/trails", headers=headers)
+    assert response.status_code == 200
+    return len(response.get_json())
+
+def test_reads_go_to_the_replica(replicated, client, auth_headers):
+    db.session.add(Trail(**NEW_TRAIL))
+    db.session.commit()
+    assert trail_count(client, auth_headers(user_id="reader")) == 3
+
+def test_writer_reads_its_own_write_from_the_primary(replicated, app, client, auth_headers):
+    writer = auth_headers(user_id="writer")
+    assert client.post("/trails", json=NEW_TRAIL, headers=writer).status_code == 201
+    assert trail_count(client, writer) == 4
+    assert trail_count(app.test_client(), auth_headers(user_id="reader")) == 3
+
+def test_signed_cookie_pins_reads_on_another_worker(replicated, client, auth_headers):
+    writer = auth_headers(user_id="writer")
+    response = client.post("/trails", json=NEW_TRAIL, headers=writer)
+    assert db_routing.PRIMARY_COOKIE in response.headers["Set-Cookie"]
+    # The next request lands on a worker that did not see the write
+    db_routing.recent_writers.clear()
+    assert trail_count(client, writer) == 4
+
+@pytest.mark.parametrize("value", [
+    str(int(time.time()) + 10 ** 9),  # Unsigned
+    db_routing._cookie_signer.sign(str(int(time.time()) + 10 ** 9)).decode(),  # Signed, but far beyond the window
+])
+def test_forged_cookie_does_not_pin_reads(replicated, client, auth_headers, value):
+    db.session.add(Trail(**NEW_TRAIL))
+    db.session.commit()
+    client.set_cookie("localhost", db_routing.PRIMARY_COOKIE, value)
+    assert trail_count(client, auth_headers(user_id="reader")) == 3
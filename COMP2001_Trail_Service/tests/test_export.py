@@ -0,0 +1,20 @@
+import json
+
+def test_json_export_matches_the_trail_list_byte_for_byte(client, auth_headers, seed):
+    seed(5, points=3)
+    headers = auth_headers()
+    listed = client.get("/trails?limit=1000", headers=headers).get_data()
+    exported = client.get("/trails/export?format=json", headers=headers).get_data()
+    # jsonify() ends the body with a newline; the export does not
+    assert exported + b"\n" == listed
+
+def test_ndjson_export_has_one_compact_trail_per_line(client, auth_headers, seed):
+    seed(3, points=2)
+    headers = auth_headers()
+    listed = client.get("/trails?limit=1000", headers=headers).get_json()
+    lines = client.get("/trails/export", headers=headers).get_data(as_text=True).splitlines()
+    assert [json.loads(line) for line in lines] == listed
+    assert all(", " not in line and ": " not in line for line in lines)
+
+def test_empty_json_export(client, auth_headers):
+    assert client.get("/trails/export?format=json", headers=auth_headers()).get_data() == b"[]"
@@ -0,0 +1,77 @@
+import pytest
+from config import db
+from feature_index import FeatureIndex
+from models import Feature
+
+def create(client, headers, name):
+    return client.post("/features", json={"TrailFeature": name}, headers=headers)
+
+def tag(client, headers, trail_id, name):
+    assert client.post(f"/trails/{trail_id}/features", json={"TrailFeature": name}, headers=headers).status_code == 201
+
+def trail_ids(client, headers, query):
+    response = client.get(f"/trails/by-features?{query}", headers=headers)
+    assert response.status_code == 200, response.get_json()
+    return [trail["TrailID"] for trail in response.get_json()]
+
+@pytest.fixture
+def tagged(client, auth_headers, seed):
+    """
+    Trails 1-4 tagged: 1 waterfall+loop, 2 waterfall, 3 loop, 4 the feature named "2".
+    Returns {name: TrailFeatureID}.
+    """
+    seed(4)
+    headers = auth_headers()
+    ids = {name: create(client, headers, name).get_json()["TrailFeatureID"] for name in ("Waterfall", "Loop", "2")}
+    for trail_id, names in {1: ["Waterfall", "Loop"], 2: ["Waterfall"], 3: ["Loop"], 4: ["2"]}.items():
+        for name in names:
+            tag(client, headers, trail_id, name)
+    return ids
+
+def test_all_and_any(client, auth_headers, tagged):
+    headers = auth_headers()
+    assert trail_ids(client, headers, "features=waterfall,loop") == [1]
+    assert trail_ids(client, headers, "features=waterfall,loop&match=any") == [1, 2, 3]
+    assert trail_ids(client, headers, "features=LOOP") == [1, 3]
+
+def test_numeric_name_is_a_name(client, auth_headers, tagged):
+    headers = auth_headers()
+    assert tagged["2"] != 2
+    assert trail_ids(client, headers, "features=2") == [4]
+    # The feature whose ID is 2 is Loop
+    assert trail_ids(client, headers, f"feature_ids={tagged['Loop']}") == [1, 3]
+    assert trail_ids(client, headers, f"features=waterfall&feature_ids={tagged['Loop']}") == [1]
+
+def test_unknown_features(client, auth_headers, tagged):
+    headers = auth_headers()
+    response = client.get("/trails/by-features?features=volcano&feature_ids=999", headers=headers)
+    assert response.status_code == 404
+    assert "Unknown features: volcano, 999" in response.get_data(as_text=True)
+    assert client.get("/trails/by-features", headers=headers).status_code == 400
+    assert client.get("/trails/by-features?feature_ids=x", headers=headers).status_code == 400
+
+def test_case_only_duplicate_is_refused(client, auth_headers, tagged):
+    headers = auth_headers()
+    assert create(client, headers, "waterFALL").status_code == 406
+    assert create(client, headers, "Waterfalls").status_code == 201
+
+def test_paging_and_detach(client, auth_headers, tagged):
+    headers = auth_headers()
+    first = client.get("/trails/by-features?features=waterfall,loop&match=any&limit=2", headers=headers)
+    assert [trail["TrailID"] for trail in first.get_json()] == [1, 2]
+    assert first.headers["X-Next-Cursor"] == "2"
+    assert trail_ids(client, headers, "features=waterfall,loop&match=any&after=2") == [3]
+    assert client.delete(f"/trails/1/features/{tagged['Waterfall']}", headers=headers).status_code == 200
+    assert trail_ids(client, headers, "features=waterfall") == [2]
+
+def test_deleted_trail_leaves_the_index(client, auth_headers, tagged):
+    headers = auth_headers()
+    assert client.delete("/trails/3", headers=headers).status_code == 200
+    assert trail_ids(client, headers, "features=loop") == [1]
+
+def test_build_keeps_the_first_of_older_case_only_duplicates(app):
+    db.session.add_all([Feature(TrailFeature="Beach"), Feature(TrailFeature="BEACH")])
+    db.session.commit()
+    index = FeatureIndex()
+    first = db.session.scalar(db.select(Feature.TrailFeatureID).where(Feature.TrailFeature == "Beach"))
+    assert index.resolve(["beach"]) == ([first], [])
@@ -0,0 +1,29 @@
+import pytest
+from config import db
+from models import Trail
+
+NEW_POINT = {"Latitude": 50.01, "Longitude": -4.01, "Order": 99000}
+
+def trail_length(trail_id):
+    db.session.expire_all()
+    return db.session.get(Trail, trail_id).Length
+
+def test_point_write_leaves_length_alone_by_default(app, client, auth_headers, seed):
+    (trail_id,) = seed(1)
+    before = trail_length(trail_id)
+    assert client.post(f"/trails/{trail_id}/points", json=NEW_POINT, headers=auth_headers()).status_code == 201
+    assert trail_length(trail_id) == before
+
+def test_write_back_setting_is_read_from_the_app_config(app, client, auth_headers, seed):
+    app.config["TRAIL_STATS_WRITEBACK"] = True
+    (trail_id,) = seed(1)
+    assert client.post(f"/trails/{trail_id}/points", json=NEW_POINT, headers=auth_headers()).status_code == 201
+    stats = client.get(f"/trails/{trail_id}/stats", headers=auth_headers()).get_json()
+    assert stats["point_count"] == 4
+    assert trail_length(trail_id) == pytest.approx(stats["length_km"])
+
+def test_write_back_setting_from_the_environment(settings, auth_headers):
+    settings.setenv("TRAIL_STATS_WRITEBACK", "1")
+    import app as trail_app
+
+    assert trail_app.create_app().app.config["TRAIL_STATS_WRITEBACK"] is True
@@ -0,0 +1,30 @@
+import pathlib
+import runpy
+import sys
+import types
+import pytest
+from config import db
+
+CONF = pathlib.Path(__file__).resolve().parent.parent / "gunicorn.conf.py"
+
+@pytest.fixture
+def hooks(app, monkeypatch):
+    monkeypatch.setitem(sys.modules, "wsgi", types.SimpleNamespace(app=app))
+    return runpy.run_path(str(CONF))
+
+def open_connections():
+    pools = {}
+    for key, engine in db.engines.items():
+        with engine.connect() as connection:
+            connection.exec_driver_sql("SELECT 1")
+        pools[key] = engine.pool
+    return pools
+
+@pytest.mark.parametrize("hook", ["post_fork", "worker_exit"])
+def test_hooks_dispose_every_engine(replica_path, app, hooks, hook):
+    pools = open_connections()
+    assert len(pools) == 2
+    server = types.SimpleNamespace(cfg=types.SimpleNamespace(preload_app=True))
+    hooks[hook](server, None)
+    for key, engine in db.engines.items():
+        assert engine.pool is not pools[key], key
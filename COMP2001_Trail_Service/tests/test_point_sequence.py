@@ -0,0 +1,81 @@
+import pytest
+import point_sequence
+from point_sequence import ORDER_GAP
+
+def points(client, headers, trail_id):
+    response = client.get(f"/trails/{trail_id}/points", headers=headers)
+    assert response.status_code == 200
+    return response.get_json()
+
+def coordinates(client, headers, trail_id):
+    return [(point["Latitude"], point["Longitude"]) for point in points(client, headers, trail_id)]
+
+def test_get_output_can_be_put_back(client, auth_headers, seed):
+    (trail_id,) = seed(1, points=4)
+    headers = auth_headers()
+    before = points(client, headers, trail_id)
+    response = client.put(f"/trails/{trail_id}/points", json=list(reversed(before)), headers=headers)
+    assert response.status_code == 200, response.get_json()
+    after = points(client, headers, trail_id)
+    assert [(p["Latitude"], p["Longitude"]) for p in after] == [(p["Latitude"], p["Longitude"]) for p in reversed(before)]
+    assert [p["Order"] for p in after] == [(i + 1) * ORDER_GAP for i in range(4)]
+    assert all(p["TrailID"] == trail_id for p in after)
+
+def test_replace_rejects_invalid_points(client, auth_headers, seed):
+    (trail_id,) = seed(1)
+    headers = auth_headers()
+    assert client.put(f"/trails/{trail_id}/points", json=[{"Latitude": 1.0}], headers=headers).status_code == 400
+    assert client.put(f"/trails/{trail_id}/points", json=[1, 2], headers=headers).status_code == 400
+    assert len(points(client, headers, trail_id)) == 3
+
+def test_reorder(client, auth_headers, seed):
+    (trail_id,) = seed(1, points=3)
+    headers = auth_headers()
+    ids = [point["LocationPointID"] for point in points(client, headers, trail_id)]
+    order = [ids[2], ids[0], ids[1]]
+    assert client.patch(f"/trails/{trail_id}/points", json={"order": order}, headers=headers).status_code == 200
+    assert [point["LocationPointID"] for point in points(client, headers, trail_id)] == order
+    assert client.patch(f"/trails/{trail_id}/points", json={"order": ids[:2]}, headers=headers).status_code == 400
+
+def test_splice_inserts_and_deletes(client, auth_headers, seed):
+    (trail_id,) = seed(1, points=3)
+    headers = auth_headers()
+    ids = [point["LocationPointID"] for point in points(client, headers, trail_id)]
+    edit = {"after": ids[0], "insert": [{"Latitude": 1.0, "Longitude": 2.0}, {"Latitude": 3.0, "Longitude": 4.0}], "delete": [ids[2]]}
+    assert client.patch(f"/trails/{trail_id}/points", json=edit, headers=headers).status_code == 200
+    after = points(client, headers, trail_id)
+    assert [point["LocationPointID"] for point in after][0] == ids[0]
+    assert [(point["Latitude"], point["Longitude"]) for point in after[1:3]] == [(1.0, 2.0), (3.0, 4.0)]
+    assert [point["LocationPointID"] for point in after][3:] == [ids[1]]
+
+    # At the start, and with unknown IDs
+    start = {"insert": [{"Latitude": 5.0, "Longitude": 6.0}]}
+    assert client.patch(f"/trails/{trail_id}/points", json=start, headers=headers).status_code == 200
+    assert coordinates(client, headers, trail_id)[0] == (5.0, 6.0)
+    assert client.patch(f"/trails/{trail_id}/points", json={"delete": [999999]}, headers=headers).status_code == 400
+    assert client.patch(f"/trails/{trail_id}/points", json=dict(start, after=999999), headers=headers).status_code == 400
+
+def test_splice_renumbers_only_when_the_gap_is_used_up(app, auth_headers, client, seed):
+    from config import db
+
+    (trail_id,) = seed(1, points=2)
+    headers = auth_headers()
+    client.put(f"/trails/{trail_id}/points", json=points(client, headers, trail_id), headers=headers)
+    first, second = [point["LocationPointID"] for point in points(client, headers, trail_id)]
+    # Each splice right after the first point halves the gap in front of the second
+    for n in range(10):
+        point_sequence.splice_points(trail_id, first, [{"Latitude": float(n), "Longitude": 0.0}])
+    orders = dict(point_sequence._current(trail_id))
+    assert orders[second] == 2 * ORDER_GAP
+    # The gap before the second point is used up: the whole trail is respaced
+    point_sequence.splice_points(trail_id, first, [{"Latitude": 10.0, "Longitude": 0.0}])
+    db.session.commit()
+    sequence = point_sequence._current(trail_id)
+    assert [order for _, order in sequence] == sorted({order for _, order in sequence})
+    assert sequence[0] == (first, ORDER_GAP)
+    assert sequence[-1][0] == second and sequence[-1][1] > 2 * ORDER_GAP
+    assert [lat for lat, _ in coordinates(client, headers, trail_id)[1:-1]] == [10.0] + [float(n) for n in range(9, -1, -1)]
+
+def test_point_edits_are_admin_only(client, auth_headers, seed):
+    (trail_id,) = seed(1)
+    assert client.put(f"/trails/{trail_id}/points", json=[], headers=auth_headers(role="User")).status_code == 403
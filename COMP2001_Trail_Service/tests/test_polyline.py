@@ -0,0 +1,27 @@
+import polyline
+
+def test_point_formats_return_the_same_shape(client, auth_headers, seed):
+    (trail_id,) = seed(1, points=5)
+    headers = auth_headers()
+    plain = client.get(f"/trails/{trail_id}/points", headers=headers).get_json()
+    simplified = client.get(f"/trails/{trail_id}/points?tolerance=0.001", headers=headers).get_json()
+    assert isinstance(plain, list) and isinstance(simplified, list)
+    assert plain[0].keys() >= simplified[0].keys() >= {"Latitude", "Longitude", "Order"}
+    # The seeded points lie on a line, so simplifying keeps only the ends
+    assert [point["Order"] for point in simplified] == [plain[0]["Order"], plain[-1]["Order"]]
+
+def test_load_racing_a_write_is_not_cached(app, seed, monkeypatch):
+    (trail_id,) = seed(1, points=5)
+    cache = polyline.SimplificationCache()
+    load = polyline.load_trail_points
+
+    def load_then_write(trail_id):
+        points = load(trail_id)
+        cache.invalidate_trail(trail_id)  # A write commits while the old points are in hand
+        return points
+
+    monkeypatch.setattr(polyline, "load_trail_points", load_then_write)
+    stale = cache.get(trail_id, None)
+    monkeypatch.setattr(polyline, "load_trail_points", load)
+    assert cache.get(trail_id, None) is not stale
+    assert cache.get(trail_id, None) is cache.get(trail_id, None)
@@ -0,0 +1,32 @@
+import pytest
+import response_cache
+
+# The trail read paths load location points in one batched SELECT, so the
+# number of statements per request must not grow with the number of trails.
+
+READ_PATHS = ["/trails", "/trails?limit=1000", "/trails/1", "/trails/1/points", "/"]
+
+def count_statements(client, headers, statements, path):
+    response_cache.invalidate()
+    del statements[:]
+    response = client.get(path, headers=headers)
+    assert response.status_code == 200, response.data
+    return len(statements)
+
+@pytest.mark.parametrize("path", READ_PATHS)
+def test_statement_count_does_not_grow_with_trails(client, auth_headers, seed, statements, path):
+    headers = auth_headers()
+    seed(1)
+    with_one = count_statements(client, headers, statements, path)
+    seed(49)
+    with_fifty = count_statements(client, headers, statements, path)
+    assert with_one == with_fifty
+    assert with_fifty <= 3
+
+def test_trail_list_includes_ordered_points(client, auth_headers, seed):
+    seed(2, points=4)
+    trails = client.get("/trails", headers=auth_headers()).get_json()
+    assert [trail["TrailID"] for trail in trails] == [1, 2]
+    for trail in trails:
+        orders = [point["Order"] for point in trail["location_points"]]
+        assert orders == [1, 2, 3, 4]
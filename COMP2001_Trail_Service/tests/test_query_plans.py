@@ -0,0 +1,8 @@
+import check_query_plans
+
+def test_hot_requests_use_indexes(migrated, app, auth_headers):
+    check_query_plans.seed()
+    results = check_query_plans.check_requests(app, auth_headers(user_id="plan-check"))
+    assert len(results) == len(check_query_plans.HOT_REQUESTS)
+    failures = [f"{name}: {method} {url}\n  " + "\n  ".join(problems) for name, method, url, _, problems in results if problems]
+    assert not failures, "\n".join(failures)
@@ -0,0 +1,39 @@
+import pytest
+import request_metrics
+
+def observed(histogram, route):
+    # (count, sum) of one route's GET samples
+    _, total, count = histogram._values.get(("GET", route), (None, 0.0, 0))
+    return count, total
+
+def test_streamed_export_is_timed_after_its_body(client, auth_headers, seed):
+    seed(3)
+    before_count, before_sql = observed(request_metrics.sql_statements, "/trails/export")
+    response = client.get("/trails/export?format=ndjson", headers=auth_headers())
+    assert len(response.get_data().splitlines()) == 3
+    response.close()
+    count, sql = observed(request_metrics.sql_statements, "/trails/export")
+    assert count == before_count + 1
+    # The trail SELECT and the batched point SELECT run while the body streams
+    assert sql - before_sql >= 2
+
+def test_plain_request_is_recorded(client, auth_headers, seed):
+    seed(1)
+    before, _ = observed(request_metrics.request_seconds, "/trails")
+    response = client.get("/trails", headers=auth_headers())
+    response.close()
+    assert observed(request_metrics.request_seconds, "/trails")[0] == before + 1
+    assert ("GET", "/trails", 200) in request_metrics.requests_total._values
+
+@pytest.fixture
+def log_every_request(settings):
+    settings.setenv("SLOW_REQUEST_SECONDS", "0.000001")
+
+def test_slow_request_log_includes_streamed_statements(log_every_request, client, auth_headers, seed, caplog):
+    seed(2)
+    response = client.get("/trails/export", headers=auth_headers())
+    response.get_data()
+    response.close()
+    (message,) = [record.getMessage() for record in caplog.records if "/trails/export" in record.getMessage()]
+    assert message.startswith("Slow request GET /trails/export")
+    assert "SELECT" in message
@@ -0,0 +1,78 @@
+from datetime import datetime, timedelta, timezone
+import pytest
+import response_cache
+from config import db
+
+def http_date(value):
+    return value.strftime("%a, %d %b %Y %H:%M:%S GMT")
+
+def test_collection_uses_a_content_etag(client, auth_headers, seed):
+    seed(3)
+    headers = auth_headers()
+    first = client.get("/trails", headers=headers)
+    assert first.status_code == 200
+    assert first.headers["ETag"]
+    assert "Last-Modified" not in first.headers
+
+    again = client.get("/trails", headers=dict(headers, **{"If-None-Match": first.headers["ETag"]}))
+    assert again.status_code == 304
+
+    # A date alone must not produce a 304: a deleted trail leaves no timestamp behind
+    future = http_date(datetime.now(timezone.utc) + timedelta(days=1))
+    dated = client.get("/trails", headers=dict(headers, **{"If-Modified-Since": future}))
+    assert dated.status_code == 200
+
+@pytest.mark.parametrize("path", ["/trails/1", "/trails/1/points", "/trails/1/stats"])
+def test_trail_validators_come_from_the_data(client, auth_headers, seed, path):
+    seed(1)
+    headers = auth_headers()
+    first = client.get(path, headers=headers)
+    trail = client.get("/trails/1", headers=headers).get_json()
+    stored = response_cache.LONDON.localize(datetime.fromisoformat(trail["timestamp"]))
+    assert first.last_modified == stored.astimezone(timezone.utc).replace(microsecond=0)
+
+    # Another worker, with nothing cached, hands out the same validators and answers from them
+    response_cache.invalidate()
+    again = client.get(path, headers=headers)
+    assert (again.headers["ETag"], again.headers["Last-Modified"]) == (first.headers["ETag"], first.headers["Last-Modified"])
+    response_cache.invalidate()
+    assert client.get(path, headers=dict(headers, **{"If-None-Match": first.headers["ETag"]})).status_code == 304
+    response_cache.invalidate()
+    assert client.get(path, headers=dict(headers, **{"If-Modified-Since": first.headers["Last-Modified"]})).status_code == 304
+    earlier = http_date(first.last_modified - timedelta(seconds=1))
+    assert client.get(path, headers=dict(headers, **{"If-Modified-Since": earlier})).status_code == 200
+
+def test_conditional_request_on_a_cold_cache_skips_the_view(client, auth_headers, seed, statements):
+    seed(1)
+    headers = auth_headers()
+    etag = client.get("/trails/1", headers=headers).headers["ETag"]
+    response_cache.invalidate()
+    statements.clear()
+    assert client.get("/trails/1", headers=dict(headers, **{"If-None-Match": etag})).status_code == 304
+    assert len(statements) == 1
+
+def test_point_write_moves_the_trail_validators(client, auth_headers, seed):
+    seed(1)
+    headers = auth_headers()
+    before = client.get("/trails/1/points", headers=headers)
+    point = {"Latitude": 50.5, "Longitude": -4.5, "Order": 99000}
+    assert client.post("/trails/1/points", json=point, headers=headers).status_code == 201
+    after = client.get("/trails/1/points", headers=dict(headers, **{"If-None-Match": before.headers["ETag"]}))
+    assert after.status_code == 200
+    assert len(after.get_json()) == 4
+    assert after.last_modified >= before.last_modified
+
+def test_write_changes_the_etag(client, auth_headers, seed):
+    seed(1)
+    headers = auth_headers()
+    before = client.get("/trails/1", headers=headers)
+    assert client.put("/trails/1", json={"TrailSummary": "Changed"}, headers=headers).status_code == 200
+    after = client.get("/trails/1", headers=dict(headers, **{"If-None-Match": before.headers["ETag"]}))
+    assert after.status_code == 200
+    assert after.get_json()["TrailSummary"] == "Changed"
+
+@pytest.mark.parametrize("path", ["/trails", "/trails/1", "/trails/1/points", "/trails/1/stats"])
+def test_guest_is_denied_after_the_cache_is_warm(client, auth_headers, seed, path):
+    seed(1)
+    assert client.get(path, headers=auth_headers(role="Admin")).status_code == 200
+    assert client.get(path, headers=auth_headers(role="Guest")).status_code == 403
@@ -0,0 +1,110 @@
+import time
+import pytest
+from search_index import TextIndex, tokenize
+
+def new_trail(name, location, summary, description, difficulty="Easy", route_type="Loop"):
+    return {
+        "TrailName": name,
+        "TrailSummary": summary,
+        "TrailDescription": description,
+        "Difficulty": difficulty,
+        "Location": location,
+        "Length": 1.0,
+        "ElevationGain": 2.0,
+        "RouteType": route_type,
+        "location_points": [{"Latitude": 50.0, "Longitude": -4.0, "Order": 1}],
+    }
+
+TRAILS = [
+    new_trail("Burrator Reservoir", "Dartmoor", "Reservoir views", "A walk around the reservoir"),
+    new_trail("Haytor Rocks", "Dartmoor", "Granite tors", "Passes an old reservoir", "Hard", "Out and back"),
+    new_trail("Plymouth Hoe", "Plymouth", "Seafront café", "A walk along the Hoe"),
+]
+
+def search(client, headers, query):
+    response = client.get(f"/trails/search?{query}", headers=headers)
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()
+
+def trail_ids(client, headers, query):
+    return [trail["TrailID"] for trail in search(client, headers, query)]
+
+@pytest.fixture
+def trails(client, auth_headers):
+    headers = auth_headers()
+    return [client.post("/trails", json=trail, headers=headers).get_json()["TrailID"] for trail in TRAILS]
+
+def test_tokenize_folds_case_and_accents():
+    assert tokenize("Café, Haytor-ROCKS!") == ["cafe", "haytor", "rocks"]
+    assert tokenize(None) == []
+
+def test_ranked_by_bm25(client, auth_headers, trails):
+    burrator, haytor, _ = trails
+    results = search(client, auth_headers(), "q=reservoir")
+    # Burrator has the term in its name, summary and description; Haytor only in its description
+    assert [trail["TrailID"] for trail in results] == [burrator, haytor]
+    assert results[0]["score"] > results[1]["score"] > 0
+
+def test_rarer_terms_score_higher():
+    index = TextIndex()
+    index._built_at = time.monotonic()
+    for trail_id, name in enumerate(["moor common", "moor common", "moor rare"], 1):
+        index._add(trail_id, {"TrailName": name}, "Easy", "Loop")
+    common = dict(index.search("common", 5))
+    rare = dict(index.search("rare", 5))
+    assert common[1] == common[2] < rare[3]
+
+def test_every_term_must_match(client, auth_headers, trails):
+    headers = auth_headers()
+    burrator, haytor, hoe = trails
+    assert trail_ids(client, headers, "q=dartmoor reservoir") == [burrator, haytor]
+    assert trail_ids(client, headers, "q=dartmoor granite") == [haytor]
+    assert sorted(trail_ids(client, headers, "q=walk")) == [burrator, hoe]
+    assert trail_ids(client, headers, "q=volcano") == []
+
+def test_prefix_and_accents(client, auth_headers, trails):
+    headers = auth_headers()
+    burrator, haytor, hoe = trails
+    assert trail_ids(client, headers, "q=reserv") == [burrator, haytor]
+    assert trail_ids(client, headers, "q=reserv&prefix=false") == []
+    assert trail_ids(client, headers, "q=CAFE") == [hoe]
+
+def test_filters(client, auth_headers, trails):
+    headers = auth_headers()
+    burrator, haytor, _ = trails
+    assert trail_ids(client, headers, "q=reservoir&difficulty=Hard") == [haytor]
+    assert trail_ids(client, headers, "q=reservoir&route_type=Loop") == [burrator]
+    assert trail_ids(client, headers, "q=reservoir&limit=1") == [burrator]
+
+def test_bad_requests(client, auth_headers, trails):
+    headers = auth_headers()
+    assert client.get("/trails/search", headers=headers).status_code == 400
+    assert client.get("/trails/search?q=%20", headers=headers).status_code == 400
+    assert client.get("/trails/search?q=hoe&limit=0", headers=headers).status_code == 400
+    assert client.get("/trails/search/suggest", headers=headers).status_code == 400
+
+def test_suggest(client, auth_headers, trails):
+    headers = auth_headers()
+    response = client.get("/trails/search/suggest?q=old r", headers=headers)
+    assert response.status_code == 200
+    # Completions of the last word, most common first
+    assert response.get_json() == ["reservoir", "rocks"]
+    assert client.get("/trails/search/suggest?q=r&limit=1", headers=headers).get_json() == ["reservoir"]
+    assert client.get("/trails/search/suggest?q=zz", headers=headers).get_json() == []
+
+def test_index_follows_writes(client, auth_headers, trails):
+    headers = auth_headers()
+    burrator, haytor, hoe = trails
+    created = client.post("/trails", json=new_trail("Lydford Gorge", "Dartmoor", "Waterfall", "Gorge walk"), headers=headers)
+    assert trail_ids(client, headers, "q=gorge") == [created.get_json()["TrailID"]]
+
+    before = search(client, headers, "q=hoe")[0]["score"]
+    assert client.put(f"/trails/{hoe}", json={"TrailName": "Plymouth Barbican"}, headers=headers).status_code == 200
+    assert trail_ids(client, headers, "q=barbican") == [hoe]
+    # Still found through the description, but without the name's weight
+    assert search(client, headers, "q=hoe")[0]["score"] < before
+
+    assert client.delete(f"/trails/{haytor}", headers=headers).status_code == 200
+    assert trail_ids(client, headers, "q=haytor") == []
+    assert trail_ids(client, headers, "q=reservoir") == [burrator]
+    assert "haytor" not in client.get("/trails/search/suggest?q=h", headers=headers).get_json()
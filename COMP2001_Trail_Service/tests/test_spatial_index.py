@@ -0,0 +1,59 @@
+import pytest
+from spatial_index import haversine_km
+
+def new_trail(name, *points):
+    return {
+        "TrailName": name,
+        "TrailSummary": "s",
+        "TrailDescription": "d",
+        "Difficulty": "Easy",
+        "Location": "Plymouth",
+        "Length": 1.0,
+        "ElevationGain": 2.0,
+        "RouteType": "Loop",
+        "location_points": [
+            {"Latitude": lat, "Longitude": lon, "Order": order} for order, (lat, lon) in enumerate(points, 1)
+        ],
+    }
+
+def trail_ids(response):
+    assert response.status_code == 200
+    return [trail["TrailID"] for trail in response.get_json()]
+
+def test_haversine_km():
+    # One degree of latitude
+    assert haversine_km(50.0, -4.0, 51.0, -4.0) == pytest.approx(111.2, abs=0.1)
+    assert haversine_km(50.0, -4.0, 50.0, -4.0) == 0
+
+def test_created_trail_is_found_straight_away(client, auth_headers, seed):
+    headers = auth_headers()
+    seed(2)
+    # Builds the index before the trail exists
+    assert trail_ids(client.get("/trails/near?lat=10&lon=10&radius_km=5", headers=headers)) == []
+    created = client.post("/trails", json=new_trail("Far away", (10.0, 10.0)), headers=headers)
+    assert created.status_code == 201
+    trail_id = created.get_json()["TrailID"]
+    near = client.get("/trails/near?lat=10&lon=10&radius_km=5", headers=headers)
+    assert trail_ids(near) == [trail_id]
+    assert near.get_json()[0]["distance_km"] == 0
+
+def test_bbox_radius_and_nearest(client, auth_headers):
+    headers = auth_headers()
+    ids = [
+        client.post("/trails", json=new_trail(name, point), headers=headers).get_json()["TrailID"]
+        for name, point in [("Centre", (50.0, -4.0)), ("Two km", (50.018, -4.0)), ("Far", (51.0, -4.0))]
+    ]
+    assert trail_ids(client.get("/trails/within?min_lat=49.9&min_lon=-4.1&max_lat=50.1&max_lon=-3.9", headers=headers)) == ids[:2]
+    assert trail_ids(client.get("/trails/near?lat=50&lon=-4&radius_km=1", headers=headers)) == ids[:1]
+    assert trail_ids(client.get("/trails/near?lat=50&lon=-4&radius_km=5", headers=headers)) == ids[:2]
+    assert trail_ids(client.get("/trails/nearest?lat=50.02&lon=-4&k=3", headers=headers)) == [ids[1], ids[0], ids[2]]
+
+def test_deleted_trail_leaves_the_index(client, auth_headers):
+    headers = auth_headers()
+    trail_id = client.post("/trails", json=new_trail("Gone", (50.0, -4.0)), headers=headers).get_json()["TrailID"]
+    assert trail_ids(client.get("/trails/near?lat=50&lon=-4&radius_km=1", headers=headers)) == [trail_id]
+    assert client.delete(f"/trails/{trail_id}", headers=headers).status_code == 200
+    assert trail_ids(client.get("/trails/near?lat=50&lon=-4&radius_km=1", headers=headers)) == []
+
+def test_invalid_radius(client, auth_headers):
+    assert client.get("/trails/near?lat=50&lon=-4&radius_km=0", headers=auth_headers()).status_code == 400
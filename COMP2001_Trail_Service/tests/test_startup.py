@@ -0,0 +1,15 @@
+import os
+import startup_benchmark
+from benchmark import generate_dataset
+
+# A cold start has to happen in a fresh interpreter: the other tests have
+# already imported numpy and the schemas into this one.
+
+def test_create_app_defers_slow_imports_and_connections(settings, tmp_path):
+    database = tmp_path / "startup.db"
+    generate_dataset(str(database), 5, 3)
+    settings.setenv("DATABASE_URL", f"sqlite:///{database}")
+    run = startup_benchmark.run_child(dict(os.environ))
+    assert run["status"] == 200
+    assert run["connects"] == 0
+    assert run["loaded"] == []
@@ -0,0 +1,46 @@
+import io
+import point_sequence
+import track_import
+from config import db
+from models import LocationPoint
+
+POINTS = 5
+GPX = (
+    '<?xml version="1.0" encoding="UTF-8"?>'
+    '<gpx version="1.1" xmlns="http://www.topografix.com/GPX/1/1"><metadata><name>Test track</name></metadata><trk><trkseg>'
+    + "".join(
+        f'<trkpt lat="{50.4 + i * 0.0001:.7f}" lon="-4.0200000"><ele>{100 + i}</ele></trkpt>' for i in range(POINTS)
+    )
+    + "</trkseg></trk></gpx>"
+).encode()
+
+def orders(trail_id):
+    return db.session.scalars(
+        db.select(LocationPoint.Order).where(LocationPoint.TrailID == trail_id).order_by(LocationPoint.Order)
+    ).all()
+
+def test_uploaded_points_are_spaced_by_the_order_gap(client, auth_headers):
+    response = client.post(
+        "/trails/upload?difficulty=Easy&location=Dartmoor", data=GPX,
+        headers=dict(auth_headers(), **{"Content-Type": "application/gpx+xml"}),
+    )
+    assert response.status_code == 201, response.data
+    trail_id = response.get_json()["TrailID"]
+    assert orders(trail_id) == [(i + 1) * point_sequence.ORDER_GAP for i in range(POINTS)]
+
+def test_order_continues_across_batches(app):
+    fields = {"Difficulty": "Easy", "Location": "Dartmoor"}
+    trail_id, _ = track_import.import_track(track_import.reader_for("gpx", io.BytesIO(GPX)), fields, batch_size=2)
+    assert orders(trail_id) == [(i + 1) * point_sequence.ORDER_GAP for i in range(POINTS)]
+
+def test_insert_into_an_uploaded_trail_does_not_renumber_it(app, statements):
+    fields = {"Difficulty": "Easy", "Location": "Dartmoor"}
+    trail_id, _ = track_import.import_track(track_import.reader_for("gpx", io.BytesIO(GPX)), fields)
+    first = db.session.scalar(
+        db.select(LocationPoint.LocationPointID).where(LocationPoint.TrailID == trail_id).order_by(LocationPoint.Order)
+    )
+    del statements[:]
+    point_sequence.splice_points(trail_id, after=first, points=[{"Latitude": 50.40005, "Longitude": -4.02}])
+    db.session.commit()
+    assert not [statement for statement in statements if statement.lstrip().upper().startswith("UPDATE")]
+    assert len(orders(trail_id)) == POINTS + 1
@@ -0,0 +1,118 @@
+import os
+import time
+import pytest
+import response_cache
+import trail_snapshot as snapshot_module
+from trail_snapshot import trail_snapshot
+
+READS = [
+    "/trails",
+    "/trails?limit=3",
+    "/trails?limit=3&after=3",
+    "/trails?limit=2&after=7",
+    "/trails?difficulty=Easy",
+    "/trails?location=Dartmoor&route_type=Loop",
+    "/trails?min_length=3&max_length=7",
+    "/trails?min_elevation=20&limit=2",
+    "/trails?difficulty=Unknown",
+    "/trails?fields=TrailName,Length",
+    "/trails?fields=location_points,TrailID&limit=4&after=2",
+    "/trails/1",
+    "/trails/8",
+    "/trails/1/points",
+    "/trails/5/points",
+]
+
+@pytest.fixture
+def snapshot_path(settings, tmp_path):
+    """
+    Turn the snapshot on; request it before app. Rebuilds only run when the test calls rebuild().
+    """
+    path = tmp_path / "snapshot" / "trails.snap"
+    settings.setenv("TRAIL_SNAPSHOT_PATH", str(path))
+    settings.setenv("TRAIL_SNAPSHOT_REBUILD_DELAY", "3600")
+    yield str(path)
+    # The background thread outlives the app: leave it nothing to do
+    trail_snapshot._due = None
+    trail_snapshot._retry_at = 0.0
+
+def responses(client, headers):
+    result = {}
+    for url in READS:
+        response_cache.invalidate()
+        response = client.get(url, headers=headers)
+        result[url] = (response.status_code, response.get_json(), response.headers.get("X-Next-Cursor"), response.headers.get("ETag"))
+    return result
+
+def snapshot_reads():
+    return snapshot_module.reads_total._values.get(("snapshot",), 0)
+
+def test_snapshot_serves_the_same_responses_as_sql(snapshot_path, client, auth_headers, seed):
+    seed(8, points=4)
+    headers = auth_headers()
+    from_sql = responses(client, headers)
+    assert not os.path.exists(snapshot_path)
+    assert trail_snapshot.rebuild() is True
+
+    before = snapshot_reads()
+    from_snapshot = responses(client, headers)
+    assert snapshot_reads() > before
+    for url in READS:
+        assert from_snapshot[url] == from_sql[url], url
+    assert client.get("/trails/99", headers=headers).status_code == 404
+
+def test_write_deletes_the_snapshot(snapshot_path, client, auth_headers, seed):
+    (trail_id,) = seed(1)
+    headers = auth_headers()
+    assert trail_snapshot.rebuild() is True
+    assert trail_snapshot.current() is not None
+    point = {"Latitude": 50.5, "Longitude": -4.5, "Order": 99000}
+    assert client.post(f"/trails/{trail_id}/points", json=point, headers=headers).status_code == 201
+    assert not os.path.exists(snapshot_path)
+    assert trail_snapshot.current() is None
+    # Reads fall back to SQL, which has the new point
+    assert len(client.get(f"/trails/{trail_id}/points", headers=headers).get_json()) == 4
+    assert trail_snapshot.rebuild() is True
+    assert len(trail_snapshot.current().location_points(trail_id)) == 4
+
+def test_rebuild_is_refused_while_another_is_running(snapshot_path, app, seed):
+    seed(1)
+    with snapshot_module._locked(snapshot_path + ".build", blocking=False) as building:
+        assert building
+        assert trail_snapshot.rebuild() is False
+    assert not os.path.exists(snapshot_path)
+    assert trail_snapshot.rebuild() is True
+
+def test_rebuild_is_discarded_when_a_write_lands_during_it(snapshot_path, app, seed, monkeypatch):
+    seed(1)
+    write_snapshot = snapshot_module.write_snapshot
+
+    def write_then_invalidate(path):
+        result = write_snapshot(path)
+        trail_snapshot.invalidate()
+        return result
+
+    monkeypatch.setattr(snapshot_module, "write_snapshot", write_then_invalidate)
+    assert trail_snapshot.rebuild() is False
+    assert not os.path.exists(snapshot_path)
+    assert [name for name in os.listdir(os.path.dirname(snapshot_path)) if name.endswith(".tmp")] == []
+
+def test_rebuild_skips_a_request_already_served(snapshot_path, app, seed):
+    seed(1)
+    assert trail_snapshot.rebuild() is True
+    built = os.stat(snapshot_path).st_mtime
+    # Another process published a snapshot after this one was asked for
+    assert trail_snapshot.rebuild(requested_at=built - 1) is False
+    assert os.stat(snapshot_path).st_mtime == built
+
+def test_unreadable_file_is_not_served_and_is_rebuilt(snapshot_path, app, seed):
+    seed(2)
+    assert trail_snapshot.rebuild() is True
+    with open(snapshot_path, "r+b") as snapshot_file:
+        snapshot_file.truncate(os.path.getsize(snapshot_path) - 1)
+    assert trail_snapshot.current() is None
+    # The background thread replaces it straight away
+    deadline = time.monotonic() + 10
+    while trail_snapshot.current() is None and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert len(trail_snapshot.current().trails) == 2
@@ -0,0 +1,366 @@
+import codecs
+import json
+import re
+import uuid
+import xml.etree.ElementTree as ET
+from sqlalchemy import insert, update
+from config import db
+from models import Trail, LocationPoint
+import geometry
+from point_sequence import ORDER_GAP
+from lazy_imports import lazy_module
+
+# Streaming import of GPS recordings (GPX or GeoJSON) as one trail with its points.
+# Files are read incrementally: GPX with ElementTree.iterparse, dropping each
+# element as soon as it has been read, and GeoJSON with a small pull scanner
+# that reads coordinate arrays straight off the stream. Points are inserted
+# POINT_BATCH_SIZE at a time while Length and ElevationGain are accumulated
+# batch by batch, so memory use does not grow with the size of the file.
+
+CHUNK_SIZE = 64 * 1024
+POINT_BATCH_SIZE = 1000
+# A track whose ends are this close together is stored as a loop
+LOOP_DISTANCE_KM = 0.1
+MAX_JSON_DEPTH = 64
+FORMATS = ("gpx", "geojson")
+
+np = lazy_module("numpy")
+
+class TrackError(ValueError):
+    pass
+
+class TrailExists(TrackError):
+    pass
+
+def _coordinate(value, name, limit):
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise TrackError(f"Invalid {name}: {value!r}")
+    if not -limit <= number <= limit:
+        raise TrackError(f"{name} out of range: {value!r}")
+    return number
+
+def _local_name(tag):
+    return tag.rpartition("}")[2]
+
+class GPXReader:
+    """
+    Iterate over (latitude, longitude, elevation or None) for every track and route point of a GPX stream.
+    metadata collects the first name and desc found, as they are read.
+    """
+    POINT_TAGS = ("trkpt", "rtept")
+    METADATA_PARENTS = ("metadata", "trk", "rte")
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.metadata = {}
+
+    def __iter__(self):
+        # Open elements from the root down, so finished ones can be detached from their parent
+        parents = []
+        try:
+            for event, element in ET.iterparse(self.stream, events=("start", "end")):
+                if event == "start":
+                    parents.append(element)
+                    continue
+                parents.pop()
+                tag = _local_name(element.tag)
+                if tag in self.POINT_TAGS:
+                    elevation = None
+                    for child in element:
+                        if _local_name(child.tag) == "ele" and child.text:
+                            elevation = _coordinate(child.text, "elevation", float("inf"))
+                    yield (
+                        _coordinate(element.get("lat"), "latitude", 90),
+                        _coordinate(element.get("lon"), "longitude", 180),
+                        elevation,
+                    )
+                elif tag in ("name", "desc") and parents and _local_name(parents[-1].tag) in self.METADATA_PARENTS:
+                    self.metadata.setdefault(tag, (element.text or "").strip())
+                # Children of a point are read when the point ends; everything else can go now
+                if parents and _local_name(parents[-1].tag) not in self.POINT_TAGS:
+                    parents[-1].remove(element)
+        except ET.ParseError as e:
+            raise TrackError(f"Invalid GPX: {e}")
+
+_NUMBER = r"-?(?:0|[1-9][0-9]*)(?:\.[0-9]+)?(?:[eE][-+]?[0-9]+)?"
+# One JSON token: a string, a structural character, or a literal
+_TOKEN = re.compile(r'\s*(?:("(?:[^"\\]|\\.)*")|([{}\[\]:,])|(true|false|null|' + _NUMBER + r'))')
+# One GeoJSON position [lon, lat, elevation?, ...] and its trailing comma
+_POSITION = re.compile(
+    r"\s*\[\s*(" + _NUMBER + r")\s*,\s*(" + _NUMBER + r")\s*(?:,\s*(" + _NUMBER + r")\s*)?(?:,\s*" + _NUMBER + r"\s*)*\]\s*,?"
+)
+_END = re.compile(r"\s*")
+# Lookahead kept in the buffer before matching a position, far longer than any position
+_LOOKAHEAD = 4096
+LINE_TYPES = ("LineString", "MultiLineString")
+# properties keys read as the trail's name and description
+PROPERTY_KEYS = {"name": "name", "TrailName": "name", "desc": "desc", "description": "desc", "TrailDescription": "desc"}
+
+def _decode(token):
+    try:
+        return json.loads(token)
+    except ValueError as e:
+        raise TrackError(f"Invalid GeoJSON: {e}")
+
+class GeoJSONReader:
+    """
+    Iterate over (latitude, longitude, elevation or None) for every position of the LineString and
+    MultiLineString geometries in a GeoJSON stream, in file order.
+    metadata collects the first name and description found in feature properties.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.metadata = {}
+        self._decoder = codecs.getincrementaldecoder("utf-8-sig")()
+        self._buffer = ""
+        self._pos = 0
+        self._eof = False
+
+    def _read(self):
+        # Drop what has been consumed, then append one more chunk
+        self._buffer = self._buffer[self._pos:]
+        self._pos = 0
+        chunk = self.stream.read(CHUNK_SIZE)
+        if not chunk:
+            self._eof = True
+        try:
+            self._buffer += self._decoder.decode(chunk, final=self._eof)
+        except UnicodeDecodeError as e:
+            raise TrackError(f"Invalid GeoJSON: {e}")
+
+    def _fill(self):
+        while not self._eof and len(self._buffer) - self._pos < _LOOKAHEAD:
+            self._read()
+
+    def _token(self):
+        """
+        Return (kind, text) for the next token, kind being "string", "punct" or "literal".
+        """
+        while True:
+            self._fill()
+            match = _TOKEN.match(self._buffer, self._pos)
+            # A match running to the end of the buffer may continue in the next chunk
+            if match and (match.end() < len(self._buffer) or self._eof):
+                self._pos = match.end()
+                kind = match.lastindex
+                return ("string", "punct", "literal")[kind - 1], match.group(kind)
+            if self._eof:
+                raise TrackError(f"Invalid GeoJSON near: {self._buffer[self._pos:self._pos + 40]!r}")
+            self._read()
+
+    def _expect(self, text):
+        kind, token = self._token()
+        if token != text or kind == "string":
+            raise TrackError(f"Invalid GeoJSON: expected {text!r}, found {token!r}")
+
+    def __iter__(self):
+        yield from self._value(None, 0)
+        self._fill()
+        if _END.match(self._buffer, self._pos).end() != len(self._buffer):
+            raise TrackError("Invalid GeoJSON: unexpected data after the end")
+
+    def _value(self, key, depth, first=None):
+        """
+        Parse one value, yielding positions from any line geometry inside it.
+        Returns scalars; objects and arrays are not kept.
+        """
+        if depth > MAX_JSON_DEPTH:
+            raise TrackError("Invalid GeoJSON: nested too deeply")
+        kind, token = first or self._token()
+        if kind != "punct":
+            return _decode(token)
+        if token == "[":
+            kind, token = self._token()
+            while token != "]":
+                yield from self._value(key, depth + 1, (kind, token))
+                kind, token = self._token()
+                if token == ",":
+                    kind, token = self._token()
+                    if token == "]":
+                        raise TrackError("Invalid GeoJSON: trailing ','")
+                elif token != "]":
+                    raise TrackError(f"Invalid GeoJSON: expected ',' or ']', found {token!r}")
+            return None
+        if token != "{":
+            raise TrackError(f"Invalid GeoJSON: unexpected {token!r}")
+        geometry_type = None
+        has_coordinates = False
+        kind, token = self._token()
+        while token != "}":
+            if kind != "string":
+                raise TrackError(f"Invalid GeoJSON: expected a key, found {token!r}")
+            member = _decode(token)
+            self._expect(":")
+            if member == "coordinates":
+                has_coordinates = True
+                yield from self._coordinates()
+            else:
+                value = yield from self._value(member, depth + 1)
+                if member == "type":
+                    geometry_type = value
+                elif key == "properties" and member in PROPERTY_KEYS and isinstance(value, str):
+                    self.metadata.setdefault(PROPERTY_KEYS[member], value.strip())
+            kind, token = self._token()
+            if token == ",":
+                kind, token = self._token()
+                if token == "}":
+                    raise TrackError("Invalid GeoJSON: trailing ','")
+            elif token != "}":
+                raise TrackError(f"Invalid GeoJSON: expected ',' or '}}', found {token!r}")
+        if has_coordinates and geometry_type not in LINE_TYPES:
+            raise TrackError(f"Unsupported geometry {geometry_type}: only LineString and MultiLineString tracks can be imported")
+        return None
+
+    def _coordinates(self):
+        # Positions are matched with one regex each; only the nesting goes through _token()
+        self._expect("[")
+        depth = 1
+        while depth:
+            self._fill()
+            match = _POSITION.match(self._buffer, self._pos)
+            if match:
+                self._pos = match.end()
+                lon, lat, elevation = match.groups()
+                yield (
+                    _coordinate(lat, "latitude", 90),
+                    _coordinate(lon, "longitude", 180),
+                    float(elevation) if elevation is not None else None,
+                )
+                continue
+            kind, token = self._token()
+            if token == "[":
+                depth += 1
+            elif token == "]":
+                depth -= 1
+            elif token != "," or kind == "string":
+                raise TrackError(f"Unsupported coordinates near {token!r}: only LineString and MultiLineString tracks can be imported")
+
+def reader_for(track_format, stream):
+    if track_format == "gpx":
+        return GPXReader(stream)
+    return GeoJSONReader(stream)
+
+class TrackStats:
+    """
+    Length and elevation gain of a track, accumulated one batch of points at a time.
+    """
+
+    def __init__(self):
+        self.point_count = 0
+        self.length_km = 0.0
+        self.elevation_gain = 0.0
+        self.first = None
+        self._last = None  # (lat, lon) of the previous batch's last point
+        self._last_elevation = np.nan
+
+    def add(self, lat, lon, elevation):
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        elevation = np.asarray(elevation, dtype=np.float64)  # None becomes NaN
+        if self.first is None:
+            self.first = (lat[0], lon[0])
+        if self._last is not None:
+            # Join this batch to the end of the previous one
+            lat = np.r_[self._last[0], lat]
+            lon = np.r_[self._last[1], lon]
+            elevation = np.r_[self._last_elevation, elevation]
+        self.length_km += float(np.sum(geometry.haversine_km(lat[:-1], lon[:-1], lat[1:], lon[1:])))
+        # Gain counts every climb between consecutive points that both have an elevation
+        known = elevation[~np.isnan(elevation)]
+        if len(known):
+            self.elevation_gain += float(np.sum(np.clip(np.diff(known), 0.0, None)))
+            self._last_elevation = known[-1]
+        self._last = (lat[-1], lon[-1])
+        self.point_count += len(lat) - (1 if self.point_count else 0)
+
+    def is_loop(self):
+        return (
+            self.point_count > 2
+            and float(geometry.haversine_km(self.first[0], self.first[1], self._last[0], self._last[1])) <= LOOP_DISTANCE_KM
+        )
+
+def _insert_trail(fields, metadata):
+    # Length and ElevationGain are only known once the whole track is read, and
+    # GeoJSON properties may come after the coordinates, so the row is inserted
+    # with placeholders and completed by _complete_trail()
+    row = {
+        "TrailName": fields.get("TrailName") or metadata.get("name") or f"Upload {uuid.uuid4().hex}",
+        "TrailSummary": "",
+        "TrailDescription": "",
+        "Difficulty": fields["Difficulty"],
+        "Location": fields["Location"],
+        "Length": 0.0,
+        "ElevationGain": 0.0,
+        "RouteType": fields.get("RouteType") or "",
+    }
+    if db.session.scalar(db.select(Trail.TrailID).where(Trail.TrailName == row["TrailName"])) is not None:
+        raise TrailExists(f"Trail with name {row['TrailName']} already exists")
+    return db.session.scalar(insert(Trail).values(**row).returning(Trail.TrailID)), row["TrailName"]
+
+def _complete_trail(trail_id, inserted_name, fields, metadata, stats):
+    name = fields.get("TrailName") or metadata.get("name")
+    if not name:
+        raise TrackError("The file has no track name: pass one as name")
+    if name != inserted_name and db.session.scalar(db.select(Trail.TrailID).where(Trail.TrailName == name)) is not None:
+        raise TrailExists(f"Trail with name {name} already exists")
+    description = fields.get("TrailDescription") or metadata.get("desc") or ""
+    values = {
+        "TrailName": name,
+        "TrailSummary": fields.get("TrailSummary") or description.split("\n", 1)[0],
+        "TrailDescription": description,
+        "Length": round(stats.length_km, 4),
+        "ElevationGain": round(stats.elevation_gain, 1),
+        "RouteType": fields.get("RouteType") or ("Loop" if stats.is_loop() else "Point to point"),
+    }
+    db.session.execute(update(Trail).where(Trail.TrailID == trail_id).values(**values))
+
+def import_track(reader, fields, batch_size=POINT_BATCH_SIZE):
+    """
+    Insert one trail and its ordered points from a GPX or GeoJSON reader, in a single transaction.
+    fields holds the Trail columns given with the upload; Difficulty and Location are required,
+    and a missing TrailName or TrailDescription is taken from the file.
+    Returns (trail_id, stats).
+    """
+    trail_id = None
+    inserted_name = None
+    stats = TrackStats()
+    lat, lon, elevation = [], [], []
+
+    def write_batch():
+        nonlocal trail_id, inserted_name
+        if trail_id is None:
+            trail_id, inserted_name = _insert_trail(fields, reader.metadata)
+        # Spaced ORDER_GAP apart like point_sequence.py, so a later insert does not renumber the trail
+        start = stats.point_count + 1
+        db.session.execute(
+            insert(LocationPoint),
+            [
+                {"TrailID": trail_id, "Latitude": point_lat, "Longitude": point_lon, "Order": position * ORDER_GAP}
+                for position, point_lat, point_lon in zip(range(start, start + len(lat)), lat, lon)
+            ],
+        )
+        stats.add(lat, lon, elevation)
+        lat.clear()
+        lon.clear()
+        elevation.clear()
+
+    try:
+        for point_lat, point_lon, point_elevation in reader:
+            lat.append(point_lat)
+            lon.append(point_lon)
+            elevation.append(point_elevation)
+            if len(lat) == batch_size:
+                write_batch()
+        if lat:
+            write_batch()
+        if trail_id is None:
+            raise TrackError("No track points found")
+        _complete_trail(trail_id, inserted_name, fields, reader.metadata, stats)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return trail_id, stats
@@ -0,0 +1,466 @@
+import array
+import bisect
+import contextlib
+import datetime
+import mmap
+import os
+import struct
+import threading
+import time
+from config import db
+from models import Trail, LocationPoint
+from lazy_imports import lazy_module
+import request_metrics
+
+try:
+    import fcntl
+except ImportError:  # Windows: no lock between processes, as with the single-process dev server
+    fcntl = None
+
+# Memory-mapped snapshot of the trail catalogue.
+# The snapshot is one binary file holding every trail and location point:
+#   - the trails, as fixed-width records ordered by TrailID, with their text
+#     columns stored as indexes into a shared table of UTF-8 strings
+#   - an offsets table giving where each trail's points start and end
+#   - the points, as packed columns ordered by (TrailID, Order, LocationPointID)
+# GET /trails, /trails/{id} and /trails/{id}/points read straight from the
+# mapped file. Every worker maps the same file, so there is one copy of the
+# catalogue in the page cache however many workers run, and a cold worker
+# serves reads without querying the database.
+# A write in notes.py deletes the file, so no worker keeps serving the old
+# data, and schedules a rebuild. The rebuild runs on a background thread
+# REBUILD_DELAY seconds later, so a burst of writes is built once. It writes a
+# new file alongside the old one and swaps it in with os.replace(). A snapshot
+# older than MAX_AGE seconds is rebuilt too, which picks up writes made on
+# other hosts. Reads fall back to SQL while there is no snapshot.
+# Set TRAIL_SNAPSHOT_PATH to turn it on.
+#
+#   python trail_snapshot.py      # build the snapshot now, e.g. before starting gunicorn
+
+REBUILD_DELAY = 1.0
+MAX_AGE = 300
+RETRY_SECONDS = 30
+BATCH_SIZE = 50000
+
+np = lazy_module("numpy")
+
+MAGIC = b"TRAILSNP"
+VERSION = 1
+# magic, version, trail count, point count, string count, built at (Unix time)
+_HEADER = struct.Struct("<8sI4xqqqd")
+
+STRING_COLUMNS = ("TrailName", "TrailSummary", "TrailDescription", "Difficulty", "Location", "RouteType")
+# Trail record layout. timestamp is microseconds since 1970-01-01 in the stored (naive) time
+TRAIL_RECORD = [
+    ("TrailID", "<i8"), ("Length", "<f8"), ("ElevationGain", "<f8"), ("timestamp", "<i8"),
+] + [(column, "<u4") for column in STRING_COLUMNS]
+POINT_COLUMNS = [("LocationPointID", "<i8"), ("Order", "<i8"), ("Latitude", "<f8"), ("Longitude", "<f8")]
+NO_STRING = 2 ** 32 - 1
+NO_TIMESTAMP = -2 ** 63
+EPOCH = datetime.datetime(1970, 1, 1)
+ONE_MICROSECOND = datetime.timedelta(microseconds=1)
+
+# Same order as the schema's fields
+TRAIL_FIELDS = [
+    "TrailID", "TrailName", "TrailSummary", "TrailDescription", "Difficulty",
+    "Location", "Length", "ElevationGain", "RouteType", "timestamp", "location_points",
+]
+
+builds_total = request_metrics.Counter(
+    "trail_service_snapshot_builds_total", "Trail snapshot rebuilds by outcome.", ("outcome",)
+)
+reads_total = request_metrics.Counter(
+    "trail_service_snapshot_reads_total", "Trail reads by where they were served from.", ("source",)
+)
+request_metrics.METRICS.extend([builds_total, reads_total])
+
+def _micros(value):
+    if value is None:
+        return NO_TIMESTAMP
+    if value.tzinfo is not None:
+        raise ValueError("Trail timestamps with a time zone cannot be stored in the snapshot")
+    return (value - EPOCH) // ONE_MICROSECOND
+
+def _isoformat(micros):
+    if micros == NO_TIMESTAMP:
+        return None
+    return (EPOCH + datetime.timedelta(microseconds=micros)).isoformat()
+
+def write_snapshot(path):
+    """
+    Write every trail and point to a snapshot file at path; returns (trail count, point count).
+    Runs inside an app context.
+    """
+    strings = {}
+
+    def intern(value):
+        if value is None:
+            return NO_STRING
+        index = strings.get(value)
+        if index is None:
+            index = strings[value] = len(strings)
+        return index
+
+    trail_dtype = np.dtype(TRAIL_RECORD)
+    # Both SELECTs in one transaction, so the points match the trails
+    with db.session.begin():
+        rows = db.session.execute(
+            db.select(Trail.TrailID, Trail.Length, Trail.ElevationGain, Trail.timestamp,
+                      *[getattr(Trail, column) for column in STRING_COLUMNS])
+            .order_by(Trail.TrailID)
+        )
+        trails = np.array(
+            [(row[0], row[1], row[2], _micros(row[3]), *map(intern, row[4:])) for row in rows], dtype=trail_dtype
+        )
+
+        point_trails = array.array("q")
+        columns = [array.array("q"), array.array("q"), array.array("d"), array.array("d")]
+        result = db.session.execute(
+            db.select(LocationPoint.TrailID, LocationPoint.LocationPointID, LocationPoint.Order,
+                      LocationPoint.Latitude, LocationPoint.Longitude)
+            .order_by(LocationPoint.TrailID, LocationPoint.Order, LocationPoint.LocationPointID)
+            .execution_options(yield_per=BATCH_SIZE)
+        )
+        for partition in result.partitions():
+            values = list(zip(*partition))
+            point_trails.extend(values[0])
+            for column, value in zip(columns, values[1:]):
+                column.extend(value)
+
+    trail_ids = trails["TrailID"]
+    point_trail_ids = np.frombuffer(point_trails, dtype=np.int64)
+    keep = np.isin(point_trail_ids, trail_ids)
+    point_trail_ids = point_trail_ids[keep]
+    points = [np.frombuffer(column, dtype=dtype)[keep].astype(dtype) for column, (_, dtype) in zip(columns, POINT_COLUMNS)]
+    point_offsets = np.empty(len(trails) + 1, dtype="<i8")
+    point_offsets[:-1] = np.searchsorted(point_trail_ids, trail_ids)
+    point_offsets[-1] = len(point_trail_ids)
+
+    encoded = [value.encode("utf-8") for value in strings]
+    string_offsets = np.zeros(len(encoded) + 1, dtype="<u8")
+    np.cumsum([len(value) for value in encoded], out=string_offsets[1:])
+
+    with open(path, "wb") as snapshot_file:
+        snapshot_file.write(_HEADER.pack(MAGIC, VERSION, len(trails), len(point_trail_ids), len(encoded), time.time()))
+        for section in (trails, point_offsets, string_offsets, *points):
+            snapshot_file.write(section.tobytes())
+        snapshot_file.write(b"".join(encoded))
+        snapshot_file.flush()
+        os.fsync(snapshot_file.fileno())
+    return len(trails), len(point_trail_ids)
+
+class Snapshot:
+    """
+    Read-only view of one snapshot file. The arrays are numpy views on the mapping, not copies.
+    """
+
+    def __init__(self, path, case_insensitive=False):
+        with open(path, "rb") as snapshot_file:
+            self.stat = os.fstat(snapshot_file.fileno())
+            # The mapping is closed when the last view on it is garbage collected
+            self._map = mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, trail_count, point_count, string_count, self.built_at = _HEADER.unpack_from(self._map)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} trail snapshot")
+        offset = _HEADER.size
+        sections = []
+        for dtype, count in [(TRAIL_RECORD, trail_count), ("<i8", trail_count + 1), ("<u8", string_count + 1)] + [
+            (dtype, point_count) for _, dtype in POINT_COLUMNS
+        ]:
+            section = np.frombuffer(self._map, dtype=dtype, count=count, offset=offset)
+            sections.append(section)
+            offset += section.nbytes
+        self.trails, self.point_offsets, self._string_offsets = sections[:3]
+        self.points = dict(zip((name for name, _ in POINT_COLUMNS), sections[3:]))
+        self._heap = offset
+        if len(self._map) != self._heap + int(self._string_offsets[-1]):
+            raise ValueError(f"{path} is truncated")
+        self._trail_ids = self.trails["TrailID"]
+        # SQL Server's default collation ignores case and trailing spaces in comparisons
+        self._collate = (lambda value: value.rstrip(" ").lower()) if case_insensitive else (lambda value: value)
+        self._codes = {}
+
+    def is_file(self, stat):
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size) == (
+            self.stat.st_ino, self.stat.st_mtime_ns, self.stat.st_size
+        )
+
+    def _string(self, index):
+        if index == NO_STRING:
+            return None
+        start, end = self._string_offsets[index:index + 2].tolist()
+        return str(self._map[self._heap + start:self._heap + end], "utf-8")
+
+    def _matching_codes(self, column, value):
+        # String indexes whose text equals value, per column, as the database would compare them
+        lookup = self._codes.get(column)
+        if lookup is None:
+            lookup = {}
+            for code in np.unique(self.trails[column]).tolist():
+                if code != NO_STRING:
+                    lookup.setdefault(self._collate(self._string(code)), []).append(code)
+            self._codes[column] = lookup
+        return lookup.get(self._collate(value), [])
+
+    def _index(self, trail_id):
+        index = bisect.bisect_left(self._trail_ids, trail_id)
+        if index < len(self._trail_ids) and self._trail_ids[index] == trail_id:
+            return index
+        return None
+
+    def _points(self, index, trail_id):
+        start, end = self.point_offsets[index:index + 2].tolist()
+        columns = [self.points[name][start:end].tolist() for name, _ in POINT_COLUMNS]
+        return [
+            {"LocationPointID": point_id, "TrailID": trail_id, "Latitude": latitude, "Longitude": longitude, "Order": order}
+            for point_id, order, latitude, longitude in zip(*columns)
+        ]
+
+    def _trail(self, index, fields=None):
+        trail_id, length, elevation_gain, timestamp, *codes = self.trails[index].item()
+        values = {"TrailID": trail_id, "Length": length, "ElevationGain": elevation_gain}
+        data = {}
+        for field in TRAIL_FIELDS:
+            if fields is not None and field not in fields:
+                continue
+            if field == "location_points":
+                data[field] = self._points(index, trail_id)
+            elif field == "timestamp":
+                data[field] = _isoformat(timestamp)
+            elif field in values:
+                data[field] = values[field]
+            else:
+                data[field] = self._string(codes[STRING_COLUMNS.index(field)])
+        return data
+
+    def trail(self, trail_id):
+        """
+        One trail as TrailSchema dumps it, or None if it is not in the snapshot.
+        """
+        index = self._index(trail_id)
+        if index is None:
+            return None
+        with request_metrics.timed("serialize"):
+            return self._trail(index)
+
+    def trail_version(self, trail_id):
+        """
+        (TrailID, timestamp) as queries.trail_version() returns them, or None if the trail is not in the snapshot.
+        """
+        index = self._index(trail_id)
+        if index is None:
+            return None
+        micros = int(self.trails["timestamp"][index])
+        return trail_id, None if micros == NO_TIMESTAMP else EPOCH + datetime.timedelta(microseconds=micros)
+
+    def location_points(self, trail_id):
+        """
+        A trail's points in order, or None if the trail is not in the snapshot.
+        """
+        index = self._index(trail_id)
+        if index is None:
+            return None
+        with request_metrics.timed("serialize"):
+            return self._points(index, trail_id)
+
+    def list_trails(self, fields, limit, after, equal, ranges):
+        """
+        Same page and cursor as queries.list_trails() for the parsed arguments, already dumped.
+        """
+        start = 0 if after is None else bisect.bisect_right(self._trail_ids, after)
+        if equal or ranges:
+            candidates = self.trails[start:]
+            mask = np.ones(len(candidates), dtype=bool)
+            for column, value in equal:
+                mask &= np.isin(candidates[column.key], self._matching_codes(column.key, value))
+            for column, op, value in ranges:
+                mask &= op(candidates[column.key], value)
+            indexes = (np.flatnonzero(mask)[:limit + 1] + start).tolist()
+        else:
+            indexes = list(range(start, min(start + limit + 1, len(self.trails))))
+        next_cursor = None
+        if len(indexes) > limit:
+            indexes = indexes[:limit]
+            next_cursor = int(self._trail_ids[indexes[-1]])
+        with request_metrics.timed("serialize"):
+            return [self._trail(index, fields) for index in indexes], next_cursor
+
+@contextlib.contextmanager
+def _locked(path, blocking=True):
+    # Lock shared by every process using the snapshot; yields False if blocking=False and it is held
+    with open(path, "a+b") as lock_file:
+        if fcntl is None:
+            yield True
+            return
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+class SnapshotStore:
+    def __init__(self, rebuild_delay=REBUILD_DELAY, max_age=MAX_AGE):
+        self.path = None
+        self.rebuild_delay = rebuild_delay
+        self.max_age = max_age
+        self.case_insensitive = False
+        self._app = None
+        self._snapshot = None
+        self._due = None
+        self._requested_at = None
+        self._retry_at = 0.0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._worker = None
+
+    def init_app(self, app):
+        self._app = app
+        self.path = app.config.get("TRAIL_SNAPSHOT_PATH") or None
+        self.rebuild_delay = app.config.get("TRAIL_SNAPSHOT_REBUILD_DELAY", self.rebuild_delay)
+        self.max_age = app.config.get("TRAIL_SNAPSHOT_MAX_AGE", self.max_age)
+        self.case_insensitive = app.config["SQLALCHEMY_DATABASE_URI"].startswith("mssql")
+        self._snapshot = None
+        if self.path is not None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+
+    def current(self):
+        """
+        The snapshot to serve reads from, or None to read from the database.
+        """
+        if self.path is None:
+            return None
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            self._snapshot = None
+            self.schedule(self.rebuild_delay)
+            reads_total.inc(("database",))
+            return None
+        snapshot = self._snapshot
+        if snapshot is None or not snapshot.is_file(stat):
+            # Another process swapped in a new file: map that one instead
+            with self._lock:
+                snapshot = self._snapshot
+                if snapshot is None or not snapshot.is_file(stat):
+                    try:
+                        snapshot = self._snapshot = Snapshot(self.path, self.case_insensitive)
+                    except (OSError, ValueError):
+                        self._app.logger.exception("Could not open the trail snapshot %s", self.path)
+                        snapshot = self._snapshot = None
+            if snapshot is None:
+                # Outside the lock: schedule() takes it too
+                self.schedule(0)
+                reads_total.inc(("database",))
+                return None
+        if time.time() - snapshot.built_at > self.max_age:
+            self.schedule(0)
+        reads_total.inc(("snapshot",))
+        return snapshot
+
+    def invalidate(self):
+        """
+        Stop every worker serving the current snapshot and schedule a rebuild. Call after committing a write.
+        """
+        if self.path is None:
+            return
+        with _locked(self.path + ".lock"):
+            # Tells a rebuild that is already reading the database that its data is out of date
+            open(self.path + ".stale", "ab").close()
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(self.path)
+        self._snapshot = None
+        self.schedule(self.rebuild_delay)
+
+    def schedule(self, delay):
+        """
+        Rebuild on the background thread in delay seconds, unless a rebuild is already due sooner.
+        """
+        now = time.monotonic()
+        if now < self._retry_at:
+            return
+        with self._lock:
+            if self._due is not None and self._due <= now + delay:
+                return
+            self._due = now + delay
+            if self._requested_at is None:
+                self._requested_at = time.time()
+            if self._worker is None or not self._worker.is_alive():
+                # Started on first use, so each gunicorn worker process runs its own thread
+                self._worker = threading.Thread(target=self._run, name="trail-snapshot", daemon=True)
+                self._worker.start()
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            while True:
+                with self._lock:
+                    due = self._due
+                    if due is None:
+                        break
+                    wait = due - time.monotonic()
+                    if wait <= 0:
+                        requested_at = self._requested_at
+                        self._due = self._requested_at = None
+                if wait > 0:
+                    self._wake.wait(wait)
+                    self._wake.clear()
+                    continue
+                try:
+                    self.rebuild(requested_at)
+                except Exception:
+                    builds_total.inc(("failed",))
+                    self._retry_at = time.monotonic() + RETRY_SECONDS
+                    self._app.logger.exception("Could not build the trail snapshot %s", self.path)
+
+    def rebuild(self, requested_at=None):
+        """
+        Build a snapshot from the database and swap it in. Returns False when no new file was
+        published: another process was already building, had built one since requested_at, or a
+        write landed while this one was being built (that write schedules the next rebuild).
+        """
+        stale = self.path + ".stale"
+        with _locked(self.path + ".build", blocking=False) as building:
+            if not building:
+                builds_total.inc(("skipped",))
+                return False
+            if requested_at is not None and not os.path.exists(stale):
+                with contextlib.suppress(FileNotFoundError):
+                    if os.stat(self.path).st_mtime >= requested_at:
+                        builds_total.inc(("skipped",))
+                        return False
+            with _locked(self.path + ".lock"):
+                with contextlib.suppress(FileNotFoundError):
+                    os.unlink(stale)
+            temporary = f"{self.path}.{os.getpid()}.tmp"
+            try:
+                with self._app.app_context():
+                    write_snapshot(temporary)
+                with _locked(self.path + ".lock"):
+                    if os.path.exists(stale):
+                        builds_total.inc(("discarded",))
+                        return False
+                    os.replace(temporary, self.path)
+            finally:
+                with contextlib.suppress(FileNotFoundError):
+                    os.unlink(temporary)
+        builds_total.inc(("published",))
+        return True
+
+trail_snapshot = SnapshotStore()
+
+if __name__ == "__main__":
+    from app import create_app
+    from trail_snapshot import trail_snapshot as store  # The instance create_app() configures
+
+    create_app()
+    if store.path is None:
+        raise SystemExit("Set TRAIL_SNAPSHOT_PATH to build a trail snapshot")
+    store.rebuild()
+    snapshot = store.current()
+    print(f"Wrote {len(snapshot.trails)} trails and {len(snapshot.points['Latitude'])} points to {store.path}")
@@ -0,0 +1,5 @@
+from app import create_app
+
+# Production entry point: gunicorn -c gunicorn.conf.py wsgi:app
+connex_app = create_app()
+app = connex_app.app